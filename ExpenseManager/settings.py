@@ -153,6 +153,7 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
+        'core.renderers.RawJSONRenderer',
         'core.renderers.BrowsableAPIRendererWithoutForm',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -162,6 +163,26 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema'
 }
 FCM_SERVER_KEY=config("FCM_SERVER_KEY", default="")
+STATS_ENGINE = config("STATS_ENGINE", default="python")  # python, numpy or ledger
+STATS_CACHE_TIMEOUT = config("STATS_CACHE_TIMEOUT", default=60 * 60 * 24, cast=int)
+STATS_LOCK_TIMEOUT = config("STATS_LOCK_TIMEOUT", default=30, cast=int)
+CLOSED_REGARDING_CACHE_TIMEOUT = config("CLOSED_REGARDING_CACHE_TIMEOUT", default=60 * 60 * 24 * 7, cast=int)
+PAGINATION_OPT_IN = config("PAGINATION_OPT_IN", default=True, cast=bool)  # Paginate only requests sending cursor or page_size
+SYNC_TOKEN_MARGIN = config("SYNC_TOKEN_MARGIN", default=60, cast=int)
+SYNC_TOMBSTONES_RETENTION = config("SYNC_TOMBSTONES_RETENTION", default=30, cast=int)  # Days
+MEMBERSHIPS_CACHE_TIMEOUT = config("MEMBERSHIPS_CACHE_TIMEOUT", default=60, cast=int)
+
+# Stats versions and locks, memberships and closed regarding responses must be seen by every web worker and cron
+# process. Local memory is only fit for development and tests; production sets REDIS_URL (checked by core.W001).
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default="expense-manager"),
+    }
+}
+REDIS_URL = config("REDIS_URL", default="")
+if REDIS_URL:
+    CACHES["default"] = {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_URL}
 
 if DEBUG:
     INSTALLED_APPS.append("debug_toolbar")
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Warning, Tags, register
+
+PROCESS_CACHES = ["django.core.cache.backends.locmem.LocMemCache", "django.core.cache.backends.dummy.DummyCache"]
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES["default"]["BACKEND"] in PROCESS_CACHES:
+        return [Warning(
+            "The default cache is not shared between processes",
+            hint="Stats versions, memberships and closed regardings are invalidated through the cache. "
+                 "Set REDIS_URL, or CACHE_BACKEND to Memcached.",
+            id="core.W001",
+        )]
+    return []
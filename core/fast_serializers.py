@@ -0,0 +1,310 @@
+from core.models import Expense, Payment, Item, Validation, Membership, User, PaymentMethod
+from core.formatting import format_money, format_date
+from collections import defaultdict
+from decimal import Decimal
+
+# Row-to-dict counterparts of ExpenseSerializerReader, PaymentSerializerReader and ItemSerializerReader for the
+# list actions. Keys and values must stay identical to the DRF serializers output.
+
+DECIMAL_QUANTUM = Decimal(".0001")
+EXPENSE_FIELDS = ["id", "created_at", "updated_at", "name", "description", "date", "cost", "validation_status",
+                  "payment_status", "gallery", "regarding_id", "created_by_id"]
+PAYMENT_FIELDS = ["id", "expense_id", "payer_id", "payer__first_name", "payer__last_name", "created_at", "value",
+                  "payment_status", "payment_method_id", "payment_method__created_at", "payment_method__updated_at",
+                  "payment_method__type", "payment_method__description", "payment_method__limit",
+                  "payment_method__compensation_day", "payment_method__is_active", "payment_method__wallet_id"]
+USER_FIELDS = ["username", "first_name", "last_name", "email", "phone", "street", "district", "address_number",
+               "zip_code", "city", "state", "fcm_token", "google_id"]
+EXPENSE_PAYMENT_STATUSES = {value: label.capitalize() for value, label in Expense.PaymentStatuses.choices}
+EXPENSE_VALIDATION_STATUSES = {
+    Expense.ValidationStatuses.AWAITING: "Pendente",
+    Expense.ValidationStatuses.VALIDATED: "Validada",
+    Expense.ValidationStatuses.REJECTED: "Rejeitada",
+}
+
+
+def to_decimal_string(value):
+    if value is None:
+        return None
+    return "{:f}".format(value.quantize(DECIMAL_QUANTUM))
+
+
+def to_iso(value):
+    return value.isoformat() if value else None
+
+
+def to_raw(value):
+    return value
+
+
+def load_validated_by(expenses_ids):
+    validated_by = defaultdict(list)
+    validations = Validation.objects.filter(expense_id__in=expenses_ids).order_by("expense_id", "id")
+    for expense_id, validator_id in validations.values_list("expense_id", "validator_id"):
+        validated_by[expense_id].append(validator_id)
+    return validated_by
+
+
+def load_expenses(expenses_ids):
+    return {row["id"]: row for row in Expense.objects.filter(id__in=expenses_ids).values(*EXPENSE_FIELDS)}
+
+
+def build_nested_expense(row, validated_by):
+    return {
+        "id": row["id"],
+        "created_at": to_iso(row["created_at"]),
+        "updated_at": to_iso(row["updated_at"]),
+        "name": row["name"],
+        "description": row["description"],
+        "date": to_iso(row["date"]),
+        "cost": to_decimal_string(row["cost"]),
+        "validation_status": row["validation_status"],
+        "payment_status": row["payment_status"],
+        "gallery": row["gallery"],
+        "regarding": row["regarding_id"],
+        "created_by": row["created_by_id"],
+        "validated_by": validated_by[row["id"]],
+    }
+
+
+def build_payment(row, nested_expenses, money):
+    payer_name = f"{row['payer__first_name']} {row['payer__last_name']}"
+    return {
+        "id": row["id"],
+        "payer": {"id": row["payer_id"], "name": payer_name},
+        "payer_name": payer_name,
+        "created_at": to_iso(row["created_at"]),
+        "value": money(row["value"]),
+        "payment_status": row["payment_status"],
+        "payment_method": {
+            "id": row["payment_method_id"],
+            "created_at": to_iso(row["payment_method__created_at"]),
+            "updated_at": to_iso(row["payment_method__updated_at"]),
+            "type": row["payment_method__type"],
+            "description": row["payment_method__description"],
+            "limit": to_decimal_string(row["payment_method__limit"]),
+            "compensation_day": row["payment_method__compensation_day"],
+            "is_active": row["payment_method__is_active"],
+            "wallet": row["payment_method__wallet_id"],
+        },
+        "expense": nested_expenses.get(row["expense_id"]),
+    }
+
+
+def load_payments_by_expense(expenses_ids, nested_expenses, money):
+    payments_by_expense = defaultdict(list)
+    payments = Payment.objects.filter(expense_id__in=expenses_ids).order_by("expense_id", "id")
+    for row in payments.values(*PAYMENT_FIELDS):
+        payments_by_expense[row["expense_id"]].append(build_payment(row, nested_expenses, money))
+    return payments_by_expense
+
+
+def load_consumers(items):
+    consumers_by_item = defaultdict(list)
+    consumers = Item.consumers.through.objects.filter(
+        item_id__in=[item["id"] for item in items if not item["shared_by_all"]]
+    ).order_by("item_id", "user_id")
+    for item_id, user_id, first_name, last_name in consumers.values_list("item_id", "user_id", "user__first_name",
+                                                                         "user__last_name"):
+        consumers_by_item[item_id].append((user_id, first_name, last_name))
+
+    members_by_group = defaultdict(list)
+    groups_ids = {item["expense__regarding__expense_group_id"] for item in items if item["shared_by_all"]}
+    memberships = Membership.objects.filter(group_id__in=groups_ids).order_by("group_id", "user_id")
+    for group_id, user_id, first_name, last_name in memberships.values_list("group_id", "user_id", "user__first_name",
+                                                                            "user__last_name"):
+        members_by_group[group_id].append((user_id, first_name, last_name))
+
+    for item in items:
+        if item["shared_by_all"]:  # Consumed by the current members of the group
+            consumers_by_item[item["id"]] = members_by_group[item["expense__regarding__expense_group_id"]]
+    return consumers_by_item
+
+
+def build_item_for_expense(row, consumers, money):
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "price": money(row["price"]),
+        "expense": row["expense_id"],
+        "consumers_names": ", ".join(f"{first_name} {last_name}" if last_name else first_name
+                                     for _, first_name, last_name in consumers),
+        "consumers": [{"id": user_id, "name": first_name + " " + last_name}
+                      for user_id, first_name, last_name in consumers],
+        "created_at": to_iso(row["created_at"]),
+    }
+
+
+def load_items_by_expense(expenses_ids, money):
+    items = list(
+        Item.objects.filter(expense_id__in=expenses_ids)
+        .order_by("expense_id", "id")
+        .values("id", "name", "price", "expense_id", "created_at", "shared_by_all",
+                "expense__regarding__expense_group_id")
+    )
+    consumers_by_item = load_consumers(items)
+    items_by_expense = defaultdict(list)
+    for row in items:
+        items_by_expense[row["expense_id"]].append(build_item_for_expense(row, consumers_by_item[row["id"]], money))
+    return items_by_expense
+
+
+def load_validators(validators_ids):
+    users = User.objects.filter(id__in=validators_ids).values("id", "wallet__id", *USER_FIELDS)
+    validators = {user["id"]: user for user in users}
+    methods_by_wallet = defaultdict(list)
+    payment_methods = (
+        PaymentMethod.objects.filter(wallet__owner_id__in=validators_ids)
+        .order_by("wallet_id", "id")
+        .values("id", "payments_count", "type", "description", "limit", "compensation_day", "is_active", "wallet_id")
+    )
+    for row in payment_methods:
+        methods_by_wallet[row["wallet_id"]].append({
+            "id": row["id"],
+            "has_payments": row["payments_count"] > 0,
+            "number_of_payments": row["payments_count"],
+            "type": row["type"],
+            "description": row["description"],
+            "limit": to_decimal_string(row["limit"]),
+            "compensation_day": row["compensation_day"],
+            "is_active": row["is_active"],
+            "wallet": row["wallet_id"],
+        })
+
+    for user_id, user in validators.items():
+        data = {"id": user_id, "full_name": f"{user['first_name']} {user['last_name']}"}
+        if user["wallet__id"] is not None:  # UserSerializer skips the wallet of users without one
+            data["wallet"] = {"id": user["wallet__id"], "payment_methods": methods_by_wallet[user["wallet__id"]]}
+        data.update((field, user[field]) for field in USER_FIELDS)
+        validators[user_id] = data
+    return validators
+
+
+def load_validations_by_expense(expenses_ids, expenses, nested_expenses):
+    validations = list(
+        Validation.objects.filter(expense_id__in=expenses_ids)
+        .order_by("expense_id", "id")
+        .values("id", "expense_id", "validator_id", "created_at", "note", "validated_at", "is_active")
+    )
+    validators = load_validators({row["validator_id"] for row in validations})
+    validations_by_expense = defaultdict(list)
+    for row in validations:
+        expense = expenses[row["expense_id"]]
+        if row["is_active"]:
+            status = "AGUARDANDO"
+        elif row["validated_at"]:
+            status = "VALIDOU"
+        else:
+            status = "REJEITOU"
+        validations_by_expense[row["expense_id"]].append({
+            "id": row["id"],
+            "requested_by": expense["created_by__first_name"] + ' ' + expense["created_by__last_name"],
+            "is_validated": bool(row["validated_at"]),
+            "validator": validators[row["validator_id"]],
+            "status": status,
+            "created_at": format_date(row["created_at"]),
+            "note": row["note"],
+            "validated_at": format_date(row["validated_at"]) if row["validated_at"] else None,
+            "is_active": row["is_active"],
+            "expense": nested_expenses[row["expense_id"]],
+        })
+    return validations_by_expense
+
+
+def serialize_expenses(queryset, raw=False):
+    money = to_raw if raw else format_money
+    expenses = {
+        row["id"]: row
+        for row in queryset.prefetch_related(None).values(
+            *EXPENSE_FIELDS, "regarding__name", "regarding__is_closed", "regarding__expense_group_id",
+            "created_by__first_name", "created_by__last_name", "shared_total", "individual_total"
+        )
+    }
+    expenses_ids = list(expenses)
+    validated_by = load_validated_by(expenses_ids)
+    nested_expenses = {expense_id: build_nested_expense(row, validated_by) for expense_id, row in expenses.items()}
+    payments_by_expense = load_payments_by_expense(expenses_ids, nested_expenses, money)
+    items_by_expense = load_items_by_expense(expenses_ids, money)
+    validations_by_expense = load_validations_by_expense(expenses_ids, expenses, nested_expenses)
+
+    data = []
+    for expense_id, row in expenses.items():
+        data.append({
+            "id": expense_id,
+            "payments": payments_by_expense[expense_id],
+            "items": items_by_expense[expense_id],
+            "regarding_name": row["regarding__name"],
+            "shared_total": money(row["shared_total"]),
+            "individual_total": money(row["individual_total"]),
+            "validations": validations_by_expense[expense_id],
+            "validation_status": EXPENSE_VALIDATION_STATUSES.get(row["validation_status"]),
+            "regarding_is_closed": row["regarding__is_closed"],
+            "expense_group": row["regarding__expense_group_id"],
+            "name": row["name"],
+            "description": row["description"],
+            "date": to_iso(row["date"]) if raw else format_date(row["date"]),
+            "cost": money(row["cost"]),
+            "payment_status": EXPENSE_PAYMENT_STATUSES[row["payment_status"]],
+            "gallery": row["gallery"],
+            "regarding": row["regarding_id"],
+            "created_by": row["created_by_id"],
+            "validated_by": validated_by[expense_id],
+        })
+    return data
+
+
+def serialize_payments(queryset, raw=False):
+    payments = list(queryset.prefetch_related(None).values(*PAYMENT_FIELDS))
+    expenses_ids = {row["expense_id"] for row in payments}
+    validated_by = load_validated_by(expenses_ids)
+    nested_expenses = {
+        expense_id: build_nested_expense(row, validated_by) for expense_id, row in load_expenses(expenses_ids).items()
+    }
+    money = to_raw if raw else format_money
+    return [build_payment(row, nested_expenses, money) for row in payments]
+
+
+def serialize_items(queryset, raw=False):
+    items = list(
+        queryset.prefetch_related(None).values(
+            "id", "expense_id", "created_at", "updated_at", "name", "price", "split_type", "consumers_count",
+            "shared_by_all", "tags_id", "expense__regarding__expense_group_id"
+        )
+    )
+    expenses_ids = {row["expense_id"] for row in items}
+    expenses = load_expenses(expenses_ids)
+    validated_by = load_validated_by(expenses_ids)
+    nested_expenses = {expense_id: build_nested_expense(row, validated_by) for expense_id, row in expenses.items()}
+    payments_by_expense = load_payments_by_expense(expenses_ids, nested_expenses, to_raw if raw else format_money)
+    consumers_by_item = load_consumers(items)
+
+    data = []
+    for row in items:
+        expense = expenses.get(row["expense_id"])
+        data.append({
+            "id": row["id"],
+            "expense": expense and {
+                "id": expense["id"],
+                "payments": payments_by_expense[expense["id"]],
+                "name": expense["name"],
+                "description": expense["description"],
+                "date": to_iso(expense["date"]),
+                "cost": to_decimal_string(expense["cost"]),
+                "validation_status": expense["validation_status"],
+                "payment_status": expense["payment_status"],
+                "gallery": expense["gallery"],
+                "regarding": expense["regarding_id"],
+                "created_by": expense["created_by_id"],
+                "validated_by": validated_by[expense["id"]],
+            },
+            "created_at": to_iso(row["created_at"]),
+            "updated_at": to_iso(row["updated_at"]),
+            "name": row["name"],
+            "price": to_decimal_string(row["price"]),
+            "split_type": row["split_type"],
+            "consumers_count": row["consumers_count"],
+            "shared_by_all": row["shared_by_all"],
+            "tags": row["tags_id"],
+            "consumers": [user_id for user_id, _, _ in consumers_by_item[row["id"]]],
+        })
+    return data
@@ -4,6 +4,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+IGNORED_PARAMS = ["page", "settlement", "format", "fields", "omit", "expand", "cursor", "page_size"]
+
 
 class BaseFilter(BaseFilterBackend):
     def __init__(self):
@@ -41,6 +43,6 @@ class BaseFilter(BaseFilterBackend):
                 logger.info(e)
             else:
                 params[key] = value
-        if 'page' in params.keys():
-            del params['page']
+        for key in IGNORED_PARAMS:
+            params.pop(key, None)
         return params
@@ -0,0 +1,52 @@
+from decimal import Decimal
+from functools import lru_cache
+
+# Precompiled equivalents of the babel pt_BR patterns used by the API:
+# format_decimal(value, locale="pt_BR", format="#.###,00") and
+# format_currency(value, "BRL", "#,##0.00", locale="pt_BR")
+MONEY_QUANTUM = Decimal("0.00001")  # "#.###,00" keeps from two up to five decimal places, without grouping
+CURRENCY_QUANTUM = Decimal("0.01")
+
+
+def to_decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def get_sign(value):
+    return "-" if value.is_signed() else ""
+
+
+@lru_cache(maxsize=4096)
+def format_unsigned_money(value):
+    integer, _, fraction = f"{value.normalize().quantize(MONEY_QUANTUM):f}".partition(".")
+    return f"{integer},{fraction.rstrip('0').ljust(2, '0')}"
+
+
+@lru_cache(maxsize=4096)
+def format_unsigned_currency(value):
+    integer, _, fraction = f"{value.normalize().quantize(CURRENCY_QUANTUM):f}".partition(".")
+    return f"{int(integer):,}".replace(",", ".") + f",{fraction}"
+
+
+def format_money(value):
+    value = to_decimal(value)
+    return get_sign(value) + format_unsigned_money(abs(value))
+
+
+def format_currency(value):
+    value = to_decimal(value)
+    return get_sign(value) + format_unsigned_currency(abs(value))
+
+
+def parse_money(value):
+    if "," in value:  # Formatted as pt_BR
+        value = value.replace(".", "").replace(",", ".")
+    return Decimal(value)
+
+
+def format_date(value):
+    return f"{value.day:02d}/{value.month:02d}/{value.year}"
+
+
+def format_datetime(value):
+    return f"{value.day:02d}/{value.month:02d}/{value.year} {value.hour:02d}:{value.minute:02d}"
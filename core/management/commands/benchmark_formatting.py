@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from babel.numbers import format_decimal, format_currency
+from core import formatting
+from datetime import datetime, timedelta
+from decimal import Decimal
+import random
+import time
+
+BENCHMARKS = [
+    ("money", "decimals", lambda value: format_decimal(value, locale="pt_BR", format="#.###,00"),
+     formatting.format_money),
+    ("currency", "decimals", lambda value: format_currency(value, "BRL", "#,##0.00", locale="pt_BR"),
+     formatting.format_currency),
+    ("date", "datetimes", lambda value: value.strftime("%d/%m/%Y"), formatting.format_date),
+    ("datetime", "datetimes", lambda value: value.strftime("%d/%m/%Y %H:%M"), formatting.format_datetime),
+]
+
+
+class Command(BaseCommand):
+    help = "Compare the babel pt_BR formatting with the precompiled formatters of core.formatting"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--values", type=int, default=100000, help="Values formatted by each formatter")
+        parser.add_argument("--distinct", type=int, default=5000, help="Distinct values among them")
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        distinct = {
+            "decimals": [Decimal(random.randint(-10 ** 8, 10 ** 8)).scaleb(-4) for _ in range(options["distinct"])],
+            "datetimes": [datetime(2023, 1, 1) + timedelta(minutes=random.randint(0, 10 ** 6))
+                          for _ in range(options["distinct"])],
+        }
+        values = {kind: random.choices(population, k=options["values"]) for kind, population in distinct.items()}
+        for name, kind, reference, formatter in BENCHMARKS:
+            reference_time, expected = self.run(reference, values[kind])
+            formatter_time, formatted = self.run(formatter, values[kind])
+            print(f"{name}: babel/strftime {reference_time * 1000:.1f} ms, formatting {formatter_time * 1000:.1f} ms, "
+                  f"{reference_time / formatter_time:.1f}x, identical output: {formatted == expected}")
+
+    def run(self, formatter, values):
+        start = time.perf_counter()
+        formatted = [formatter(value) for value in values]
+        return time.perf_counter() - start, formatted
@@ -0,0 +1,102 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from core import fast_serializers
+from core.models import User, Wallet, PaymentMethod, ExpenseGroup, Membership, Regarding, Expense, Item, Payment, \
+    Validation
+from core.serializers import ExpenseSerializerReader, PaymentSerializerReader, ItemSerializerReader
+from core.views import ExpenseViewSet, PaymentViewSet, ItemViewSet
+from datetime import date, timedelta
+from decimal import Decimal
+import random
+import time
+
+ENDPOINTS = [
+    ("expenses", ExpenseViewSet, ExpenseSerializerReader, fast_serializers.serialize_expenses),
+    ("payments", PaymentViewSet, PaymentSerializerReader, fast_serializers.serialize_payments),
+    ("items", ItemViewSet, ItemSerializerReader, fast_serializers.serialize_items),
+]
+
+
+class Command(BaseCommand):
+    help = "Compare the DRF list serializers with the fast path serializers on a seeded dataset"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=5, help="Members of the seeded group")
+        parser.add_argument("--expenses", type=int, default=300, help="Expenses of the seeded group")
+        parser.add_argument("--items", type=int, default=4, help="Items per expense")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs of each serializer, the best one is reported")
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        with transaction.atomic():  # The seeded dataset is rolled back at the end
+            user = self.seed(options["members"], options["expenses"], options["items"])
+            for name, viewset_class, serializer_class, fast_serializer in ENDPOINTS:
+                self.benchmark(name, viewset_class, serializer_class, fast_serializer, user, options["repeat"])
+            transaction.set_rollback(True)
+
+    def seed(self, members_count, expenses_count, items_count):
+        group = ExpenseGroup.objects.create(name="Benchmark", drive_id="benchmark")
+        members = []
+        for index in range(members_count):
+            user = User.objects.create(username=f"benchmark-{index}", first_name="Membro", last_name=str(index))
+            wallet = Wallet.objects.create(owner=user)
+            PaymentMethod.objects.create(type=PaymentMethod.Types.CREDIT_CARD, wallet=wallet, description="card")
+            Membership.objects.create(group=group, user=user)
+            members.append(user)
+        regarding = Regarding.objects.create(name="Benchmark", start_date=date(2023, 1, 1), end_date=date(2023, 12, 31),
+                                             expense_group=group)
+        expenses = Expense.objects.bulk_create([
+            Expense(name=f"Despesa {index}", regarding=regarding, cost=Decimal(items_count * 10),
+                    date=date(2023, 1, 1) + timedelta(days=index % 365), created_by=random.choice(members))
+            for index in range(expenses_count)
+        ])
+        payments, validations, items = [], [], []
+        for expense in expenses:
+            payer = random.choice(members)
+            payments.append(Payment(payer=payer, payment_method=payer.wallet.payment_methods.first(),
+                                    value=expense.cost, expense=expense))
+            validations += [Validation(validator=validator, expense=expense)
+                            for validator in random.sample(members, min(2, members_count))]
+            for index in range(items_count):
+                shared_by_all = index % 2 == 0
+                items.append(Item(name=f"Item {index}", price=Decimal(10), expense=expense,
+                                  shared_by_all=shared_by_all, consumers_count=members_count if shared_by_all else 1,
+                                  split_type=Item.SplitTypes.SHARED if shared_by_all else Item.SplitTypes.INDIVIDUAL))
+        Payment.objects.bulk_create(payments)
+        Validation.objects.bulk_create(validations)
+        Item.objects.bulk_create(items)
+        Item.consumers.through.objects.bulk_create([
+            Item.consumers.through(item_id=item.id, user_id=random.choice(members).id)
+            for item in items if not item.shared_by_all
+        ])
+        return members[0]
+
+    def get_queryset(self, viewset_class, user):
+        request = Request(APIRequestFactory().get("/"))
+        request.user = user
+        view = viewset_class(request=request, format_kwarg=None, action="list")
+        return view.filter_queryset(view.get_queryset()), request
+
+    def run(self, serialize, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                content = JSONRenderer().render(serialize())
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return content, best, len(queries)
+
+    def benchmark(self, name, viewset_class, serializer_class, fast_serializer, user, repeat):
+        queryset, request = self.get_queryset(viewset_class, user)
+        expected, serializer_time, serializer_queries = self.run(
+            lambda: serializer_class(queryset.all(), many=True, context={"request": request}).data, repeat
+        )
+        content, fast_time, fast_queries = self.run(lambda: fast_serializer(queryset.all()), repeat)
+        print(f"{name}: serializer {serializer_time * 1000:.1f} ms ({serializer_queries} queries), "
+              f"fast path {fast_time * 1000:.1f} ms ({fast_queries} queries), "
+              f"{serializer_time / fast_time:.1f}x, identical output: {content == expected}")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.services import hot_queries
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot queries of the views and commands and check that each one uses its index"
+
+    def handle(self, *args, **options):
+        missing = []
+        for name, queryset, index in hot_queries.get_hot_queries():
+            plan = hot_queries.explain(queryset)
+            if index not in plan:
+                missing.append(f"{name} ({index})")
+            print(f"{'OK' if index in plan else 'NO INDEX'} {name}: {index}\n{plan}\n")
+        if missing:
+            raise CommandError(f"Queries without their index: {', '.join(missing)}")
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from core.services import sync
+
+
+class Command(BaseCommand):
+    help = "Delete the sync tombstones older than SYNC_TOMBSTONES_RETENTION days"
+
+    def handle(self, *args, **options):
+        print(f"{sync.prune_tombstones()} tombstones deleted")
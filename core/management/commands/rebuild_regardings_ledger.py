@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import Regarding
+from core.services import ledger, stats
+from decimal import Decimal
+
+BALANCE_FIELDS = ["shared", "partial_shared", "individual", "total_paid_shared", "balance", "final_balance"]
+TOLERANCE = Decimal("0.01")
+
+
+class Command(BaseCommand):
+    help = "Rebuild the regardings balance ledger and check it against the totals calculated from the items"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--regardings", nargs="*", type=int, help="Ids of the regardings to process")
+        parser.add_argument("--check-only", action="store_true", help="Only report the drift, without rebuilding")
+
+    def handle(self, *args, **options):
+        regardings = self.get_regardings(options["regardings"])
+        if not options["check_only"]:
+            self.rebuild_ledger(regardings)
+            print(f"{regardings.count()} regardings ledger rebuilt")
+        drifted = self.check_ledger(regardings)
+        print(f"{len(drifted)} regardings with drift: {drifted}")
+
+    def get_regardings(self, regardings_ids):
+        regardings = Regarding.objects.select_related("expense_group")
+        if regardings_ids:
+            regardings = regardings.filter(id__in=regardings_ids)
+        return regardings
+
+    def rebuild_ledger(self, regardings):
+        for regarding in regardings:
+            with transaction.atomic():
+                ledger.rebuild_regarding(regarding)
+
+    def check_ledger(self, regardings):
+        drifted = []
+        for regarding in regardings.filter(expenses__isnull=False).distinct():
+            _, expected_by_member, _, expected_member_vs_member = stats.calculate_totals_of_regarding(regarding, engine="python")
+            _, totals_by_member, _, total_member_vs_member = stats.calculate_totals_of_regarding(regarding, engine="ledger")
+            if not self.totals_match(expected_by_member, totals_by_member) or not self.member_vs_member_match(
+                    expected_member_vs_member, total_member_vs_member):
+                drifted.append(regarding.id)
+        return drifted
+
+    def totals_match(self, expected_by_member, totals_by_member):
+        for member, expected in expected_by_member.items():
+            for field in BALANCE_FIELDS:
+                if abs(expected[field] - totals_by_member[member][field]) > TOLERANCE:
+                    return False
+        return True
+
+    def member_vs_member_match(self, expected_member_vs_member, total_member_vs_member):
+        for creditor, expected_debts in expected_member_vs_member.items():
+            debts = total_member_vs_member.get(creditor, {})
+            for debtor in expected_debts.keys() | debts.keys():
+                if abs(expected_debts.get(debtor, 0) - debts.get(debtor, 0)) > TOLERANCE:
+                    return False
+        return True
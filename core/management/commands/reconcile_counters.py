@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.services import counters
+
+
+class Command(BaseCommand):
+    help = "Recount the expenses, regardings and payments counters and fix the ones that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check-only", action="store_true", help="Only report the drift, without fixing it")
+
+    def handle(self, *args, **options):
+        for model, field, counted_model, lookup in counters.COUNTERS:
+            with transaction.atomic():
+                if options["check_only"]:
+                    drifted = counters.get_drifted_ids(model, field, counted_model, lookup)
+                else:
+                    drifted = counters.reconcile(model, field, counted_model, lookup)
+            print(f"{model.__name__}.{field}: {len(drifted)} with drift: {drifted}")
@@ -1,8 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from core.models import Payment, Expense, Regarding, User
-from core.serializers import RegardingSerializerReader
-import json
+from core.models import Payment, Expense, Regarding
+from core.services import group_versions, closed_regardings
+from core.services.regardings import build_balance_snapshot
 
 
 class Command(BaseCommand):
@@ -10,7 +10,8 @@ class Command(BaseCommand):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.today = timezone.now().date()
+        self.now = timezone.now()
+        self.today = self.now.date()
 
     def handle(self, *args, **options):
         regardings = self.get_regardings()
@@ -23,19 +24,14 @@ class Command(BaseCommand):
         return regardings
 
     def close_regadings(self, regardings):
-        regardings.update(is_closed=True)
+        group_versions.bump(regardings.values_list("expense_group_id", flat=True))
+        regardings.update(is_closed=True, updated_at=self.now)
 
     def update_regadings_balance_json(self, regardings):
         for regarding in regardings:
-            regarding.balance_json = {}
-            regarding.is_closed = False
-            regarding_serializer = RegardingSerializerReader(regarding, context={"request": {"user": User.objects.first()}})
-            totals = regarding_serializer.data
-            regarding.balance_json = json.dumps({
-                "general_total": totals.get('general_total', {}),
-                "consumer_total": totals.get('consumer_total', []),
-                "total_by_day": totals.get('total_by_day', {}),
-                "total_member_vs_member": totals.get('total_member_vs_member', {}),
-            }, default=str)
+            regarding.updated_at = self.now
+            regarding.balance_json = build_balance_snapshot(regarding)
         print(f"{regardings.count()} regardings updated")
-        Regarding.objects.bulk_update(regardings, ['balance_json'], batch_size=2000)
+        Regarding.objects.bulk_update(regardings, ['balance_json', 'updated_at'], batch_size=2000)
+        closed_regardings.invalidate_on_commit(regarding.id for regarding in regardings if regarding.is_closed)
+        group_versions.bump(regarding.expense_group_id for regarding in regardings)
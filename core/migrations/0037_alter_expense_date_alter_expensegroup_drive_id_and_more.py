@@ -0,0 +1,166 @@
+# Generated by Django 4.1 on 2026-10-18 15:58
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0036_expensegroup_drive_id_alter_expense_date_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="expense",
+            name="date",
+            field=models.DateField(
+                default=datetime.date(2026, 10, 18), verbose_name="Expense Date"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="expensegroup",
+            name="drive_id",
+            field=models.CharField(
+                blank=True, max_length=64, null=True, verbose_name="Drive ID"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="regarding",
+            name="start_date",
+            field=models.DateField(
+                default=datetime.date(2026, 10, 18), verbose_name="Start Date"
+            ),
+        ),
+        migrations.CreateModel(
+            name="RegardingMemberLedger",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "shared",
+                    models.DecimalField(
+                        decimal_places=4,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Shared Total",
+                    ),
+                ),
+                (
+                    "partial_shared",
+                    models.DecimalField(
+                        decimal_places=4,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Partial Shared Total",
+                    ),
+                ),
+                (
+                    "individual",
+                    models.DecimalField(
+                        decimal_places=4,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Individual Total",
+                    ),
+                ),
+                (
+                    "total_paid_shared",
+                    models.DecimalField(
+                        decimal_places=4,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Paid Shared Total",
+                    ),
+                ),
+                (
+                    "member",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="regardings_ledger",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "regarding",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="members_ledger",
+                        to="core.regarding",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RegardingDebtLedger",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "value",
+                    models.DecimalField(
+                        decimal_places=12,
+                        default=0,
+                        max_digits=24,
+                        verbose_name="Debt Value",
+                    ),
+                ),
+                (
+                    "creditor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="credits_ledger",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "debtor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="debts_ledger",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "regarding",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="debts_ledger",
+                        to="core.regarding",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="regardingmemberledger",
+            constraint=models.UniqueConstraint(
+                fields=("regarding", "member"), name="unique_regarding_member_ledger"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="regardingdebtledger",
+            constraint=models.UniqueConstraint(
+                fields=("regarding", "creditor", "debtor"),
+                name="unique_regarding_debt_ledger",
+            ),
+        ),
+    ]
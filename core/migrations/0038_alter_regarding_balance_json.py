@@ -0,0 +1,66 @@
+# Generated by Django 4.1 on 2026-10-18 16:02
+
+import django.core.serializers.json
+from django.db import migrations, models
+import json
+
+
+def convert_balance_json_to_snapshot(apps, schema_editor):
+    Regarding = apps.get_model("core", "Regarding")
+    regardings = []
+    for regarding in Regarding.objects.filter(balance_json__isnull=False).only(
+        "balance_json"
+    ):
+        if not isinstance(regarding.balance_json, str):
+            continue
+        totals = json.loads(regarding.balance_json)
+        regarding.balance_json = {
+            "version": 2,
+            "general_total": totals.get("general_total", {}),
+            "members": totals.get("consumer_total", {}),
+            "total_by_day": totals.get("total_by_day", {}),
+            "total_member_vs_member": totals.get("total_member_vs_member", {}),
+        }
+        regardings.append(regarding)
+    Regarding.objects.bulk_update(regardings, ["balance_json"], batch_size=2000)
+
+
+def convert_snapshot_to_balance_json(apps, schema_editor):
+    Regarding = apps.get_model("core", "Regarding")
+    regardings = []
+    for regarding in Regarding.objects.filter(balance_json__version=2).only(
+        "balance_json"
+    ):
+        snapshot = regarding.balance_json
+        regarding.balance_json = json.dumps(
+            {
+                "general_total": snapshot.get("general_total", {}),
+                "consumer_total": snapshot.get("members", {}),
+                "total_by_day": snapshot.get("total_by_day", {}),
+                "total_member_vs_member": snapshot.get("total_member_vs_member", {}),
+            }
+        )
+        regardings.append(regarding)
+    Regarding.objects.bulk_update(regardings, ["balance_json"], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0037_alter_expense_date_alter_expensegroup_drive_id_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="regarding",
+            name="balance_json",
+            field=models.JSONField(
+                default=dict,
+                encoder=django.core.serializers.json.DjangoJSONEncoder,
+                null=True,
+                verbose_name="Balance Data",
+            ),
+        ),
+        migrations.RunPython(
+            convert_balance_json_to_snapshot, convert_snapshot_to_balance_json
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.1 on 2026-10-18 16:06
+
+from django.db import migrations, models
+from collections import defaultdict
+
+
+def classify_items(apps, schema_editor):
+    Item = apps.get_model("core", "Item")
+    Membership = apps.get_model("core", "Membership")
+    members_by_group = defaultdict(set)
+    for group_id, user_id in Membership.objects.values_list("group_id", "user_id"):
+        members_by_group[group_id].add(user_id)
+    consumers_by_item = defaultdict(set)
+    for item_id, user_id in Item.consumers.through.objects.values_list(
+        "item_id", "user_id"
+    ):
+        consumers_by_item[item_id].add(user_id)
+    items = []
+    for item in Item.objects.annotate(
+        group_id=models.F("expense__regarding__expense_group_id")
+    ).only("id"):
+        consumers = consumers_by_item[item.id]
+        if consumers == members_by_group[item.group_id]:
+            item.split_type = "SHARED"
+        elif len(consumers) == 1:
+            item.split_type = "INDIVIDUAL"
+        else:
+            item.split_type = "PARTIAL"
+        item.consumers_count = len(consumers)
+        items.append(item)
+    Item.objects.bulk_update(items, ["split_type", "consumers_count"], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0038_alter_regarding_balance_json"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="consumers_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Number of Consumers"
+            ),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="split_type",
+            field=models.CharField(
+                choices=[
+                    ("SHARED", "COMPARTILHADO"),
+                    ("PARTIAL", "PARCIALMENTE COMPARTILHADO"),
+                    ("INDIVIDUAL", "INDIVIDUAL"),
+                ],
+                db_index=True,
+                default="PARTIAL",
+                max_length=10,
+                verbose_name="Split Type",
+            ),
+        ),
+        migrations.RunPython(classify_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1 on 2026-10-18 16:08
+
+from django.db import migrations, models
+from collections import defaultdict
+
+
+def expand_shared_items(apps, schema_editor):
+    Item = apps.get_model("core", "Item")
+    Membership = apps.get_model("core", "Membership")
+    members_by_group = defaultdict(list)
+    for group_id, user_id in Membership.objects.values_list("group_id", "user_id"):
+        members_by_group[group_id].append(user_id)
+    consumers = []
+    for item_id, group_id in Item.objects.filter(shared_by_all=True).values_list(
+        "id", "expense__regarding__expense_group_id"
+    ):
+        for user_id in members_by_group[group_id]:
+            consumers.append(Item.consumers.through(item_id=item_id, user_id=user_id))
+    Item.consumers.through.objects.bulk_create(consumers, batch_size=2000)
+    Item.objects.filter(shared_by_all=True).update(shared_by_all=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0039_item_consumers_count_item_split_type"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="shared_by_all",
+            field=models.BooleanField(
+                default=False, verbose_name="Shared by all members?"
+            ),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, expand_shared_items),
+    ]
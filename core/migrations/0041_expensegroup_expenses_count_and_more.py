@@ -0,0 +1,63 @@
+# Generated by Django 4.1 on 2026-10-18 16:26
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+COUNTERS = [
+    ("Regarding", "expenses_count", "Expense", "regarding"),
+    ("ExpenseGroup", "regardings_count", "Regarding", "expense_group"),
+    ("ExpenseGroup", "expenses_count", "Expense", "regarding__expense_group"),
+    ("PaymentMethod", "payments_count", "Payment", "payment_method"),
+]
+
+
+def fill_counters(apps, schema_editor):
+    for model_name, field, counted_model_name, lookup in COUNTERS:
+        model = apps.get_model("core", model_name)
+        counted_model = apps.get_model("core", counted_model_name)
+        counts = (
+            counted_model.objects.filter(**{lookup: models.OuterRef("pk")})
+            .order_by()
+            .values(lookup)
+            .annotate(count=models.Count("pk"))
+            .values("count")
+        )
+        model.objects.update(**{field: Coalesce(models.Subquery(counts), 0)})
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0040_item_shared_by_all"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expensegroup",
+            name="expenses_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Number of Expenses"
+            ),
+        ),
+        migrations.AddField(
+            model_name="expensegroup",
+            name="regardings_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Number of Regardings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="paymentmethod",
+            name="payments_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Number of Payments"
+            ),
+        ),
+        migrations.AddField(
+            model_name="regarding",
+            name="expenses_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Number of Expenses"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
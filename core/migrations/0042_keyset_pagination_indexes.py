@@ -0,0 +1,46 @@
+# Generated by Django 4.1 on 2026-10-18 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0041_expensegroup_expenses_count_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="actionlog",
+            index=models.Index(
+                fields=["created_at", "id"], name="actionlog_created_at_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["date", "id"], name="expense_date_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                fields=["created_at", "id"], name="item_created_at_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["created_at", "id"], name="notification_created_at_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["created_at", "id"], name="payment_created_at_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="validation",
+            index=models.Index(
+                fields=["created_at", "id"], name="validation_created_at_id_idx"
+            ),
+        ),
+    ]
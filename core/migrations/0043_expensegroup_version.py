@@ -0,0 +1,19 @@
+# Generated by Django 4.1 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0042_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expensegroup",
+            name="version",
+            field=models.PositiveBigIntegerField(
+                default=0, verbose_name="Change Version"
+            ),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.1 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0043_expensegroup_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=32, verbose_name="Model")),
+                ("object_id", models.PositiveBigIntegerField(verbose_name="Object ID")),
+                (
+                    "group_id",
+                    models.PositiveBigIntegerField(
+                        blank=True, null=True, verbose_name="Expense Group ID"
+                    ),
+                ),
+                (
+                    "user_id",
+                    models.PositiveBigIntegerField(
+                        blank=True, null=True, verbose_name="User ID"
+                    ),
+                ),
+                ("deleted_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["updated_at"], name="expense_updated_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["updated_at"], name="item_updated_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "updated_at"], name="notification_user_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(fields=["updated_at"], name="payment_updated_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="regarding",
+            index=models.Index(fields=["updated_at"], name="regarding_updated_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="validation",
+            index=models.Index(fields=["updated_at"], name="validation_updated_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(
+                fields=["group_id", "deleted_at"], name="tombstone_group_deleted_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(
+                fields=["user_id", "deleted_at"], name="tombstone_user_deleted_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 4.1 on 2026-10-18 16:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0044_sync_tombstones"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="notification",
+            name="notification_created_at_id_idx",
+        ),
+        migrations.AlterField(
+            model_name="actionlog",
+            name="expense_group",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="actions_log",
+                to="core.expensegroup",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="expense",
+            name="regarding",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="expenses",
+                to="core.regarding",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="groupinvitation",
+            name="invited",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="invitations_received",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="notifications",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="actionlog",
+            index=models.Index(
+                fields=["expense_group", "created_at"],
+                name="actionlog_group_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["regarding", "date"], name="expense_regarding_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["validation_status"], name="expense_validation_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                condition=models.Q(("payment_status", "PAID"), _negated=True),
+                fields=["payment_status"],
+                name="expense_unpaid_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expensegroup",
+            index=models.Index(fields=["hash_id"], name="expensegroup_hash_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="groupinvitation",
+            index=models.Index(
+                fields=["invited", "status"], name="invitation_invited_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "created_at", "id"],
+                name="notification_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("was_sent", False)),
+                fields=["user"],
+                name="notification_unsent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("payment_status", "PAID"), _negated=True),
+                fields=["payment_status"],
+                name="payment_unpaid_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="regarding",
+            index=models.Index(
+                condition=models.Q(("is_closed", False)),
+                fields=["end_date"],
+                name="regarding_open_end_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(fields=["deleted_at"], name="tombstone_deleted_at_idx"),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 4.1 on 2026-10-18 20:10
+
+from django.db import migrations
+from collections import defaultdict
+from decimal import Decimal
+
+MEMBER_FIELDS = ["shared", "partial_shared", "individual", "total_paid_shared"]
+
+
+def calculate_regarding_ledger(apps, regarding):
+    Membership = apps.get_model("core", "Membership")
+    Item = apps.get_model("core", "Item")
+    Payment = apps.get_model("core", "Payment")
+    members_ids = set(
+        Membership.objects.filter(group_id=regarding.expense_group_id).values_list(
+            "user_id", flat=True
+        )
+    )
+    first_payers = {}
+    for expense_id, payer_id in (
+        Payment.objects.filter(expense__regarding_id=regarding.id)
+        .order_by("expense_id", "id")
+        .values_list("expense_id", "payer_id")
+    ):
+        first_payers.setdefault(expense_id, payer_id)
+    consumers_by_item = defaultdict(list)
+    for item_id, user_id in Item.consumers.through.objects.filter(
+        item__expense__regarding_id=regarding.id
+    ).values_list("item_id", "user_id"):
+        consumers_by_item[item_id].append(user_id)
+
+    members_totals = defaultdict(lambda: dict.fromkeys(MEMBER_FIELDS, Decimal(0)))
+    for member_id in members_ids:  # Every member gets a row, even without items
+        members_totals[member_id]
+    debts = defaultdict(Decimal)
+    for item_id, price, split_type, expense_id in Item.objects.filter(
+        expense__regarding_id=regarding.id
+    ).values_list("id", "price", "split_type", "expense_id"):
+        if expense_id not in first_payers:
+            continue
+        payer = first_payers[expense_id]
+        consumers = consumers_by_item[item_id]
+        if split_type == "SHARED":
+            for member_id in members_ids:
+                members_totals[member_id]["shared"] += price
+            members_totals[payer]["total_paid_shared"] += price
+        elif split_type == "INDIVIDUAL":
+            members_totals[consumers[0]]["individual"] += price
+            if consumers[0] != payer:
+                debts[(payer, consumers[0])] += price
+        else:
+            for consumer in consumers:
+                members_totals[consumer]["partial_shared"] += price
+                if consumer != payer:
+                    debts[(payer, consumer)] += price / len(consumers)
+    return members_totals, debts
+
+
+def backfill_regardings_ledger(apps, schema_editor):
+    Regarding = apps.get_model("core", "Regarding")
+    RegardingMemberLedger = apps.get_model("core", "RegardingMemberLedger")
+    RegardingDebtLedger = apps.get_model("core", "RegardingDebtLedger")
+    for regarding in Regarding.objects.filter(members_ledger__isnull=True).only(
+        "id", "expense_group_id"
+    ):
+        members_totals, debts = calculate_regarding_ledger(apps, regarding)
+        RegardingMemberLedger.objects.bulk_create(
+            [
+                RegardingMemberLedger(
+                    regarding=regarding, member_id=member_id, **totals
+                )
+                for member_id, totals in members_totals.items()
+            ]
+        )
+        RegardingDebtLedger.objects.bulk_create(
+            [
+                RegardingDebtLedger(
+                    regarding=regarding,
+                    creditor_id=creditor_id,
+                    debtor_id=debtor_id,
+                    value=value,
+                )
+                for (creditor_id, debtor_id), value in debts.items()
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0045_index_plan"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_regardings_ledger, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.contrib.postgres.fields import ArrayField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from datetime import datetime
 import hashlib
@@ -42,6 +43,14 @@ class ExpenseGroup(BaseModel):
     is_active = models.BooleanField("Is active?", default=True)
     hash_id = models.CharField("Hash ID", max_length=16, blank=True, null=True)
     drive_id = models.CharField("Drive ID", max_length=64, blank=True, null=True)
+    regardings_count = models.PositiveIntegerField("Number of Regardings", default=0)
+    expenses_count = models.PositiveIntegerField("Number of Expenses", default=0)
+    version = models.PositiveBigIntegerField("Change Version", default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["hash_id"], name="expensegroup_hash_id_idx"),  # Joining by code
+        ]
 
     def __str__(self):
         return self.name
@@ -80,7 +89,14 @@ class Regarding(BaseModel):
     end_date = models.DateField("End Date", null=True)
     expense_group = models.ForeignKey("ExpenseGroup", related_name="regardings", on_delete=models.CASCADE)
     is_closed = models.BooleanField("Is closed?", default=False)
-    balance_json = models.JSONField("Balance Data", default=dict, null=True)
+    balance_json = models.JSONField("Balance Data", default=dict, null=True, encoder=DjangoJSONEncoder)
+    expenses_count = models.PositiveIntegerField("Number of Expenses", default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["updated_at"], name="regarding_updated_at_idx"),
+            models.Index(fields=["end_date"], condition=models.Q(is_closed=False), name="regarding_open_end_date_idx"),
+        ]
 
     def __str__(self):
         return f"{self.expense_group.name} - {self.name} - ({self.description})"
@@ -104,6 +120,7 @@ class PaymentMethod(BaseModel):
     limit = models.DecimalField("Payment Limit Value", null=True, max_digits=14, decimal_places=4, blank=True)
     compensation_day = models.IntegerField("Payment Compensation Day", null=True, blank=True)
     is_active = models.BooleanField("Payment Method is active?", default=True)
+    payments_count = models.PositiveIntegerField("Number of Payments", default=0)
 
     def __str__(self):
         return f"{self.wallet} {self.type} - {self.description}"
@@ -121,6 +138,13 @@ class Payment(BaseModel):
     expense = models.ForeignKey("Expense", related_name="payments", on_delete=models.CASCADE, null=True, blank=True)
     payment_status = models.CharField("Payment Status", default=PaymentStatuses.AWAITING_VALIDATION, max_length=128, choices=PaymentStatuses.choices)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="payment_created_at_id_idx"),
+            models.Index(fields=["updated_at"], name="payment_updated_at_idx"),
+            models.Index(fields=["payment_status"], condition=~models.Q(payment_status="PAID"), name="payment_unpaid_idx"),
+        ]
+
     def __str__(self):
         return f"{self.expense.regarding.expense_group} - {self.expense.regarding.name} - {self.expense.name} - R${self.value} - {self.payer}"
 
@@ -139,7 +163,7 @@ class Expense(BaseModel):
 
     name = models.CharField("Name", max_length=128)
     description = models.TextField("Description", null=True, blank=True)
-    regarding = models.ForeignKey("Regarding", related_name="expenses", on_delete=models.CASCADE)
+    regarding = models.ForeignKey("Regarding", related_name="expenses", on_delete=models.CASCADE, db_index=False)
     date = models.DateField("Expense Date", default=datetime.today().date())
     cost = models.DecimalField("Expense Cost", max_digits=14, decimal_places=4)
     validated_by = models.ManyToManyField("User", through="Validation", blank=True, null=True)
@@ -148,6 +172,15 @@ class Expense(BaseModel):
     payment_status = models.CharField("Payment Status", default=PaymentStatuses.AWAITING_VALIDATION, max_length=128, choices=PaymentStatuses.choices)
     gallery = models.JSONField("Gallery", null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["date", "id"], name="expense_date_id_idx"),
+            models.Index(fields=["updated_at"], name="expense_updated_at_idx"),
+            models.Index(fields=["regarding", "date"], name="expense_regarding_date_idx"),
+            models.Index(fields=["validation_status"], name="expense_validation_status_idx"),
+            models.Index(fields=["payment_status"], condition=~models.Q(payment_status="PAID"), name="expense_unpaid_idx"),
+        ]
+
     def __str__(self):
         return f"{self.regarding.expense_group} - {self.regarding.name} - {self.name} - R${self.cost:.2f}"
 
@@ -162,24 +195,51 @@ class Tag(BaseModel):
 
 
 class Item(BaseModel):
+    class SplitTypes(models.TextChoices):
+        SHARED = ("SHARED", "COMPARTILHADO")
+        PARTIAL = ("PARTIAL", "PARCIALMENTE COMPARTILHADO")
+        INDIVIDUAL = ("INDIVIDUAL", "INDIVIDUAL")
     name = models.CharField("Name", max_length=128)
     tags = models.ForeignKey("Tag", related_name="items", on_delete=models.CASCADE, null=True, blank=True)
     price = models.DecimalField("Price", max_digits=14, decimal_places=4)
     expense = models.ForeignKey("Expense", related_name="items", on_delete=models.CASCADE, null=True, blank=True)
     consumers = models.ManyToManyField("User", related_name="items_purchased")
+    split_type = models.CharField("Split Type", max_length=10, choices=SplitTypes.choices, default=SplitTypes.PARTIAL,
+                                  db_index=True)
+    consumers_count = models.PositiveIntegerField("Number of Consumers", default=0)
+    shared_by_all = models.BooleanField("Shared by all members?", default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="item_created_at_id_idx"),
+            models.Index(fields=["updated_at"], name="item_updated_at_idx"),
+        ]
 
     def __str__(self):
         return f"{self.expense.regarding} - {self.expense.name} - {self.name} - R${self.price:.2f}"
 
+    def get_consumers(self):
+        if self.shared_by_all:  # Consumed by the current members, without rows in the consumers table
+            return self.expense.regarding.expense_group.members.all()
+        return self.consumers.all()
+
 
 class Notification(BaseModel):
     title = models.CharField("Notification Title", max_length=128)
     body = models.TextField("Notification Body")
     payload = models.JSONField("Notification Payload", null=True, blank=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications", db_index=False)
     was_sent = models.BooleanField("Notification sent?", default=False)
     is_active = models.BooleanField("Is active?", default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"], name="notification_user_created_idx"),
+            models.Index(fields=["user", "updated_at"], name="notification_user_updated_idx"),
+            models.Index(fields=["user"], condition=models.Q(was_sent=False), name="notification_unsent_idx"),
+        ]
+
+
 class Validation(BaseModel):
     validator = models.ForeignKey("User", on_delete=models.CASCADE, related_name="requested_validations")
     expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name="validations")
@@ -187,6 +247,12 @@ class Validation(BaseModel):
     validated_at = models.DateField("Validation Date", null=True, blank=True)
     is_active = models.BooleanField("Is active?", default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="validation_created_at_id_idx"),
+            models.Index(fields=["updated_at"], name="validation_updated_at_idx"),
+        ]
+
 
 class ActionLog(BaseModel):
     class ActionTypes(models.TextChoices):
@@ -194,11 +260,18 @@ class ActionLog(BaseModel):
         UPDATE = ("UPDATE", "EDITOU")
         DELETE = ("DELETE", "DELETOU")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="performed_actions")
-    expense_group = models.ForeignKey("ExpenseGroup", related_name="actions_log", on_delete=models.CASCADE)
+    expense_group = models.ForeignKey("ExpenseGroup", related_name="actions_log", on_delete=models.CASCADE,
+                                      db_index=False)
     type = models.CharField("Action type", default=ActionTypes.CREATE, max_length=128, choices=ActionTypes.choices)
     description = models.TextField("Description", null=True, blank=True)
     changes_json = models.JSONField("Changes JSON", default=dict, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="actionlog_created_at_id_idx"),
+            models.Index(fields=["expense_group", "created_at"], name="actionlog_group_created_idx"),
+        ]
+
 
 class GroupInvitation(BaseModel):
     class InvitationStatus(models.TextChoices):
@@ -206,6 +279,54 @@ class GroupInvitation(BaseModel):
         ACCEPTED = ("ACCEPTED", "ACEITO")
         REJECTED = ("REJECTED", "REJEITADO")
     sent_by = models.ForeignKey("User", on_delete=models.CASCADE, related_name="invitations_sent", null=True, blank=True)
-    invited = models.ForeignKey("User", on_delete=models.CASCADE, related_name="invitations_received", null=True, blank=True)
+    invited = models.ForeignKey("User", on_delete=models.CASCADE, related_name="invitations_received", null=True, blank=True,
+                                db_index=False)
     expense_group = models.ForeignKey("ExpenseGroup", related_name="invitations", on_delete=models.CASCADE)
     status = models.CharField("Status", default=InvitationStatus.AWAITING, max_length=128, choices=InvitationStatus.choices)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["invited", "status"], name="invitation_invited_status_idx"),
+        ]
+
+
+class RegardingMemberLedger(BaseModel):
+    regarding = models.ForeignKey("Regarding", related_name="members_ledger", on_delete=models.CASCADE)
+    member = models.ForeignKey("User", related_name="regardings_ledger", on_delete=models.CASCADE)
+    shared = models.DecimalField("Shared Total", max_digits=14, decimal_places=4, default=0)
+    partial_shared = models.DecimalField("Partial Shared Total", max_digits=14, decimal_places=4, default=0)
+    individual = models.DecimalField("Individual Total", max_digits=14, decimal_places=4, default=0)
+    total_paid_shared = models.DecimalField("Paid Shared Total", max_digits=14, decimal_places=4, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["regarding", "member"], name="unique_regarding_member_ledger")
+        ]
+
+
+class RegardingDebtLedger(BaseModel):
+    regarding = models.ForeignKey("Regarding", related_name="debts_ledger", on_delete=models.CASCADE)
+    creditor = models.ForeignKey("User", related_name="credits_ledger", on_delete=models.CASCADE)
+    debtor = models.ForeignKey("User", related_name="debts_ledger", on_delete=models.CASCADE)
+    value = models.DecimalField("Debt Value", max_digits=24, decimal_places=12, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["regarding", "creditor", "debtor"], name="unique_regarding_debt_ledger")
+        ]
+
+
+class Tombstone(models.Model):
+    # Deleted rows, so offline clients syncing by updated_at also learn about deletions
+    model = models.CharField("Model", max_length=32)
+    object_id = models.PositiveBigIntegerField("Object ID")
+    group_id = models.PositiveBigIntegerField("Expense Group ID", null=True, blank=True)
+    user_id = models.PositiveBigIntegerField("User ID", null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["group_id", "deleted_at"], name="tombstone_group_deleted_idx"),
+            models.Index(fields=["user_id", "deleted_at"], name="tombstone_user_deleted_idx"),
+            models.Index(fields=["deleted_at"], name="tombstone_deleted_at_idx"),  # Pruning
+        ]
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+CURSOR_SEPARATOR = "|"
+
+
+class KeysetPagination(CursorPagination):
+    # Pages on the (ordering value, id) keys of the view's cursor_ordering, so every page is a range scan on the
+    # matching composite index however deep it is, and ties are broken by the id instead of DRF's offsets.
+    ordering = ("-created_at", "-id")
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def is_requested(self, request):
+        return self.cursor_query_param in request.query_params or self.page_size_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if settings.PAGINATION_OPT_IN and not self.is_requested(request):  # Legacy clients still get whole lists
+            return None
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = getattr(view, "cursor_ordering", self.ordering)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        ordering = [self.reverse_field(field) for field in self.ordering] if reverse else list(self.ordering)
+        keys_queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            keys_queryset = keys_queryset.filter(self.get_keyset_filter(ordering, self.decode_position(queryset)))
+        keys = list(keys_queryset.values_list(*[field.lstrip("-") for field in ordering])[:self.page_size + 1])
+
+        has_following = len(keys) > self.page_size
+        keys = keys[:self.page_size]
+        if reverse:
+            keys.reverse()
+        self.has_next = self.cursor is not None if reverse else has_following
+        self.has_previous = has_following if reverse else self.cursor is not None
+        self.first_key = keys[0] if keys else None
+        self.last_key = keys[-1] if keys else None
+        return queryset.filter(id__in=[key[-1] for key in keys]).order_by(*self.ordering)
+
+    def reverse_field(self, field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def get_keyset_filter(self, ordering, position):
+        keyset_filter, previous = Q(), {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            keyset_filter |= Q(**previous, **{f"{name}__{'lt' if field.startswith('-') else 'gt'}": value})
+            previous[name] = value
+        return keyset_filter
+
+    def decode_position(self, queryset):
+        values = (self.cursor.position or "").split(CURSOR_SEPARATOR)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [queryset.model._meta.get_field(field.lstrip("-")).to_python(value)
+                    for field, value in zip(self.ordering, values)]
+        except (ValidationError, ValueError):  # Tampered cursors, or cursors of another ordering
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_position(self, key):
+        return CURSOR_SEPARATOR.join(str(value) for value in key)
+
+    def get_next_link(self):
+        if not self.has_next or self.last_key is None:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.encode_position(self.last_key)))
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_key is None:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.encode_position(self.first_key)))
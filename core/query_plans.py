@@ -0,0 +1,96 @@
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import RelatedField
+
+# Derives the select_related/prefetch_related/only() plan that lets a serializer tree render a queryset without
+# lazy queries. Model fields and nested serializers are planned from their sources; what SerializerMethodFields
+# and to_representation overrides read is declared in the serializer's field_lookups, keyed by field name.
+
+
+class QueryPlan:
+    def __init__(self, model, parent_link=None):
+        self.model = model
+        self.fields = {model._meta.pk.name}
+        self.selects = {}
+        self.prefetches = {}
+        self.parent_link = parent_link  # (name, plan) of the relation set back to the parent object by Django
+
+    def add_field(self, name):
+        if self.parent_link and self.parent_link[0] == name:
+            return self.parent_link[1]
+        field = self.model._meta.get_field(name)
+        if not field.is_relation:
+            self.fields.add(name)
+            return None
+        if field.many_to_many or field.one_to_many:
+            if name not in self.prefetches:
+                parent_link = (field.field.name, self) if field.one_to_many else None
+                self.prefetches[name] = QueryPlan(field.related_model, parent_link)
+                if field.one_to_many:  # Matches the prefetched rows to their parents
+                    self.prefetches[name].fields.add(field.field.name)
+            return self.prefetches[name]
+        if name not in self.selects:
+            parent_link = None if field.concrete else (field.field.name, self)
+            self.selects[name] = QueryPlan(field.related_model, parent_link)
+            if not field.concrete:
+                self.selects[name].fields.add(field.field.name)
+        if field.concrete:
+            self.fields.add(name)
+        return self.selects[name]
+
+    def add_lookup(self, lookup):
+        plan = self
+        for name in lookup.split("__"):
+            plan = plan.add_field(name)
+        return plan
+
+    def add_serializer(self, serializer):
+        lookups = getattr(serializer, "field_lookups", {})
+        for name, field in serializer.fields.items():
+            for lookup in lookups.get(name, []):
+                self.add_lookup(lookup)
+            if field.write_only or field.source == "*":
+                continue
+            source = "__".join(field.source_attrs)
+            if isinstance(field, serializers.ListSerializer):
+                self.add_lookup(source).add_serializer(field.child)
+            elif isinstance(field, serializers.BaseSerializer):
+                self.add_lookup(source).add_serializer(field)
+            elif isinstance(field, RelatedField) and len(field.source_attrs) == 1:  # Only its primary key is read
+                self.fields.add(source)
+            else:
+                self.add_lookup(source)
+        return self
+
+    def collect(self, prefix, selects, fields, prefetches):
+        fields += [prefix + name for name in self.fields]
+        for name, plan in self.selects.items():
+            selects.append(prefix + name)
+            plan.collect(f"{prefix}{name}__", selects, fields, prefetches)
+        for name, plan in self.prefetches.items():
+            prefetches.append(Prefetch(prefix + name, queryset=plan.apply(plan.model._default_manager.all())))
+
+    def apply(self, queryset):
+        selects, fields, prefetches = [], [], []
+        self.collect("", selects, fields, prefetches)
+        return queryset.select_related(*selects).prefetch_related(*prefetches).only(*fields)
+
+
+PLANS_CACHE_SIZE = 1024
+plans = {}
+
+
+def get_plan(serializer, model):
+    return QueryPlan(model).add_serializer(serializer)
+
+
+def get_cached_plan(get_serializer, model, cache_key):  # Walking the serializer tree costs more than the queries
+    if cache_key not in plans:
+        if len(plans) >= PLANS_CACHE_SIZE:
+            plans.clear()
+        plans[cache_key] = get_plan(get_serializer(), model)
+    return plans[cache_key]
+
+
+def plan_queryset(queryset, serializer):
+    return get_plan(serializer, queryset.model).apply(queryset)
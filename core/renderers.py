@@ -1,4 +1,9 @@
-from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+
+class RawJSONRenderer(JSONRenderer):
+    media_type = "application/vnd.expensemanager.raw+json"
+    format = "raw"
 
 
 class BrowsableAPIRendererWithoutForm(BrowsableAPIRenderer):
@@ -3,28 +3,88 @@ from rest_framework import serializers
 from core.models import ExpenseGroup, Regarding, Wallet, PaymentMethod, Payment, Expense, Tag, Item, \
     User, Notification, Validation, ActionLog, Membership, GroupInvitation
 from datetime import datetime
+from django.db import models
 from django.db.models import Sum
-from core.services import stats, google_drive
-from babel.numbers import format_decimal
+from core.services import stats, stats_cache, google_drive, regardings
+from core.formatting import format_money, format_date, format_datetime
+from core.renderers import RawJSONRenderer
 from decimal import Decimal
-import json
 
 
-class PaymentMethodSerializer(serializers.ModelSerializer):
+def is_raw_requested(request):
+    renderer = getattr(request, "accepted_renderer", None)
+    return renderer is not None and renderer.format == RawJSONRenderer.format
+
+
+SPARSE_FIELDS_PARAMS = ("fields", "omit", "expand")
+
+
+def parse_sparse_fields(value):
+    tree = {}
+    for path in value.split(","):
+        node = tree
+        for name in path.strip().split("."):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def is_sparse_fields_requested(request):
+    query_params = getattr(request, "query_params", {})
+    return getattr(request, "method", None) in ("GET", "HEAD") and any(param in query_params for param in SPARSE_FIELDS_PARAMS)
+
+
+class SparseFieldsMixin:
+    # ?fields= keeps only the listed fields, ?omit= drops them and ?expand= keeps only the listed nested serializers.
+    # Nested serializers are reached with dots, e.g. ?fields=name,payments.value
+    @property
+    def sparse_fields(self):
+        parent, name = self.parent, self.field_name
+        if isinstance(parent, serializers.ListSerializer):
+            parent, name = parent.parent, parent.field_name
+        if parent is None:
+            request = self.context.get("request")
+            if not is_sparse_fields_requested(request):
+                return dict.fromkeys(SPARSE_FIELDS_PARAMS)
+            return {param: parse_sparse_fields(request.query_params[param]) if param in request.query_params else None
+                    for param in SPARSE_FIELDS_PARAMS}
+        parent_sparse_fields = getattr(parent, "sparse_fields", dict.fromkeys(SPARSE_FIELDS_PARAMS))
+        return {param: (tree or {}).get(name) or None for param, tree in parent_sparse_fields.items()}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, omit, expand = self.sparse_fields.values()
+        for name, field in list(fields.items()):
+            if only is not None and name not in only:
+                del fields[name]
+            elif omit is not None and omit.get(name) == {}:
+                del fields[name]
+            elif expand is not None and isinstance(field, serializers.BaseSerializer) and name not in expand \
+                    and name not in (only or {}):
+                del fields[name]
+        return fields
+
+    def build_nested_field(self, field_name, relation_info, nested_depth):  # Nested by Meta.depth
+        field_class, field_kwargs = super().build_nested_field(field_name, relation_info, nested_depth)
+        return type(field_class.__name__, (SparseFieldsMixin, field_class), {}), field_kwargs
+
+
+class PaymentMethodSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     has_payments = serializers.SerializerMethodField()
     number_of_payments = serializers.SerializerMethodField()
+    field_lookups = {"has_payments": ["payments_count"], "number_of_payments": ["payments_count"]}
     class Meta:
         model = PaymentMethod
-        exclude = ("created_at", "updated_at")
+        exclude = ("created_at", "updated_at", "payments_count")
 
     def get_has_payments(self, obj):
-        return obj.payments.count() > 0
+        return obj.payments_count > 0
 
     def get_number_of_payments(self, obj):
-        return obj.payments.count()
+        return obj.payments_count
 
 
-class WalletSerializer(serializers.ModelSerializer):
+class WalletSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     payment_methods = PaymentMethodSerializer(read_only=True, many=True)
     class Meta:
         model = Wallet
@@ -32,9 +92,10 @@ class WalletSerializer(serializers.ModelSerializer):
         depth = 1
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     wallet = WalletSerializer(read_only=True)
+    field_lookups = {"full_name": ["first_name", "last_name"]}
     class Meta:
         model = User
         exclude = ("password", "last_login", "is_superuser", "is_staff", "is_active", "date_joined", "groups", "user_permissions")
@@ -50,7 +111,7 @@ class MemberSerializer(UserSerializer):
         fields = ("id", "first_name", "last_name", "full_name")
 
 
-class MembershipSerializer(serializers.ModelSerializer):
+class MembershipSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = MemberSerializer(read_only=True)
     class Meta:
         model = Membership
@@ -59,16 +120,19 @@ class MembershipSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        level_index = Membership.Levels.values.index(ret['level'])
-        ret['level'] = Membership.Levels.labels[level_index].capitalize()
-        ret['joined_at'] = instance.joined_at.strftime("%d/%m/%Y")
+        if 'level' in ret:
+            level_index = Membership.Levels.values.index(ret['level'])
+            ret['level'] = Membership.Levels.labels[level_index].capitalize()
+        if 'joined_at' in ret:
+            ret['joined_at'] = format_date(instance.joined_at)
         return ret
 
 
-class GroupInvitationSerializer(serializers.ModelSerializer):
+class GroupInvitationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     sent_by = MemberSerializer(read_only=True)
     invited = MemberSerializer(read_only=True)
     group_name = serializers.SerializerMethodField()
+    field_lookups = {"group_name": ["expense_group__name"]}
 
     class Meta:
         model = GroupInvitation
@@ -76,39 +140,40 @@ class GroupInvitationSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['created_at'] = instance.created_at.strftime("%d/%m/%Y")
-        status_index = GroupInvitation.InvitationStatus.values.index(ret['status'])
-        ret['status'] = GroupInvitation.InvitationStatus.labels[status_index].capitalize()
+        if 'created_at' in ret:
+            ret['created_at'] = format_date(instance.created_at)
+        if 'status' in ret:
+            status_index = GroupInvitation.InvitationStatus.values.index(ret['status'])
+            ret['status'] = GroupInvitation.InvitationStatus.labels[status_index].capitalize()
         return ret
 
     def get_group_name(self, obj):
         return obj.expense_group.name
 
 
-class ExpenseGroupSerializerReader(serializers.ModelSerializer):
+class ExpenseGroupSerializerReader(SparseFieldsMixin, serializers.ModelSerializer):
     number_of_regardings = serializers.SerializerMethodField()
     number_of_expenses = serializers.SerializerMethodField()
     members = MemberSerializer(many=True, read_only=True)
     memberships = MembershipSerializer(many=True, read_only=True)
     invitations = GroupInvitationSerializer(many=True, read_only=True)
+    field_lookups = {"number_of_regardings": ["regardings_count"], "number_of_expenses": ["expenses_count"]}
 
     class Meta:
         model = ExpenseGroup
-        exclude = ("updated_at",)
+        exclude = ("updated_at", "regardings_count", "expenses_count", "version")
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['created_at'] = instance.created_at.strftime("%d/%m/%Y")
+        if 'created_at' in ret:
+            ret['created_at'] = format_date(instance.created_at)
         return ret
 
     def get_number_of_regardings(self, obj):
-        return obj.regardings.count()
+        return obj.regardings_count
 
     def get_number_of_expenses(self, obj):
-        count = 0
-        for regarding in obj.regardings.all():
-            count += regarding.expenses.count()
-        return count
+        return obj.expenses_count
 
 
 class ExpenseGroupSerializerWriter(serializers.ModelSerializer):
@@ -120,10 +185,19 @@ class ExpenseGroupSerializerWriter(serializers.ModelSerializer):
 class RegardingSerializerWriter(serializers.ModelSerializer):
     class Meta:
         model = Regarding
-        fields = "__all__"
+        exclude = ("expenses_count",)
+
 
+class RegardingListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        regardings = list(data.all() if isinstance(data, models.Manager) else data)
+        if set(self.child.fields) & set(RegardingSerializerReader.TOTALS_FIELDS):
+            open_regardings = [regarding for regarding in regardings if not regarding.is_closed and regarding.expenses_count]
+            self.child.totals_by_regarding = stats_cache.get_totals_of_regardings(open_regardings)
+        return super().to_representation(regardings)
 
-class RegardingSerializerReader(serializers.ModelSerializer):
+
+class RegardingSerializerReader(SparseFieldsMixin, serializers.ModelSerializer):
     group_name = serializers.SerializerMethodField()
     has_expenses = serializers.SerializerMethodField()
     general_total = serializers.SerializerMethodField()
@@ -134,42 +208,55 @@ class RegardingSerializerReader(serializers.ModelSerializer):
 
     class Meta:
         model = Regarding
-        exclude = ("created_at", "updated_at")
+        exclude = ("created_at", "updated_at", "expenses_count")
+        list_serializer_class = RegardingListSerializer
+
+    TOTALS_FIELDS = ["has_expenses", "general_total", "consumer_total", "personal_total", "total_by_day",
+                     "total_member_vs_member"]
+    field_lookups = {
+        "group_name": ["expense_group__name"],
+        **{field: ["is_closed", "balance_json", "expense_group", "expenses_count"] for field in TOTALS_FIELDS},
+    }
 
     def get_group_name(self, obj):
         return obj.expense_group.name
 
     def get_general_total(self, obj):
+        self.load_totals(obj)
+        return self.general_total
+
+    def load_totals(self, obj):
+        if getattr(self, "totals_loaded_for", None) is obj:  # Shared by the totals fields of the same regarding
+            return
+        self.totals_loaded_for = obj
+        self.has_expenses = obj.expenses_count > 0
         if type(self.context["request"]) == dict:
             self.user = self.context["request"].get("user")
         else:
             self.user = self.context["request"].user
-        if obj.is_closed:
-            totals = json.loads(obj.balance_json) if type(obj.balance_json) == str else {}
-            self.general_total = totals.get('general_total', {})
-            self.consumer_total = totals.get('consumer_total', {})
-            self.total_by_day = totals.get('total_by_day', {})
-            self.total_member_vs_member = totals.get('total_member_vs_member', {})
-            user_data = self.consumer_total.get(str(self.user.id), {})
-        else:
-            self.general_total = {
-                "regarding": obj.id,
-                "total_expenses": 0,
-                "total_payments": 0,
-                "total_validation": 0.0,
-                "total_open": 0,
-                "total_paid": 0,
-                "total_overdue": 0.0
-            }
-            self.personal_total = {}
-            self.consumer_total = {}
-            self.total_by_day = {}
-            self.total_member_vs_member = {}
-            if obj.expenses.count():
-                items = Item.objects.select_related("expense", "expense__regarding").prefetch_related("consumers", "expense__payments", "expense__payments__payer", "expense__payments__payment_method", "expense__validated_by").filter(expense__regarding__id=obj.id)
-                items = ItemSerializerReader(items, many=True).data
-                self.general_total, self.consumer_total, self.total_by_day, self.total_member_vs_member = stats.calculate_totals_of_regarding(obj, items)
-            user_data = self.consumer_total.get(self.user.id, {})
+        self.general_total = {
+            "regarding": obj.id,
+            "total_expenses": 0,
+            "total_payments": 0,
+            "total_validation": 0.0,
+            "total_open": 0,
+            "total_paid": 0,
+            "total_overdue": 0.0
+        }
+        self.personal_total = {}
+        self.consumer_total = {}
+        self.total_by_day = {}
+        self.total_member_vs_member = {}
+        if self.has_expenses:
+            totals_by_regarding = getattr(self, "totals_by_regarding", {})
+            if obj.is_closed:
+                totals = regardings.load_balance_snapshot(obj.balance_json)
+            elif obj.id in totals_by_regarding:
+                totals = totals_by_regarding[obj.id]
+            else:
+                totals = stats_cache.get_totals_of_regarding(obj)
+            self.general_total, self.consumer_total, self.total_by_day, self.total_member_vs_member = totals
+        user_data = self.consumer_total.get(self.user.id, {})
         if user_data:
             self.personal_total = user_data
         else:
@@ -183,12 +270,19 @@ class RegardingSerializerReader(serializers.ModelSerializer):
             "expected_total_paid": 0,
             "balance": 0
         }
-        return self.general_total
+        if self.is_settlement_requested():
+            self.total_member_vs_member = stats.settle_balances(self.consumer_total)
+
+    def is_settlement_requested(self):
+        request = self.context["request"]
+        return type(request) != dict and request.query_params.get("settlement") == "minimal"
 
     def get_consumer_total(self, obj):
+        self.load_totals(obj)
         return self.consumer_total
 
     def get_personal_total(self, obj):
+        self.load_totals(obj)
         if not self.has_expenses:
             return {
                 "payments__payer": self.user.id,
@@ -207,29 +301,36 @@ class RegardingSerializerReader(serializers.ModelSerializer):
         return self.personal_total
 
     def get_total_by_day(self, obj):
+        self.load_totals(obj)
         return self.total_by_day
 
     def get_total_member_vs_member(self, obj):
+        self.load_totals(obj)
         return self.total_member_vs_member
 
     def get_has_expenses(self, obj):
-        self.has_expenses = obj.expenses.count() > 0
+        self.load_totals(obj)
         return self.has_expenses
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['start_date'] = instance.start_date.strftime("%d/%m/%Y")
-        ret['end_date'] = instance.end_date.strftime("%d/%m/%Y")
-        if not instance.is_closed:
-            for key, value in ret['personal_total'].items():
+        if is_raw_requested(self.context.get("request")):
+            return ret
+        if 'start_date' in ret:
+            ret['start_date'] = format_date(instance.start_date)
+        if 'end_date' in ret:
+            ret['end_date'] = format_date(instance.end_date)
+        if 'personal_total' in ret or 'general_total' in ret:
+            for key, value in ret.get('personal_total', {}).items():
                 if key not in ["payments__payer", "full_name"]:
-                    ret['personal_total'][key] = format_decimal(value, locale="pt_BR", format="#.###,00")
-            for key, value in ret['general_total'].items():
+                    ret['personal_total'][key] = format_money(value)
+            for key, value in ret.get('general_total', {}).items():
                 if key != "regarding":
-                    ret['general_total'][key] = format_decimal(value, locale="pt_BR", format="#.###,00")
+                    ret['general_total'][key] = format_money(value)
+        if 'total_member_vs_member' in ret:
             for member, debtors in ret['total_member_vs_member'].items():
                 for debtor, value in ret['total_member_vs_member'][member].items():
-                    ret['total_member_vs_member'][member][debtor] = format_decimal(value, locale="pt_BR", format="#.###,00")
+                    ret['total_member_vs_member'][member][debtor] = format_money(value)
         return ret
 
 
@@ -238,12 +339,21 @@ class PaymentSerializerWriter(serializers.ModelSerializer):
         model = Payment
         fields = "__all__"
 
-class PaymentSerializerReader(serializers.ModelSerializer):
+class PaymentMethodSerializerForPayment(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PaymentMethod
+        exclude = ("payments_count",)
+
+
+class PaymentSerializerReader(SparseFieldsMixin, serializers.ModelSerializer):
     payer = serializers.SerializerMethodField(read_only=True)
     payer_name = serializers.SerializerMethodField()
+    payment_method = PaymentMethodSerializerForPayment(read_only=True)
+    field_lookups = {"payer": ["payer__first_name", "payer__last_name"],
+                     "payer_name": ["payer__first_name", "payer__last_name"]}
     class Meta:
         model = Payment
-        exclude = ("updated_at",)
+        fields = ("id", "payer", "payer_name", "created_at", "value", "payment_status", "payment_method", "expense")
         depth = 1
 
     def get_payer_name(self, obj):
@@ -254,25 +364,33 @@ class PaymentSerializerReader(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['value'] = format_decimal(instance.value, locale="pt_BR", format="#.###,00")
+        if 'value' in ret:
+            ret['value'] = instance.value if is_raw_requested(self.context.get("request")) else format_money(instance.value)
         return ret
 
 
-class ItemSerializerForExpense(serializers.ModelSerializer):
+class ItemSerializerForExpense(SparseFieldsMixin, serializers.ModelSerializer):
     consumers_names = serializers.SerializerMethodField()
     consumers = serializers.SerializerMethodField()
+    field_lookups = {
+        field: ["shared_by_all", "consumers__first_name", "consumers__last_name",
+                "expense__regarding__expense_group__members__first_name",
+                "expense__regarding__expense_group__members__last_name"]
+        for field in ["consumers_names", "consumers"]
+    }
     class Meta:
         model = Item
         fields = ["id", "name", "price", "expense", "consumers_names", "consumers", "created_at"]
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['price'] = format_decimal(instance.price, locale="pt_BR", format="#.###,00")
+        if 'price' in ret:
+            ret['price'] = instance.price if is_raw_requested(self.context.get("request")) else format_money(instance.price)
         return ret
 
     def get_consumers_names(self, obj):
         names = ''
-        for consumer in obj.consumers.all():
+        for consumer in obj.get_consumers():
             names += consumer.first_name
             if consumer.last_name:
                 names += " " + consumer.last_name
@@ -281,7 +399,7 @@ class ItemSerializerForExpense(serializers.ModelSerializer):
 
     def get_consumers(self, obj):
         data = []
-        for consumer in obj.consumers.all():
+        for consumer in obj.get_consumers():
             data.append({"id": consumer.id, "name": consumer.first_name + " " + consumer.last_name})
         return data
 
@@ -290,11 +408,13 @@ class ExpenseSerializerWriter(serializers.ModelSerializer):
         model = Expense
         fields = ("name", "description", "regarding", "cost", "date", "created_by")
 
-class ValidationSerializerReader(serializers.ModelSerializer):
+class ValidationSerializerReader(SparseFieldsMixin, serializers.ModelSerializer):
     requested_by = serializers.SerializerMethodField()
     is_validated = serializers.SerializerMethodField()
     validator = UserSerializer()
     status = serializers.SerializerMethodField()
+    field_lookups = {"requested_by": ["expense__created_by__first_name", "expense__created_by__last_name"],
+                     "is_validated": ["validated_at"], "status": ["is_active", "validated_at"]}
 
     class Meta:
         model = Validation
@@ -312,8 +432,10 @@ class ValidationSerializerReader(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['created_at'] = instance.created_at.strftime("%d/%m/%Y")
-        ret['validated_at'] = instance.validated_at.strftime("%d/%m/%Y") if instance.validated_at else None
+        if 'created_at' in ret:
+            ret['created_at'] = format_date(instance.created_at)
+        if 'validated_at' in ret:
+            ret['validated_at'] = format_date(instance.validated_at) if instance.validated_at else None
         return ret
 
     def get_status(self, obj):
@@ -330,7 +452,7 @@ class ValidationSerializerWriter(serializers.ModelSerializer):
         model = Validation
         fields = "__all__"
 
-class ExpenseSerializerReader(serializers.ModelSerializer):
+class ExpenseSerializerReader(SparseFieldsMixin, serializers.ModelSerializer):
     payments = PaymentSerializerReader(many=True)
     items = ItemSerializerForExpense(many=True)
     regarding_name = serializers.SerializerMethodField()
@@ -340,6 +462,12 @@ class ExpenseSerializerReader(serializers.ModelSerializer):
     validation_status = serializers.SerializerMethodField()
     regarding_is_closed = serializers.SerializerMethodField()
     expense_group = serializers.SerializerMethodField()
+    field_lookups = {
+        "regarding_name": ["regarding__name"],
+        "validation_status": ["validation_status"],
+        "regarding_is_closed": ["regarding__is_closed"],
+        "expense_group": ["regarding__expense_group"],
+    }
     class Meta:
         model = Expense
         exclude = ("created_at", "updated_at")
@@ -349,10 +477,14 @@ class ExpenseSerializerReader(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['cost'] = format_decimal(instance.cost, locale="pt_BR", format="#.###,00")
-        ret['date'] = instance.date.strftime("%d/%m/%Y")
-        index = Expense.PaymentStatuses.values.index(instance.payment_status)
-        ret['payment_status'] = Expense.PaymentStatuses.labels[index].capitalize()
+        raw = is_raw_requested(self.context.get("request"))
+        if 'cost' in ret:
+            ret['cost'] = instance.cost if raw else format_money(instance.cost)
+        if 'date' in ret and not raw:
+            ret['date'] = format_date(instance.date)
+        if 'payment_status' in ret:
+            index = Expense.PaymentStatuses.values.index(instance.payment_status)
+            ret['payment_status'] = Expense.PaymentStatuses.labels[index].capitalize()
         return ret
 
 
@@ -364,22 +496,11 @@ class ExpenseSerializerReader(serializers.ModelSerializer):
         elif obj.validation_status == Expense.ValidationStatuses.REJECTED:
             return "Rejeitada"
 
-    def get_shared_total(self, obj):  # Bug no individual
-        items = ItemSerializerReader(obj.items.all(), many=True).data
-        individual = 0
-        shared = 0
-        members = obj.regarding.expense_group.members.all()
-        for item in items:
-            if len(item["consumers"]) == len(members):
-                shared += Decimal(item["price"])
-            elif len(item["consumers"]) == 1 and item["consumers"][0] == self.context["request"].user.id:
-                individual += Decimal(item["price"])
-        self.shared = format_decimal(shared, locale="pt_BR", format="#.###,00")
-        self.individual = format_decimal(individual, locale="pt_BR", format="#.###,00")
-        return self.shared
+    def get_shared_total(self, obj):  # Annotated by ExpenseViewSet.get_queryset
+        return obj.shared_total if is_raw_requested(self.context.get("request")) else format_money(obj.shared_total)
 
     def get_individual_total(self, obj):
-        return self.individual
+        return obj.individual_total if is_raw_requested(self.context.get("request")) else format_money(obj.individual_total)
 
     def get_regarding_is_closed(self, obj):
         return obj.regarding.is_closed
@@ -388,51 +509,74 @@ class ExpenseSerializerReader(serializers.ModelSerializer):
         return obj.regarding.expense_group.id
 
 
-class ExpenseSerializerForItem(serializers.ModelSerializer):
+class ExpenseSerializerForItem(SparseFieldsMixin, serializers.ModelSerializer):
     payments = PaymentSerializerReader(many=True)
     class Meta:
         model = Expense
         exclude = ("created_at", "updated_at")
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = "__all__"
 
 
-class ItemSerializerReader(serializers.ModelSerializer):
+class ItemSerializerReader(SparseFieldsMixin, serializers.ModelSerializer):
     expense = ExpenseSerializerForItem()
+    field_lookups = {"consumers": ["shared_by_all", "expense__regarding__expense_group__members"]}
     class Meta:
         model = Item
         fields = "__all__"
 
+    def to_representation(self, instance):
+        ret = super().to_representation(instance)
+        if 'consumers' in ret and instance.shared_by_all:
+            ret['consumers'] = [consumer.id for consumer in instance.get_consumers()]
+        return ret
+
 
 class ItemSerializerWriter(serializers.ModelSerializer):
     class Meta:
         model = Item
         fields = "__all__"
+        read_only_fields = ("split_type", "consumers_count")
+        extra_kwargs = {"consumers": {"required": False, "allow_empty": True}}
+
+    def validate(self, attrs):
+        consumers = attrs.get("consumers")
+        if attrs.get("shared_by_all"):
+            attrs["consumers"] = []
+        elif consumers:  # Kept as rows, so members who join later do not consume it
+            attrs["shared_by_all"] = False
+        elif self.instance is None or consumers is not None or "shared_by_all" in attrs:
+            raise serializers.ValidationError({"consumers": self.fields["consumers"].error_messages["empty"]})
+        return attrs
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = "__all__"
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['created_at'] = instance.created_at.strftime("%d/%m/%Y")
+        if 'created_at' in ret:
+            ret['created_at'] = format_date(instance.created_at)
         return ret
 
 
-class ActionLogSerializer(serializers.ModelSerializer):
+class ActionLogSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer()
+    field_lookups = {"expense_group": ["expense_group__name"]}
     class Meta:
         model = ActionLog
         fields = "__all__"
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['created_at'] = instance.created_at.strftime("%d/%m/%Y %H:%M")
-        ret['expense_group'] = instance.expense_group.name
+        if 'created_at' in ret:
+            ret['created_at'] = format_datetime(instance.created_at)
+        if 'expense_group' in ret:
+            ret['expense_group'] = instance.expense_group.name
         return ret
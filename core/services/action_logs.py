@@ -1,7 +1,7 @@
 from core.models import GroupInvitation, Notification, ActionLog, User, Membership
 from core.services import push_notifications, expense_groups
 from core.serializers import UserSerializer
-from babel.numbers import format_currency
+from core.formatting import format_currency
 
 FIELDS_NAMES_PT = {
     'start_date': 'data inicial',
@@ -120,13 +120,13 @@ def batch_delete_expense(request, delete_by_groups):
 def delete_expense(request, expense):
     ActionLog.objects.create(user=request.user, expense_group_id=expense.regarding.expense_group.id,
                              type=ActionLog.ActionTypes.DELETE,
-                             description=f"Deletou a despesa {expense.name} de valor R$ {format_currency(expense.cost, 'BRL', '#,##0.00', locale='pt_BR')}")
+                             description=f"Deletou a despesa {expense.name} de valor R$ {format_currency(expense.cost)}")
 
 
 def new_expense(request, expense):
     ActionLog.objects.create(user=request.user, expense_group_id=expense.regarding.expense_group.id,
                              type=ActionLog.ActionTypes.CREATE,
-                             description=f"Criou a despesa {expense.name} de valor R$ {format_currency(expense.cost, 'BRL', '#,##0.00', locale='pt_BR')}")
+                             description=f"Criou a despesa {expense.name} de valor R$ {format_currency(expense.cost)}")
 
 
 def update_expense(request, expense, deleted_items=[], deleted_payments=[]):
@@ -144,9 +144,8 @@ def update_expense(request, expense, deleted_items=[], deleted_payments=[]):
             if (old := getattr(expense, field)) != (new := request.data.get(field)):
                 changes["descrição"].append(f"Mudou a descrição de {old} para {new}")
         elif field == "cost":
-            old = format_currency(getattr(expense, field), 'BRL', '#,##0.00', locale='pt_BR')
-            new = format_currency(float(request.data.get(field)), 'BRL', '#,##0.00',
-                                  locale='pt_BR')
+            old = format_currency(getattr(expense, field))
+            new = format_currency(float(request.data.get(field)))
             if old != new:
                 changes["valor"].append(f"Mudou o valor de R$ {old} para R$ {new}")
         elif field == 'date':
@@ -154,18 +153,18 @@ def update_expense(request, expense, deleted_items=[], deleted_payments=[]):
                 changes["data"].append(f"Mudou a data de '{old[8:10]}/{old[5:7]}/{old[:4]}' para '{new[8:10]}/{new[5:7]}/{new[:4]}'")
         elif field == 'items':
             for item in items_to_create:
-                changes["items"].append(f"Criou o item {item.get('name')} R${format_currency(item.get('price'), 'BRL', '#,##0.00', locale='pt_BR')}")
+                changes["items"].append(f"Criou o item {item.get('name')} R${format_currency(item.get('price'))}")
             for item in items_to_update:
-                changes["items"].append(f"Atualizou o item {item.get('name')} R${format_currency(item.get('price'), 'BRL', '#,##0.00', locale='pt_BR')}")
+                changes["items"].append(f"Atualizou o item {item.get('name')} R${format_currency(item.get('price'))}")
             for item in deleted_items:
-                changes["items"].append(f"Deletou o item {item.get('name')} R${format_currency(item.get('price'), 'BRL', '#,##0.00', locale='pt_BR')}")
+                changes["items"].append(f"Deletou o item {item.get('name')} R${format_currency(item.get('price'))}")
         elif field == 'payments':
             for payment in payments_to_create:
-                changes["pagamentos"].append(f"Criou o pagamento {payment['payer_name']} R${format_currency(payment['value'], 'BRL', '#,##0.00', locale='pt_BR')}")
+                changes["pagamentos"].append(f"Criou o pagamento {payment['payer_name']} R${format_currency(payment['value'])}")
             for payment in payments_to_update:
-                changes["pagamentos"].append(f"Atualizou o pagamento {payment['payer_name']} R${format_currency(payment['value'], 'BRL', '#,##0.00', locale='pt_BR')}")
+                changes["pagamentos"].append(f"Atualizou o pagamento {payment['payer_name']} R${format_currency(payment['value'])}")
             for payment in deleted_payments:
-                changes["pagamentos"].append(f"Deletou o pagamento {payment['payer__first_name']} R${format_currency(payment['value'], 'BRL', '#,##0.00', locale='pt_BR')}")
+                changes["pagamentos"].append(f"Deletou o pagamento {payment['payer__first_name']} R${format_currency(payment['value'])}")
 
     ActionLog.objects.create(user=request.user, expense_group_id=expense.regarding.expense_group.id,
                              type=ActionLog.ActionTypes.UPDATE,
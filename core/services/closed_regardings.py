@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from core.services import regardings
+import gzip
+import hashlib
+import re
+import time
+
+GENERATION_KEY = "closed-regarding-generation:{}"
+RESPONSE_KEY = "closed-regarding-response:{}:{}:{}"
+ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+
+
+def get_generation(regarding_id):
+    key = GENERATION_KEY.format(regarding_id)
+    generation = cache.get(key)
+    if generation is None:
+        generation = time.time_ns()
+        cache.set(key, generation, timeout=None)
+    return generation
+
+
+def invalidate_on_commit(regardings_ids):
+    keys = [GENERATION_KEY.format(regarding_id) for regarding_id in set(regardings_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_variant(request, regarding):
+    # Closed regardings still show the requesting user's own row and the group name
+    variant = [
+        str(request.user.id),
+        request.accepted_media_type,
+        request.query_params.urlencode(),
+        regarding.expense_group.updated_at.isoformat(),
+        str(regardings.BALANCE_SNAPSHOT_VERSION),  # Responses rendered from an older format are not reused
+    ]
+    return hashlib.sha256("|".join(variant).encode()).hexdigest()
+
+
+def render(renderer, data):
+    content = renderer.render(data)
+    return {
+        "etag": f'"{hashlib.sha256(content).hexdigest()}"',
+        "content": gzip.compress(content, mtime=0),
+    }
+
+
+def get_rendered(request, regarding, serialize):
+    key = RESPONSE_KEY.format(regarding.id, get_generation(regarding.id), get_variant(request, regarding))
+    rendered = cache.get(key)
+    if rendered is None:
+        rendered = render(request.accepted_renderer, serialize())
+        cache.set(key, rendered, timeout=settings.CLOSED_REGARDING_CACHE_TIMEOUT)
+    return rendered
+
+
+def get_response(request, regarding, serialize):
+    rendered = get_rendered(request, regarding, serialize)
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    if rendered["etag"] in etags or "*" in etags:
+        response = HttpResponse(status=304)
+    elif ACCEPTS_GZIP.search(request.headers.get("Accept-Encoding", "")):
+        response = HttpResponse(rendered["content"], content_type=request.accepted_renderer.media_type)
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(gzip.decompress(rendered["content"]), content_type=request.accepted_renderer.media_type)
+    response["ETag"] = rendered["etag"]
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
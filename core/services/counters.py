@@ -0,0 +1,52 @@
+from django.db.models import F, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from core.models import ExpenseGroup, Regarding, PaymentMethod, Expense, Payment
+from core.services import group_versions
+
+# (model, counter field, counted model, lookup from the counted model to the model)
+COUNTERS = [
+    (Regarding, "expenses_count", Expense, "regarding"),
+    (ExpenseGroup, "regardings_count", Regarding, "expense_group"),
+    (ExpenseGroup, "expenses_count", Expense, "regarding__expense_group"),
+    (PaymentMethod, "payments_count", Payment, "payment_method"),
+]
+
+
+def count_expenses(regarding_id, delta):
+    if regarding_id:
+        Regarding.objects.filter(id=regarding_id).update(expenses_count=F("expenses_count") + delta)
+        ExpenseGroup.objects.filter(regardings__id=regarding_id).update(expenses_count=F("expenses_count") + delta)
+
+
+def count_regardings(group_id, delta, expenses_count=0):
+    if group_id:
+        ExpenseGroup.objects.filter(id=group_id).update(regardings_count=F("regardings_count") + delta,
+                                                        expenses_count=F("expenses_count") + delta * expenses_count)
+
+
+def count_payments(payment_method_id, delta):
+    if payment_method_id:
+        PaymentMethod.objects.filter(id=payment_method_id).update(payments_count=F("payments_count") + delta)
+        group_versions.bump_payment_methods_groups([payment_method_id])  # The wallets show the number of payments
+
+
+def get_expected_count(counted_model, lookup):
+    counts = (
+        counted_model.objects.filter(**{lookup: OuterRef("pk")})
+        .order_by()
+        .values(lookup)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def get_drifted_ids(model, field, counted_model, lookup):
+    drifted = model.objects.annotate(expected=get_expected_count(counted_model, lookup)).exclude(**{field: F("expected")})
+    return list(drifted.values_list("id", flat=True))
+
+
+def reconcile(model, field, counted_model, lookup):
+    drifted_ids = get_drifted_ids(model, field, counted_model, lookup)
+    model.objects.filter(id__in=drifted_ids).update(**{field: get_expected_count(counted_model, lookup)})
+    return drifted_ids
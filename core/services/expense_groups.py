@@ -1,5 +1,5 @@
 from core.models import Notification, GroupInvitation, User, Membership
-from core.services import push_notifications
+from core.services import push_notifications, ledger
 from datetime import datetime, timedelta
 
 
@@ -67,6 +67,7 @@ def remove_members(request, group):
     removed_members = User.objects.filter(id__in=removed_ids)
     memberships_to_remove = group.memberships.filter(user__in=removed_members)
     memberships_to_remove.delete()
+    ledger.rebuild_group(group)
     return removed_members
 
 
@@ -93,6 +94,7 @@ def handle_invitation_accepted(request, invitation):
                          "body": f"O usuário {invitation.invited.full_name} entrou no grupo"}
     notify_members(members, notification_data)
     Membership.objects.create(group=invitation.expense_group, user=request.user)
+    ledger.rebuild_group(invitation.expense_group)
 
 
 def handle_invitation_rejected(invitation):
@@ -117,6 +119,7 @@ def join_group_by_code(request, group):
                          "body": f"O usuário {request.user.full_name} entrou no grupo pelo código"}
     notify_members(members, notification_data)
     Membership.objects.create(group=group, user=request.user)
+    ledger.rebuild_group(group)
     notification = Notification.objects.create(
         title=f"Bem vindo ao grupo {group.name}",
         body=f"Agora você já pode ver e criar despesas nesse grupo.",
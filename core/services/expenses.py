@@ -1,16 +1,26 @@
 from django.utils import timezone
 from core.models import Expense, ActionLog, Validation, Notification, Item, Payment
-from core.services import expense_groups, push_notifications, validations, google_drive
-from babel.numbers import format_currency
+from core.services import expense_groups, push_notifications, validations, google_drive, group_versions, \
+    stats_cache
+from core.formatting import format_currency
 from core.serializers import ItemSerializerWriter, PaymentSerializerWriter
 import base64
 import io
 import re
 from django.conf import settings
+from django.db.models import OuterRef, Subquery, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+from decimal import Decimal
 import pandas as pd
 from dateutil.relativedelta import relativedelta
 
 
+def get_items_total(**filters):
+    items = Item.objects.filter(expense=OuterRef("pk"), **filters).values("expense").annotate(total=Sum("price"))
+    return Coalesce(Subquery(items.values("total")), Value(Decimal(0)),
+                    output_field=DecimalField(max_digits=14, decimal_places=4))
+
+
 def batch_delete_expense(expenses_ids):
     instances = Expense.objects.filter(id__in=expenses_ids).select_related("regarding__expense_group")
     delete_by_groups = {}
@@ -25,7 +35,7 @@ def batch_delete_expense(expenses_ids):
 
 def notify_members_about_expense_deletion(request, expense):
     notification_data = {"title": "Despesa deletada",
-                         "body": f"O membro {request.user.full_name} deletou a despesa {expense.name} de valor R$ {format_currency(expense.cost, 'BRL', '#,##0.00', locale='pt_BR')}"}
+                         "body": f"O membro {request.user.full_name} deletou a despesa {expense.name} de valor R$ {format_currency(expense.cost)}"}
     members = expense_groups.get_members(expense.regarding.expense_group, request, exclude_current_user=True)
     expense_groups.notify_members(members, notification_data)
 
@@ -67,14 +77,14 @@ def notify_expense_validators(request, expense):
 
 def notify_members_about_new_expense(request, expense):
     notification_data = {"title": "Despesa adicionada",
-                         "body": f"O membro {request.user.full_name} adicionou a despesa {expense.name} de valor R$ {format_currency(expense.cost, 'BRL', '#,##0.00', locale='pt_BR')}"}
+                         "body": f"O membro {request.user.full_name} adicionou a despesa {expense.name} de valor R$ {format_currency(expense.cost)}"}
     members = expense_groups.get_members(expense.regarding.expense_group, request, exclude_current_user=True)
     expense_groups.notify_members(members, notification_data)
 
 
 def notify_members_about_expense_update(request, expense):
     notification_data = {"title": "Despesa editada",
-                         "body": f"O membro {request.user.full_name} editou a despesa {expense.name} de valor R$ {format_currency(expense.cost, 'BRL', '#,##0.00', locale='pt_BR')}"}
+                         "body": f"O membro {request.user.full_name} editou a despesa {expense.name} de valor R$ {format_currency(expense.cost)}"}
     members = expense_groups.get_members(expense.regarding.expense_group, request, exclude_current_user=True)
     expense_groups.notify_members(members, notification_data)
 
@@ -134,7 +144,7 @@ def handle_payments_edition(payments, expense):
 
 
 def ask_validators_to_revalidate(request, expense):
-    expense.validations.update(is_active=True, validated_at=None, note="")
+    expense.validations.update(is_active=True, validated_at=None, note="", updated_at=timezone.now())
     for validation in expense.validations.all():
         validations.ask_for_revalidation(request, validation)
 
@@ -163,6 +173,11 @@ def create_gallery(expense):
     return google_drive.create_folder(gallery_folder)
 
 
+def create_galleries(expenses_ids):
+    for expense in Expense.objects.filter(id__in=expenses_ids, gallery__isnull=True).select_related("regarding__expense_group"):
+        upload_images(None, expense)
+
+
 def upload_images(gallery, expense):
     images_to_upload = []
     old_images = []
@@ -187,29 +202,43 @@ def upload_images(gallery, expense):
 
 
 def update_expenses_validation_status(expenses):
+    changed_expenses = []
     for expense in expenses:
         expense_validations = expense.validations.all()
         validated = expense_validations.filter(validated_at__isnull=False)
         rejected = expense_validations.filter(validated_at__isnull=True, is_active=False)
         if expense_validations.count() == validated.count():
-            expense.validation_status = Expense.ValidationStatuses.VALIDATED
+            validation_status = Expense.ValidationStatuses.VALIDATED
         elif expense_validations.count() == rejected.count():
-            expense.validation_status = Expense.ValidationStatuses.REJECTED
+            validation_status = Expense.ValidationStatuses.REJECTED
         else:
-            expense.validation_status = Expense.ValidationStatuses.AWAITING
-    Expense.objects.bulk_update(expenses, ['validation_status'], batch_size=2000)
+            validation_status = Expense.ValidationStatuses.AWAITING
+        if expense.validation_status != validation_status:  # Unchanged rows keep their sync timestamp
+            expense.validation_status = validation_status
+            expense.updated_at = timezone.now()
+            changed_expenses.append(expense)
+    Expense.objects.bulk_update(changed_expenses, ['validation_status', 'updated_at'], batch_size=2000)
+    group_versions.bump_expenses_groups(expense.id for expense in changed_expenses)
+    stats_cache.bump_versions_on_commit(expense.regarding_id for expense in changed_expenses)
 
 
 def update_expenses_payment_status(expenses):
+    changed_expenses = []
     for expense in expenses:
         payments_statutes = list(expense.payments.values_list("payment_status", flat=True))
         if Payment.PaymentStatuses.AWAITING_PAYMENT in payments_statutes:
-            expense.payment_status = Payment.PaymentStatuses.AWAITING_PAYMENT
+            payment_status = Payment.PaymentStatuses.AWAITING_PAYMENT
         elif payments_statutes.count(Payment.PaymentStatuses.PAID) == len(payments_statutes):
-            expense.payment_status = Payment.PaymentStatuses.PAID
+            payment_status = Payment.PaymentStatuses.PAID
         else:
-            expense.payment_status = Payment.PaymentStatuses.AWAITING_VALIDATION
-    Expense.objects.bulk_update(expenses, ['payment_status'], batch_size=2000)
+            payment_status = Payment.PaymentStatuses.AWAITING_VALIDATION
+        if expense.payment_status != payment_status:
+            expense.payment_status = payment_status
+            expense.updated_at = timezone.now()
+            changed_expenses.append(expense)
+    Expense.objects.bulk_update(changed_expenses, ['payment_status', 'updated_at'], batch_size=2000)
+    group_versions.bump_expenses_groups(expense.id for expense in changed_expenses)
+    stats_cache.bump_versions_on_commit(expense.regarding_id for expense in changed_expenses)
 
 
 def update_payments_payment_status(payments):
@@ -220,6 +249,7 @@ def update_payments_payment_status(payments):
     not_validated_payments = payments.exclude(
         expense__validation_status=Expense.ValidationStatuses.VALIDATED
     )
+    new_statuses = [(not_validated_payments, Payment.PaymentStatuses.AWAITING_VALIDATION)]
     if validated_payments.count():
         df = pd.DataFrame(
             validated_payments.values(
@@ -256,6 +286,18 @@ def update_payments_payment_status(payments):
         payments_paid_ids = df[df["is_paid"]].loc[:, "id"].tolist()
         payments_paid = validated_payments.filter(id__in=payments_paid_ids)
         payments_not_paid = validated_payments.exclude(id__in=payments_paid_ids)
-        payments_paid.update(payment_status=Payment.PaymentStatuses.PAID)
-        payments_not_paid.update(payment_status=Payment.PaymentStatuses.AWAITING_PAYMENT)
-    not_validated_payments.update(payment_status=Payment.PaymentStatuses.AWAITING_VALIDATION)
+        new_statuses.append((payments_paid, Payment.PaymentStatuses.PAID))
+        new_statuses.append((payments_not_paid, Payment.PaymentStatuses.AWAITING_PAYMENT))
+    # Read before the updates, which move the payments out of querysets filtered by status
+    changes = [
+        (list(queryset.exclude(payment_status=status).values_list("id", "expense_id", "expense__regarding_id")), status)
+        for queryset, status in new_statuses
+    ]
+    for changed_payments, status in changes:
+        if changed_payments:
+            Payment.objects.filter(id__in=[payment[0] for payment in changed_payments]).update(
+                payment_status=status, updated_at=timezone.now()
+            )
+    changed_payments = [payment for payments, _ in changes for payment in payments]
+    group_versions.bump_expenses_groups(payment[1] for payment in changed_payments)
+    stats_cache.bump_versions_on_commit(payment[2] for payment in changed_payments)
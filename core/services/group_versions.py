@@ -0,0 +1,53 @@
+from django.db.models import F
+from core.models import ExpenseGroup, Payment
+import hashlib
+
+
+class NotModified(Exception):
+    pass
+
+
+def bump(groups_ids):
+    groups_ids = {group_id for group_id in groups_ids if group_id}
+    if groups_ids:
+        ExpenseGroup.objects.filter(id__in=groups_ids).update(version=F("version") + 1)
+
+
+def bump_regardings_groups(regardings_ids):
+    regardings_ids = {regarding_id for regarding_id in regardings_ids if regarding_id}
+    if regardings_ids:
+        ExpenseGroup.objects.filter(regardings__id__in=regardings_ids).update(version=F("version") + 1)
+
+
+def bump_expenses_groups(expenses_ids):
+    expenses_ids = {expense_id for expense_id in expenses_ids if expense_id}
+    if expenses_ids:
+        ExpenseGroup.objects.filter(regardings__expenses__id__in=expenses_ids).update(version=F("version") + 1)
+
+
+def bump_users_groups(users_ids):
+    users_ids = {user_id for user_id in users_ids if user_id}
+    if users_ids:
+        ExpenseGroup.objects.filter(members__id__in=users_ids).update(version=F("version") + 1)
+
+
+def bump_payment_methods_groups(payment_methods_ids):
+    # Groups of the owners, which list their wallets, and groups whose payments show the payment methods
+    payment_methods_ids = {payment_method_id for payment_method_id in payment_methods_ids if payment_method_id}
+    if payment_methods_ids:
+        groups_ids = set(ExpenseGroup.objects.filter(members__wallet__payment_methods__id__in=payment_methods_ids)
+                         .values_list("id", flat=True))
+        groups_ids.update(Payment.objects.filter(payment_method_id__in=payment_methods_ids)
+                          .values_list("expense__regarding__expense_group_id", flat=True))
+        bump(groups_ids)
+
+
+def get_etag(request, versions):
+    # Versions are read before the data, so a write racing the request only costs the client a refetch
+    variant = [
+        str(request.user.id),
+        request.accepted_media_type,
+        request.build_absolute_uri(),
+        ",".join(f"{group_id}:{version}" for group_id, version in sorted(versions)),
+    ]
+    return f'"{hashlib.sha256("|".join(variant).encode()).hexdigest()}"'
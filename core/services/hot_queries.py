@@ -0,0 +1,55 @@
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from core.models import ExpenseGroup, Regarding, Expense, Item, Payment, Notification, Validation, ActionLog, \
+    GroupInvitation, Tombstone
+
+SAMPLE_ID = 1  # Plans depend on the shape of the query, not on the rows it matches
+
+
+def get_hot_queries():
+    groups = [SAMPLE_ID, SAMPLE_ID + 1]  # Resolved by the memberships service
+    today = timezone.now().date()
+    awaiting_invitation = Q(status=GroupInvitation.InvitationStatus.AWAITING)
+    # (where it runs, queryset, index it must use)
+    return [
+        ("ExpenseViewSet.list", Expense.objects.filter(regarding__expense_group__in=groups).order_by("-date"),
+         "expense_regarding_date_idx"),
+        ("RegardingViewSet.list", Regarding.objects.filter(expense_group__in=groups), "core_regarding_expense_group_id"),
+        ("PaymentViewSet.list", Payment.objects.filter(expense__regarding__expense_group__in=groups),
+         "core_payment_expense_id"),
+        ("ItemViewSet.list", Item.objects.filter(expense__regarding__expense_group__in=groups), "core_item_expense_id"),
+        ("NotificationViewSet.list", Notification.objects.filter(user_id=SAMPLE_ID).order_by("-created_at", "-id"),
+         "notification_user_created_idx"),
+        ("ValidationViewSet.list", Validation.objects.filter(validator_id=SAMPLE_ID).order_by("-created_at"),
+         "core_validation_validator_id"),
+        ("ActionsLogViewSet.list", ActionLog.objects.filter(expense_group__in=groups).order_by("-created_at"),
+         "actionlog_group_created_idx"),
+        ("GroupInvitationViewSet.list",
+         GroupInvitation.objects.filter((Q(sent_by_id=SAMPLE_ID) | Q(invited_id=SAMPLE_ID)) & awaiting_invitation),
+         "invitation_invited_status_idx"),
+        ("UserViewSet.list", GroupInvitation.objects.filter(Q(invited_id=SAMPLE_ID) & awaiting_invitation),
+         "invitation_invited_status_idx"),
+        ("JoinGroup", ExpenseGroup.objects.filter(hash_id="0" * 16), "expensegroup_hash_id_idx"),
+        ("Sync", Notification.objects.filter(user_id=SAMPLE_ID, updated_at__gte=timezone.now()),
+         "notification_user_updated_idx"),
+        ("send_push_notifications", Notification.objects.filter(was_sent=False).exclude(user__fcm_token__isnull=True),
+         "notification_unsent_idx"),
+        ("update_payment_status", Payment.objects.exclude(payment_status=Payment.PaymentStatuses.PAID),
+         "payment_unpaid_idx"),
+        ("update_payment_status", Expense.objects.exclude(payment_status=Expense.PaymentStatuses.PAID),
+         "expense_unpaid_idx"),
+        ("update_expense_validation_status",
+         Expense.objects.filter(validation_status=Expense.ValidationStatuses.AWAITING), "expense_validation_status_idx"),
+        ("update_and_close_regardings", Regarding.objects.filter(is_closed=False, end_date__lt=today),
+         "regarding_open_end_date_idx"),
+        ("prune_tombstones", Tombstone.objects.filter(deleted_at__lt=timezone.now()), "tombstone_deleted_at_idx"),
+    ]
+
+
+def explain(queryset):
+    with transaction.atomic():
+        if connection.vendor == "postgresql":  # Small tables are cheaper to scan, this shows whether the index fits
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
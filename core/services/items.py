@@ -0,0 +1,56 @@
+from core.models import Item, Membership
+from core.services import stats_data
+from django.db.models import F
+from django.utils import timezone
+from collections import defaultdict
+
+
+def get_split_type(consumers_ids, members_ids):
+    if set(consumers_ids) == set(members_ids):
+        return Item.SplitTypes.SHARED
+    elif len(consumers_ids) == 1:
+        return Item.SplitTypes.INDIVIDUAL
+    return Item.SplitTypes.PARTIAL
+
+
+def update_items_split(items):
+    items = list(
+        items.annotate(group_id=F("expense__regarding__expense_group_id"))
+        .only("id", "split_type", "consumers_count", "shared_by_all", "updated_at")
+    )
+    consumers_by_item = stats_data.load_consumers(
+        Item.consumers.through.objects.filter(item_id__in=[item.id for item in items if not item.shared_by_all])
+    )
+    members_by_group = defaultdict(set)
+    memberships = Membership.objects.filter(group_id__in={item.group_id for item in items})
+    for group_id, user_id in memberships.values_list("group_id", "user_id"):
+        members_by_group[group_id].add(user_id)
+
+    changed_items = []
+    for item in items:
+        consumers = members_by_group[item.group_id] if item.shared_by_all else consumers_by_item[item.id]
+        split_type = get_split_type(consumers, members_by_group[item.group_id])
+        if item.split_type != split_type or item.consumers_count != len(consumers):
+            item.split_type = split_type
+            item.consumers_count = len(consumers)
+            item.updated_at = timezone.now()
+            changed_items.append(item)
+    Item.objects.bulk_update(changed_items, ["split_type", "consumers_count", "updated_at"], batch_size=2000)
+
+
+def update_group_items_split(group_id):
+    update_items_split(Item.objects.filter(expense__regarding__expense_group_id=group_id))
+
+
+def expand_group_shared_items(group_id):
+    items_ids = list(
+        Item.objects.filter(expense__regarding__expense_group_id=group_id, shared_by_all=True).values_list("id", flat=True)
+    )
+    if not items_ids:
+        return
+    members_ids = list(Membership.objects.filter(group_id=group_id).values_list("user_id", flat=True))
+    Item.consumers.through.objects.bulk_create(
+        [Item.consumers.through(item_id=item_id, user_id=user_id) for item_id in items_ids for user_id in members_ids],
+        batch_size=2000,
+    )
+    Item.objects.filter(id__in=items_ids).update(shared_by_all=False, updated_at=timezone.now())
@@ -0,0 +1,127 @@
+from core.models import Expense, Item, Membership, RegardingMemberLedger, RegardingDebtLedger
+from core.services import stats_data, stats
+from collections import defaultdict
+from decimal import Decimal
+
+MEMBER_FIELDS = ["shared", "partial_shared", "individual", "total_paid_shared"]
+
+
+def get_members_ids(regarding_id):
+    return set(Membership.objects.filter(group__regardings__id=regarding_id).values_list("user_id", flat=True))
+
+
+def calculate_items_deltas(items, members_ids):
+    members_deltas = defaultdict(lambda: dict.fromkeys(MEMBER_FIELDS, Decimal(0)))
+    debts_deltas = defaultdict(Decimal)
+    for item in items:
+        price = Decimal(item["price"])
+        payer = item["payer"]
+        consumers = item["consumers"]
+        if item["split_type"] == Item.SplitTypes.SHARED:  # Shared debts depend on the weights and are derived on read
+            for consumer in members_ids:
+                members_deltas[consumer]["shared"] += price
+            members_deltas[payer]["total_paid_shared"] += price
+        elif item["split_type"] == Item.SplitTypes.INDIVIDUAL:  # Individual
+            members_deltas[consumers[0]]["individual"] += price
+            if consumers[0] != payer:
+                debts_deltas[(payer, consumers[0])] += price
+        else:  # Partial shared
+            for consumer in consumers:
+                members_deltas[consumer]["partial_shared"] += price
+                if consumer != payer:
+                    debts_deltas[(payer, consumer)] += price / len(consumers)
+    return members_deltas, debts_deltas
+
+
+def apply_deltas(regarding_id, members_deltas, debts_deltas, sign=1):
+    members_ledger = {
+        row.member_id: row
+        for row in RegardingMemberLedger.objects.select_for_update().filter(
+            regarding_id=regarding_id, member_id__in=members_deltas.keys()
+        )
+    }
+    members_to_create = []
+    for member_id, deltas in members_deltas.items():
+        row = members_ledger.get(member_id)
+        if row is None:
+            row = RegardingMemberLedger(regarding_id=regarding_id, member_id=member_id)
+            members_to_create.append(row)
+        for field, delta in deltas.items():
+            setattr(row, field, getattr(row, field) + sign * delta)
+    RegardingMemberLedger.objects.bulk_create(members_to_create)
+    RegardingMemberLedger.objects.bulk_update(members_ledger.values(), MEMBER_FIELDS, batch_size=2000)
+
+    debts_ledger = {
+        (row.creditor_id, row.debtor_id): row
+        for row in RegardingDebtLedger.objects.select_for_update().filter(regarding_id=regarding_id)
+    }
+    debts_to_create = []
+    debts_to_update = []
+    for (creditor_id, debtor_id), delta in debts_deltas.items():
+        row = debts_ledger.get((creditor_id, debtor_id))
+        if row is None:
+            row = RegardingDebtLedger(regarding_id=regarding_id, creditor_id=creditor_id, debtor_id=debtor_id)
+            debts_to_create.append(row)
+        else:
+            debts_to_update.append(row)
+        row.value += sign * delta
+    RegardingDebtLedger.objects.bulk_create(debts_to_create)
+    RegardingDebtLedger.objects.bulk_update(debts_to_update, ["value"], batch_size=2000)
+
+
+def apply_expenses(expenses_ids, sign):
+    expenses_by_regarding = defaultdict(list)
+    for expense_id, regarding_id in Expense.objects.filter(id__in=expenses_ids).values_list("id", "regarding_id"):
+        expenses_by_regarding[regarding_id].append(expense_id)
+    for regarding_id, regarding_expenses_ids in expenses_by_regarding.items():
+        items = stats_data.load_expenses_items(regarding_expenses_ids)
+        members_deltas, debts_deltas = calculate_items_deltas(items, get_members_ids(regarding_id))
+        apply_deltas(regarding_id, members_deltas, debts_deltas, sign)
+
+
+def add_expenses(expenses_ids):
+    apply_expenses(expenses_ids, 1)
+
+
+def remove_expenses(expenses_ids):
+    apply_expenses(expenses_ids, -1)
+
+
+def rebuild_regarding(regarding):
+    RegardingMemberLedger.objects.filter(regarding_id=regarding.id).delete()
+    RegardingDebtLedger.objects.filter(regarding_id=regarding.id).delete()
+    members_ids = get_members_ids(regarding.id)
+    members_deltas, debts_deltas = calculate_items_deltas(stats_data.load_items(regarding), members_ids)
+    for member_id in members_ids - members_deltas.keys():  # Every member gets a row, even without items
+        members_deltas[member_id] = dict.fromkeys(MEMBER_FIELDS, Decimal(0))
+    apply_deltas(regarding.id, members_deltas, debts_deltas)
+
+
+def rebuild_group(group):
+    for regarding in group.regardings.all():
+        rebuild_regarding(regarding)
+
+
+def calculate_totals_from_ledger(regarding, memberships, group_total_weight):
+    totals_by_member = stats.create_totals_by_member(memberships)
+    members_ids = totals_by_member.keys()
+    total_member_vs_member = stats.create_total_member_vs_member(members_ids)
+    members_ledger = RegardingMemberLedger.objects.filter(regarding_id=regarding.id, member_id__in=members_ids)
+    for row in members_ledger.values("member_id", *MEMBER_FIELDS):
+        totals_by_member[row.pop("member_id")].update(row)
+
+    for creditor_id, totals in totals_by_member.items():
+        if totals["total_paid_shared"]:
+            for debtor_id in total_member_vs_member[creditor_id].keys():
+                total_member_vs_member[creditor_id][debtor_id] += (
+                        totals["total_paid_shared"]
+                        * totals_by_member[debtor_id]["weight"]
+                        / group_total_weight
+                )
+    debts_ledger = RegardingDebtLedger.objects.filter(
+        regarding_id=regarding.id, creditor_id__in=members_ids, debtor_id__in=members_ids
+    )
+    for creditor_id, debtor_id, value in debts_ledger.values_list("creditor_id", "debtor_id", "value"):
+        if creditor_id != debtor_id:
+            total_member_vs_member[creditor_id][debtor_id] += value
+    return totals_by_member, total_member_vs_member
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from core.models import Membership
+
+GROUPS_IDS_KEY = "user-groups-ids:{}"
+
+
+def load_groups_ids(user_id):
+    key = GROUPS_IDS_KEY.format(user_id)
+    groups_ids = cache.get(key)
+    if groups_ids is None:
+        groups_ids = list(Membership.objects.filter(user_id=user_id).values_list("group_id", flat=True))
+        cache.set(key, groups_ids, timeout=settings.MEMBERSHIPS_CACHE_TIMEOUT)
+    return groups_ids
+
+
+def get_groups_ids(request):
+    # Groups of the requesting user, resolved once per request
+    if getattr(request, "groups_ids", None) is None:
+        request.groups_ids = load_groups_ids(request.user.id)
+    return request.groups_ids
+
+
+def is_member(request, group_id):
+    return group_id in get_groups_ids(request)
+
+
+def invalidate(user_id):
+    key = GROUPS_IDS_KEY.format(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))  # Requests reading before the commit may have cached it again
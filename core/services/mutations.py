@@ -0,0 +1,220 @@
+from rest_framework import serializers
+from django.db import transaction
+from core.models import ExpenseGroup, Membership, Expense, Item, Payment, Validation, ActionLog
+from core.serializers import ExpenseSerializerWriter, ItemSerializerWriter, PaymentSerializerWriter
+from core.services import counters, expense_groups, expenses, group_versions, ledger, memberships, \
+    items as items_service
+from collections import Counter, defaultdict
+from itertools import groupby
+
+WRITERS = {"expense": ExpenseSerializerWriter, "item": ItemSerializerWriter, "payment": PaymentSerializerWriter}
+GROUP_LOOKUPS = {
+    "expense": "regarding__expense_group",
+    "item": "expense__regarding__expense_group",
+    "payment": "expense__regarding__expense_group",
+}
+OPERATIONS_PT = {"create": "criou", "update": "editou", "delete": "deletou"}
+MODELS_PT = {"expense": "despesa(s)", "item": "item(ns)", "payment": "pagamento(s)"}
+MAX_OPERATIONS = 500
+NOT_FOUND = "Não encontrado nos seus grupos"
+
+
+def operation_error(index, detail):
+    return serializers.ValidationError({"operations": {index: detail}})
+
+
+def validate_operations(operations):
+    if not isinstance(operations, list) or not 0 < len(operations) <= MAX_OPERATIONS:
+        raise serializers.ValidationError({"operations": f"Envie de 1 a {MAX_OPERATIONS} operações"})
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS_PT \
+                or operation.get("model") not in WRITERS:
+            raise operation_error(index, "Operação inválida")
+        if operation["op"] != "create" and "id" not in operation and "ref" not in operation:
+            raise operation_error(index, "Informe o id ou a ref")
+
+
+def new_batch(request):
+    return {
+        "request": request,
+        "groups_ids": set(memberships.get_groups_ids(request)),
+        "refs": {},  # Ids of the rows created in the batch, by the temporary ids sent by the client
+        "expenses_groups": {},
+        "expenses_ids": set(),  # Expenses whose ledger and statuses are recalculated once at the end
+        "created_expenses_ids": [],
+        "created_items_ids": [],
+        "changes_by_group": defaultdict(Counter),
+    }
+
+
+def resolve_refs(batch, data):
+    data = dict(data or {})
+    if isinstance(data.get("expense"), str) and data["expense"] in batch["refs"]:
+        data["expense"] = batch["refs"][data["expense"]]
+    return data
+
+
+def get_expense_group_id(batch, expense):
+    if expense is None:
+        return None
+    if expense.id not in batch["expenses_groups"]:
+        batch["expenses_groups"][expense.id] = expense.regarding.expense_group_id
+    return batch["expenses_groups"][expense.id]
+
+
+def get_group_id(batch, name, attrs, instance=None):
+    if name == "expense":
+        return attrs.get("regarding", getattr(instance, "regarding", None)).expense_group_id
+    return get_expense_group_id(batch, attrs.get("expense", getattr(instance, "expense", None)))
+
+
+def validate(batch, index, name, serializer):
+    if not serializer.is_valid():
+        raise operation_error(index, serializer.errors)
+    group_id = get_group_id(batch, name, serializer.validated_data, serializer.instance)
+    if group_id not in batch["groups_ids"]:
+        raise operation_error(index, NOT_FOUND)
+    return group_id
+
+
+def get_validators_ids(index, group_id, operation):
+    validators_ids = {validator["id"] for validator in (operation.get("data") or {}).get("validators", [])}
+    if Membership.objects.filter(group_id=group_id, user_id__in=validators_ids).count() != len(validators_ids):
+        raise operation_error(index, {"validators": NOT_FOUND})
+    return validators_ids
+
+
+def get_touched_expenses_ids(batch, operations):
+    # Existing expenses leave the ledger before their first change and are added back with the result
+    expenses_ids, children_ids = set(), defaultdict(set)
+    for operation in operations:
+        expense_id = (operation.get("data") or {}).get("expense")
+        if isinstance(expense_id, int):
+            expenses_ids.add(expense_id)
+        if isinstance(operation.get("id"), int):
+            (expenses_ids if operation["model"] == "expense" else children_ids[operation["model"]]).add(operation["id"])
+    for name, ids in children_ids.items():
+        model = WRITERS[name].Meta.model
+        expenses_ids.update(model.objects.filter(id__in=ids).values_list("expense_id", flat=True))
+    return set(Expense.objects.filter(id__in=expenses_ids, regarding__expense_group__in=batch["groups_ids"])
+               .values_list("id", flat=True))
+
+
+def get_instances(batch, name, run):
+    model = WRITERS[name].Meta.model
+    ids = {index: batch["refs"].get(operation.get("ref"), operation.get("id")) for index, operation in run}
+    instances = model.objects.filter(id__in=ids.values(), **{f"{GROUP_LOOKUPS[name]}__in": batch["groups_ids"]})
+    instances = {instance.id: instance for instance in instances}
+    for index, instance_id in ids.items():
+        if instance_id not in instances:
+            raise operation_error(index, NOT_FOUND)
+    return [instances[instance_id] for instance_id in ids.values()]
+
+
+def create(batch, name, run):
+    writer = WRITERS[name]
+    instances, consumers, validators = [], [], []
+    for index, operation in run:
+        serializer = writer(data=resolve_refs(batch, operation.get("data")))
+        group_id = validate(batch, index, name, serializer)
+        attrs = dict(serializer.validated_data)
+        if name == "expense":
+            attrs.setdefault("created_by", batch["request"].user)
+            validators.append(get_validators_ids(index, group_id, operation))
+        consumers.append(attrs.pop("consumers", []))
+        instances.append(writer.Meta.model(**attrs))
+        batch["changes_by_group"][group_id][("create", name)] += 1
+    writer.Meta.model.objects.bulk_create(instances)  # Signals are not sent, their effects are applied in finish()
+
+    for (index, operation), instance in zip(run, instances):
+        if operation.get("ref"):
+            batch["refs"][operation["ref"]] = instance.id
+        batch["expenses_ids"].add(instance.id if name == "expense" else instance.expense_id)
+    if name == "expense":
+        batch["created_expenses_ids"] += [instance.id for instance in instances]
+        Validation.objects.bulk_create([
+            Validation(validator_id=validator_id, expense=instance)
+            for instance, validators_ids in zip(instances, validators) for validator_id in validators_ids
+        ])
+        for regarding_id, count in Counter(instance.regarding_id for instance in instances).items():
+            counters.count_expenses(regarding_id, count)
+    elif name == "item":
+        Item.consumers.through.objects.bulk_create([
+            Item.consumers.through(item_id=instance.id, user_id=consumer.id)
+            for instance, item_consumers in zip(instances, consumers) for consumer in item_consumers
+        ])
+        batch["created_items_ids"] += [instance.id for instance in instances]
+    else:
+        for payment_method_id, count in Counter(instance.payment_method_id for instance in instances).items():
+            counters.count_payments(payment_method_id, count)
+
+
+def update(batch, name, run):
+    writer = WRITERS[name]
+    for (index, operation), instance in zip(run, get_instances(batch, name, run)):
+        previous_group_id = get_group_id(batch, name, {}, instance)
+        previous_expense_id = instance.id if name == "expense" else instance.expense_id
+        serializer = writer(instance, data=resolve_refs(batch, operation.get("data")), partial=True)
+        group_id = validate(batch, index, name, serializer)
+        serializer.save()
+        batch["expenses_ids"].update({previous_expense_id, instance.id if name == "expense" else instance.expense_id})
+        batch["changes_by_group"][group_id][("update", name)] += 1
+        if previous_group_id != group_id:
+            batch["changes_by_group"][previous_group_id][("update", name)] += 1
+
+
+def delete(batch, name, run):
+    instances = get_instances(batch, name, run)
+    for instance in instances:
+        batch["changes_by_group"][get_group_id(batch, name, {}, instance)][("delete", name)] += 1
+        if name == "expense":
+            batch["expenses_ids"].discard(instance.id)
+        else:  # The parent expense was removed from the ledger and is added back without the deleted row
+            batch["expenses_ids"].add(instance.expense_id)
+    WRITERS[name].Meta.model.objects.filter(id__in=[instance.id for instance in instances]).delete()
+
+
+def get_summary(changes):
+    return [f"{OPERATIONS_PT[operation].capitalize()} {count} {MODELS_PT[name]}"
+            for (operation, name), count in changes.items()]
+
+
+def notify_groups(batch):
+    request = batch["request"]
+    for group in ExpenseGroup.objects.filter(id__in=batch["changes_by_group"].keys()):
+        summary = get_summary(batch["changes_by_group"][group.id])
+        ActionLog.objects.create(user=request.user, expense_group=group, type=ActionLog.ActionTypes.UPDATE,
+                                 description="Sincronizou alterações feitas offline",
+                                 changes_json={"alterações": summary})
+        notification_data = {"title": "Despesas sincronizadas",
+                             "body": f"O membro {request.user.full_name} sincronizou alterações no grupo {group.name}: "
+                                     f"{', '.join(summary).lower()}"}
+        expense_groups.notify_members(expense_groups.get_members(group, request, exclude_current_user=True),
+                                      notification_data)
+
+
+def finish(batch):
+    touched = list(Expense.objects.filter(id__in=batch["expenses_ids"]))
+    items_service.update_items_split(Item.objects.filter(id__in=batch["created_items_ids"]))
+    ledger.add_expenses([expense.id for expense in touched])
+    expenses.update_expenses_validation_status(touched)
+    expenses.update_expenses_payment_status(touched)
+    expenses.update_payments_payment_status(Payment.objects.filter(expense__in=touched))
+    group_versions.bump(batch["changes_by_group"].keys())
+    notify_groups(batch)
+    created_expenses_ids = batch["created_expenses_ids"]  # Drive folders are only made for the committed expenses
+    transaction.on_commit(lambda: expenses.create_galleries(created_expenses_ids))
+
+
+APPLY = {"create": create, "update": update, "delete": delete}
+
+
+def apply_operations(request, operations):
+    validate_operations(operations)
+    batch = new_batch(request)
+    ledger.remove_expenses(get_touched_expenses_ids(batch, operations))
+    # Consecutive operations of the same kind on the same model run together, so creations become bulk inserts
+    for (operation, name), run in groupby(enumerate(operations), key=lambda entry: (entry[1]["op"], entry[1]["model"])):
+        APPLY[operation](batch, name, list(run))
+    finish(batch)
+    return batch["refs"]
@@ -1,6 +1,7 @@
-from core.services import expense_groups
-from core.serializers import RegardingSerializerReader
-import json
+from core.services import expense_groups, stats
+from core.formatting import parse_money
+
+BALANCE_SNAPSHOT_VERSION = 3
 
 
 def notify_members_about_new_regarding(request, group):
@@ -18,16 +19,39 @@ def notify_members_about_regarding_update(request, regarding):
     expense_groups.notify_members(members, notification_data)
 
 
+def build_balance_snapshot(regarding):
+    # Totals are stored unformatted and go through the same formatting as the open regardings when read
+    general_total, members, total_by_day, total_member_vs_member = stats.calculate_totals_of_regarding(regarding)
+    return {
+        "version": BALANCE_SNAPSHOT_VERSION,
+        "general_total": general_total,
+        "members": members,
+        "total_by_day": total_by_day,
+        "total_member_vs_member": total_member_vs_member,
+    }
+
+
+def parse_snapshot_values(data):
+    if isinstance(data, dict):
+        return {key: value if key == "full_name" else parse_snapshot_values(value) for key, value in data.items()}
+    if isinstance(data, str):  # Decimals, or pt_BR strings in the snapshots of version 2
+        return parse_money(data)
+    return data
+
+
+def load_balance_snapshot(snapshot):
+    snapshot = parse_snapshot_values(snapshot or {})
+    return (
+        snapshot.get("general_total", {}),
+        {int(member_id): totals for member_id, totals in snapshot.get("members", {}).items()},
+        {int(day): total for day, total in snapshot.get("total_by_day", {}).items()},
+        snapshot.get("total_member_vs_member", {}),
+    )
+
+
 def update_balance_json(request, regarding):
     if request.data.get("is_closed", False):
-        regarding_serializer = RegardingSerializerReader(regarding, context={"request": request})
-        totals = regarding_serializer.data
-        regarding.balance_json = json.dumps({
-            "general_total": totals.get('general_total', {}),
-            "consumer_total": totals.get('consumer_total', []),
-            "total_by_day": totals.get('total_by_day', {}),
-            "total_member_vs_member": totals.get('total_member_vs_member', {}),
-        }, default=str)
+        regarding.balance_json = build_balance_snapshot(regarding)
         regarding.save(update_fields=["balance_json"])
 
 
@@ -8,72 +8,48 @@ from core.models import (
     Tag,
     Item,
 )
-from django.db.models import F, Sum, Value, When, Case
-from django.db.models.functions import Concat
+from django.conf import settings
+from core.services import stats_data, ledger
+from core.formatting import parse_money
+from collections import defaultdict
 from decimal import Decimal
+import numpy as np
+import heapq
 import copy
 
-TOTAL_ANNOTATION = {
-    "total_payments": Sum("payments__value"),
-    "total_validation": Sum(
-        Case(
-            When(
-                payments__payment_status=Payment.PaymentStatuses.AWAITING_VALIDATION,
-                then="payments__value",
-            ),
-            default=Decimal(0),
-        )
-    ),
-    "total_open": Sum(
-        Case(
-            When(
-                payments__payment_status=Payment.PaymentStatuses.AWAITING_PAYMENT,
-                then="payments__value",
-            ),
-            default=Decimal(0),
-        )
-    ),
-    "total_paid": Sum(
-        Case(
-            When(
-                payments__payment_status=Payment.PaymentStatuses.PAID,
-                then="payments__value",
-            ),
-            default=Decimal(0),
-        )
-    ),
-    "total_overdue": Sum(
-        Case(
-            When(
-                payments__payment_status=Payment.PaymentStatuses.OVERDUE,
-                then="payments__value",
-            ),
-            default=Decimal(0),
-        )
-    ),
+PRICE_DECIMAL_PLACES = 4
+PRICE_SCALE = 10 ** PRICE_DECIMAL_PLACES
+
+PAYMENT_STATUSES_TOTALS = {
+    Payment.PaymentStatuses.AWAITING_VALIDATION: "total_validation",
+    Payment.PaymentStatuses.AWAITING_PAYMENT: "total_open",
+    Payment.PaymentStatuses.PAID: "total_paid",
+    Payment.PaymentStatuses.OVERDUE: "total_overdue",
 }
 
 
-def calculate_total_by_day_in_regarding(expenses):
+def calculate_payments_totals(regarding, expenses_payments):
+    general_totals = {"regarding": regarding.id, "total_payments": Decimal(0)}
+    general_totals.update({total: Decimal(0) for total in PAYMENT_STATUSES_TOTALS.values()})
+    general_totals["total_expenses"] = Decimal(0)
     totals_by_day_of_regarding = {}
-    values_and_days = expenses.values_list("cost", "date")
-    for value, date in map(lambda item: item, values_and_days):
-        if date.day not in totals_by_day_of_regarding:
-            totals_by_day_of_regarding[date.day] = value
-        else:
-            totals_by_day_of_regarding[date.day] += value
-    return totals_by_day_of_regarding
-
-
-def calculate_general_totals(expenses):
-    general_totals = dict(expenses.values("regarding").annotate(**TOTAL_ANNOTATION)[0])
-    general_totals["total_expenses"] = expenses.values("regarding").aggregate(
-        total_cost=Sum("cost")
-    )["total_cost"]
-    return general_totals
+    total_paid_by_member = defaultdict(Decimal)
+    counted_expenses = set()
+    for row in expenses_payments:  # One row per expense, payer and payment status
+        if row["id"] not in counted_expenses:
+            counted_expenses.add(row["id"])
+            general_totals["total_expenses"] += row["cost"]
+            day = row["date"].day
+            totals_by_day_of_regarding[day] = totals_by_day_of_regarding.get(day, 0) + row["cost"]
+        if row["payments__payer_id"] is not None:
+            general_totals["total_payments"] += row["value"]
+            if row["payments__payment_status"] in PAYMENT_STATUSES_TOTALS:
+                general_totals[PAYMENT_STATUSES_TOTALS[row["payments__payment_status"]]] += row["value"]
+            total_paid_by_member[row["payments__payer_id"]] += row["value"]
+    return general_totals, totals_by_day_of_regarding, total_paid_by_member
 
 
-def calculate_balance_by_member(totals_by_member, total_member_vs_member, expenses, group_total_weight):
+def calculate_balance_by_member(totals_by_member, total_member_vs_member, total_paid_by_member, group_total_weight):
     for creditor in total_member_vs_member.keys():
         for debtor in total_member_vs_member[creditor].keys():
             totals_by_member[creditor]["total_to_receive"] += total_member_vs_member[creditor][debtor]
@@ -85,22 +61,22 @@ def calculate_balance_by_member(totals_by_member, total_member_vs_member, expens
         totals_by_member[member]["balance"] = round(
             total_paid_shared - expected_total_paid, 2
         )
-        totals_by_member[member]["total_paid"] = expenses.filter(payments__payer_id=member).aggregate(total_paid=Sum("payments__value"))["total_paid"] or Decimal(0)
+        totals_by_member[member]["total_paid"] = total_paid_by_member.get(member, Decimal(0))
         totals_by_member[member]["final_balance"] = round(totals_by_member[member]["total_to_receive"] - totals_by_member[member]["total_to_pay"], 2)
         totals_by_member[member]["total_to_receive"] = round(totals_by_member[member]["total_to_receive"], 2)
         totals_by_member[member]["total_to_pay"] = round(totals_by_member[member]["total_to_pay"], 2)
     return totals_by_member
 
 
-def calculate_totals_by_member_and_member_versus_member(expense_items, memberships, group_total_weight):
-    totals_by_member = {
-        membership.user.id: {
+def create_totals_by_member(memberships):
+    return {
+        membership["user_id"]: {
             "shared": Decimal(0),
             "partial_shared": Decimal(0),
             "individual": Decimal(0),
             "total_paid_shared": Decimal(0),
-            "weight": membership.average_weight,
-            "full_name": membership.full_name,
+            "weight": membership["average_weight"],
+            "full_name": membership["full_name"],
             "total_to_receive": Decimal(0),
             "total_to_pay": Decimal(0),
             "final_balance": Decimal(0),
@@ -108,31 +84,37 @@ def calculate_totals_by_member_and_member_versus_member(expense_items, membershi
         }
         for membership in memberships
     }
-    members_ids = totals_by_member.keys()
 
+
+def create_total_member_vs_member(members_ids):
     total_member_vs_member = {}
     for x_member_id in members_ids:
         total_member_vs_member[x_member_id] = {}
         for y_member_id in members_ids:
             if x_member_id != y_member_id:
                 total_member_vs_member[x_member_id][y_member_id] = Decimal(0)
+    return total_member_vs_member
+
+
+def calculate_totals_by_member_and_member_versus_member(expense_items, memberships, group_total_weight):
+    totals_by_member = create_totals_by_member(memberships)
+    members_ids = totals_by_member.keys()
+    total_member_vs_member = create_total_member_vs_member(members_ids)
 
     for item in expense_items:
-        expense = item["expense"]
-        payments = expense["payments"]
-        payer = payments[0]["payer"]["id"]
-        if set(item["consumers"]) == set(members_ids):  # Shared between all members
+        payer = item["payer"]
+        if item["split_type"] == Item.SplitTypes.SHARED:  # Shared between all members
             for consumer in members_ids:
                 totals_by_member[consumer]["shared"] += Decimal(item["price"])
             totals_by_member[payer]["total_paid_shared"] += Decimal(item["price"])
-            for consumer in item["consumers"]:
+            for consumer in members_ids:
                 if consumer != payer:
                     total_member_vs_member[payer][consumer] += (
                             Decimal(item["price"])
                             * totals_by_member[consumer]["weight"]
                             / group_total_weight
                     )
-        elif len(item["consumers"]) == 1:  # Individual
+        elif item["split_type"] == Item.SplitTypes.INDIVIDUAL:  # Individual
             consumer = item["consumers"][0]
             totals_by_member[consumer]["individual"] += Decimal(item["price"])
             if consumer != payer:
@@ -151,6 +133,84 @@ def calculate_totals_by_member_and_member_versus_member(expense_items, membershi
     return totals_by_member, total_member_vs_member
 
 
+def units_to_decimal(value):
+    if not value:
+        return Decimal(0)
+    return Decimal(int(value)).scaleb(-PRICE_DECIMAL_PLACES)
+
+
+def calculate_totals_by_member_and_member_versus_member_vectorized(expense_items, memberships, group_total_weight):
+    totals_by_member = create_totals_by_member(memberships)
+    members_ids = list(totals_by_member.keys())
+    total_member_vs_member = create_total_member_vs_member(members_ids)
+    if not expense_items or not members_ids:
+        return totals_by_member, total_member_vs_member
+
+    # Prices are loaded as integers in units of 10^-4 so every sum below is exact
+    member_index = {member_id: index for index, member_id in enumerate(members_ids)}
+    n_items, n_members = len(expense_items), len(members_ids)
+    prices = np.empty(n_items, dtype=np.int64)
+    payers = np.empty(n_items, dtype=np.int64)
+    consumer_rows, consumer_columns = [], []
+    for row, item in enumerate(expense_items):
+        prices[row] = int(Decimal(item["price"]) * PRICE_SCALE)
+        payers[row] = member_index[item["payer"]]
+        for consumer in item["consumers"]:
+            consumer_rows.append(row)
+            consumer_columns.append(member_index[consumer])
+    consumers = np.zeros((n_items, n_members), dtype=np.int64)
+    consumers[consumer_rows, consumer_columns] = 1
+    payer_matrix = np.zeros((n_items, n_members), dtype=np.int64)
+    payer_matrix[np.arange(n_items), payers] = 1
+
+    split_types = np.array([item["split_type"] for item in expense_items])
+    n_consumers = consumers.sum(axis=1)
+    is_shared = split_types == Item.SplitTypes.SHARED  # Shared between all members
+    is_individual = split_types == Item.SplitTypes.INDIVIDUAL
+    is_partial = split_types == Item.SplitTypes.PARTIAL
+
+    shared_prices = np.where(is_shared, prices, 0)
+    individual_prices = np.where(is_individual, prices, 0)
+    partial_prices = np.where(is_partial, prices, 0)
+
+    total_shared = int(shared_prices.sum())
+    paid_shared_by_payer = payer_matrix.T @ shared_prices
+    individual_by_consumer = consumers.T @ individual_prices
+    partial_by_consumer = consumers.T @ partial_prices
+    individual_debts = payer_matrix.T @ (consumers * individual_prices[:, None])
+    partial_debts_by_size = {
+        int(size): payer_matrix.T @ (consumers * np.where(n_consumers == size, partial_prices, 0)[:, None])
+        for size in np.unique(n_consumers[is_partial])
+        if size > 0
+    }
+
+    for x_index, x_member_id in enumerate(members_ids):
+        totals = totals_by_member[x_member_id]
+        totals["shared"] = units_to_decimal(total_shared)
+        totals["partial_shared"] = units_to_decimal(partial_by_consumer[x_index])
+        totals["individual"] = units_to_decimal(individual_by_consumer[x_index])
+        totals["total_paid_shared"] = units_to_decimal(paid_shared_by_payer[x_index])
+        paid_shared = totals["total_paid_shared"]
+        for y_index, y_member_id in enumerate(members_ids):
+            if x_index == y_index:
+                continue
+            value = units_to_decimal(individual_debts[x_index, y_index])
+            if paid_shared:
+                value += paid_shared * totals_by_member[y_member_id]["weight"] / group_total_weight
+            for size, partial_debts in partial_debts_by_size.items():
+                if partial_debts[x_index, y_index]:
+                    value += units_to_decimal(partial_debts[x_index, y_index]) / size
+            total_member_vs_member[x_member_id][y_member_id] = value
+
+    return totals_by_member, total_member_vs_member
+
+
+TOTALS_ENGINES = {
+    "python": calculate_totals_by_member_and_member_versus_member,
+    "numpy": calculate_totals_by_member_and_member_versus_member_vectorized,
+}
+
+
 def adjust_total_member_vs_member(total_member_vs_member, totals_by_member):
     members_ids = totals_by_member.keys()
     total_member_vs_member2 = copy.deepcopy(total_member_vs_member)
@@ -179,23 +239,56 @@ def adjust_total_member_vs_member(total_member_vs_member, totals_by_member):
     return total_member_vs_member_with_names
 
 
-def calculate_totals_of_regarding(regarding, items):
-    expenses = regarding.expenses.prefetch_related("payments", "validations", "validations__validator").all()
-    memberships = (
-        regarding.expense_group.memberships.all()
-        .select_related("user")
-        .annotate(
-            full_name=Concat(F("user__first_name"), Value(" "), F("user__last_name"))
-        )
-    )
-    group_total_weight = sum(memberships.values_list("average_weight", flat=True))
-    general_totals = calculate_general_totals(expenses)
-    totals_by_day_of_regarding = calculate_total_by_day_in_regarding(expenses)
+def parse_balance(value):
+    if isinstance(value, str):  # Closed regardings keep their balances formatted as pt_BR
+        return parse_money(value)
+    return Decimal(str(value))
+
+
+def settle_balances(totals_by_member):
+    creditors, debtors = [], []
+    transfers = {}
+    for member_id, totals in totals_by_member.items():
+        transfers[totals["full_name"]] = {}
+        balance = int(round(parse_balance(totals["final_balance"]) * 100))  # In cents
+        if balance > 0:
+            heapq.heappush(creditors, (-balance, member_id))
+        elif balance < 0:
+            heapq.heappush(debtors, (balance, member_id))
+
+    while creditors and debtors:  # Greedily match the largest credit with the largest debt
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        value = min(-credit, -debt)
+        creditor_name = totals_by_member[creditor]["full_name"]
+        transfers[creditor_name][totals_by_member[debtor]["full_name"]] = Decimal(value).scaleb(-2)
+        if -credit > value:
+            heapq.heappush(creditors, (credit + value, creditor))
+        if -debt > value:
+            heapq.heappush(debtors, (debt + value, debtor))
+    return transfers
+
+
+def calculate_totals_from_data(regarding, memberships, expenses_payments, items=None, engine=None):
+    engine = engine or settings.STATS_ENGINE
+    group_total_weight = sum(membership["average_weight"] for membership in memberships)
     (
-        totals_by_member,
-        total_member_vs_member,
-    ) = calculate_totals_by_member_and_member_versus_member(items, memberships, group_total_weight)
-    totals_by_member = calculate_balance_by_member(totals_by_member, total_member_vs_member, expenses, group_total_weight)
+        general_totals,
+        totals_by_day_of_regarding,
+        total_paid_by_member,
+    ) = calculate_payments_totals(regarding, expenses_payments)
+    if engine == "ledger":
+        totals_by_member, total_member_vs_member = ledger.calculate_totals_from_ledger(
+            regarding, memberships, group_total_weight
+        )
+    else:
+        if items is None:
+            items = stats_data.load_items(regarding)
+        (
+            totals_by_member,
+            total_member_vs_member,
+        ) = TOTALS_ENGINES[engine](items, memberships, group_total_weight)
+    totals_by_member = calculate_balance_by_member(totals_by_member, total_member_vs_member, total_paid_by_member, group_total_weight)
     total_member_vs_member = adjust_total_member_vs_member(
         total_member_vs_member, totals_by_member
     )
@@ -205,3 +298,29 @@ def calculate_totals_of_regarding(regarding, items):
         totals_by_day_of_regarding,
         total_member_vs_member,
     )
+
+
+def calculate_totals_of_regarding(regarding, items=None, engine=None):
+    memberships = stats_data.load_memberships(regarding)
+    expenses_payments = stats_data.load_expenses_payments(regarding)
+    return calculate_totals_from_data(regarding, memberships, expenses_payments, items, engine)
+
+
+def calculate_totals_of_regardings(regardings, engine=None):
+    engine = engine or settings.STATS_ENGINE
+    if not regardings:
+        return {}
+    regardings_ids = [regarding.id for regarding in regardings]
+    memberships_by_group = stats_data.load_groups_memberships({regarding.expense_group_id for regarding in regardings})
+    expenses_payments_by_regarding = stats_data.load_regardings_expenses_payments(regardings_ids)
+    items_by_regarding = {} if engine == "ledger" else stats_data.load_regardings_items(regardings_ids)
+    return {
+        regarding.id: calculate_totals_from_data(
+            regarding,
+            memberships_by_group[regarding.expense_group_id],
+            expenses_payments_by_regarding[regarding.id],
+            items_by_regarding.get(regarding.id, []),
+            engine,
+        )
+        for regarding in regardings
+    }
@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from core.services import stats
+import threading
+import time
+
+VERSION_KEY = "regarding-stats-version:{}"
+TOTALS_KEY = "regarding-stats:{}:{}"
+HITS_KEY = "regarding-stats-hits"
+MISSES_KEY = "regarding-stats-misses"
+LOCK_KEY = "regarding-stats-lock:{}"
+POLL_INTERVAL = 0.05
+
+in_flight = {}
+in_flight_lock = threading.Lock()
+
+
+def new_version():
+    # Versions start from the clock, so an evicted counter never reuses the key of an old entry
+    return time.time_ns()
+
+
+def get_versions(regardings_ids):
+    keys = {regarding_id: VERSION_KEY.format(regarding_id) for regarding_id in regardings_ids}
+    versions = cache.get_many(keys.values())
+    missing = {key: new_version() for key in keys.values() if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return {regarding_id: versions[key] for regarding_id, key in keys.items()}
+
+
+def bump_version(regarding_id):
+    key = VERSION_KEY.format(regarding_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), timeout=None)
+
+
+def bump_versions(regardings_ids):
+    for regarding_id in regardings_ids:
+        bump_version(regarding_id)
+
+
+def bump_versions_on_commit(regardings_ids):
+    regardings_ids = {regarding_id for regarding_id in regardings_ids if regarding_id}
+    if regardings_ids:
+        transaction.on_commit(lambda: bump_versions(regardings_ids))
+
+
+def count(key, value):
+    if value:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, value)
+
+
+def get_cache_stats():
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {"hits": counters.get(HITS_KEY, 0), "misses": counters.get(MISSES_KEY, 0)}
+
+
+def compute_and_store(regardings, keys):
+    if not regardings:
+        return {}
+    computed = stats.calculate_totals_of_regardings(regardings)
+    cache.set_many({keys[regarding_id]: totals for regarding_id, totals in computed.items()},
+                   timeout=settings.STATS_CACHE_TIMEOUT)
+    return computed
+
+
+def compute_across_workers(regardings, keys):
+    owned, others = [], []
+    for regarding in regardings:
+        if cache.add(LOCK_KEY.format(keys[regarding.id]), 1, timeout=settings.STATS_LOCK_TIMEOUT):
+            owned.append(regarding)
+        else:
+            others.append(regarding)
+    try:
+        computed = compute_and_store(owned, keys)
+    finally:
+        cache.delete_many([LOCK_KEY.format(keys[regarding.id]) for regarding in owned])
+
+    pending = {regarding.id: regarding for regarding in others}
+    deadline = time.monotonic() + settings.STATS_LOCK_TIMEOUT
+    while pending and time.monotonic() < deadline:  # Another worker is computing them
+        time.sleep(POLL_INTERVAL)
+        found = cache.get_many([keys[regarding_id] for regarding_id in pending])
+        for regarding_id in list(pending):
+            if keys[regarding_id] in found:
+                computed[regarding_id] = found[keys[regarding_id]]
+                del pending[regarding_id]
+    computed.update(compute_and_store(list(pending.values()), keys))
+    return computed
+
+
+def compute_single_flight(regardings, keys):
+    leading, following = [], []
+    with in_flight_lock:
+        for regarding in regardings:
+            key = keys[regarding.id]
+            if key in in_flight:
+                following.append((regarding, in_flight[key]))
+            else:
+                in_flight[key] = threading.Event()
+                leading.append(regarding)
+    try:
+        computed = compute_across_workers(leading, keys)
+    finally:
+        with in_flight_lock:
+            for regarding in leading:
+                in_flight.pop(keys[regarding.id]).set()
+
+    for regarding, event in following:  # Another thread of this process is computing them
+        event.wait(settings.STATS_LOCK_TIMEOUT)
+        totals = cache.get(keys[regarding.id])
+        if totals is None:
+            totals = compute_and_store([regarding], keys)[regarding.id]
+        computed[regarding.id] = totals
+    return computed
+
+
+def get_totals_of_regardings(regardings):
+    if not regardings:
+        return {}
+    versions = get_versions([regarding.id for regarding in regardings])
+    keys = {regarding.id: TOTALS_KEY.format(regarding.id, versions[regarding.id]) for regarding in regardings}
+    cached = cache.get_many(keys.values())
+    totals_by_regarding = {
+        regarding_id: cached[key] for regarding_id, key in keys.items() if key in cached
+    }
+    missing = [regarding for regarding in regardings if regarding.id not in totals_by_regarding]
+    totals_by_regarding.update(compute_single_flight(missing, keys))
+    count(HITS_KEY, len(regardings) - len(missing))
+    count(MISSES_KEY, len(missing))
+    return totals_by_regarding
+
+
+def get_totals_of_regarding(regarding):
+    return get_totals_of_regardings([regarding])[regarding.id]
@@ -0,0 +1,90 @@
+from core.models import Membership, Payment, Item, Expense
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Concat
+from collections import defaultdict
+
+
+def load_groups_memberships(groups_ids):
+    memberships_by_group = defaultdict(list)
+    memberships = (
+        Membership.objects.filter(group_id__in=groups_ids)
+        .annotate(full_name=Concat(F("user__first_name"), Value(" "), F("user__last_name")))
+        .values("group_id", "user_id", "average_weight", "full_name")
+    )
+    for membership in memberships:
+        memberships_by_group[membership.pop("group_id")].append(membership)
+    return memberships_by_group
+
+
+def load_memberships(regarding):
+    return load_groups_memberships([regarding.expense_group_id])[regarding.expense_group_id]
+
+
+def load_regardings_expenses_payments(regardings_ids):
+    expenses_payments_by_regarding = defaultdict(list)
+    expenses_payments = (
+        Expense.objects.filter(regarding_id__in=regardings_ids)
+        .values("regarding_id", "id", "date", "cost", "payments__payer_id", "payments__payment_status")
+        .annotate(value=Sum("payments__value"))
+        .order_by("id")
+    )
+    for row in expenses_payments:
+        expenses_payments_by_regarding[row.pop("regarding_id")].append(row)
+    return expenses_payments_by_regarding
+
+
+def load_expenses_payments(regarding):
+    return load_regardings_expenses_payments([regarding.id])[regarding.id]
+
+
+def load_first_payers(payments):
+    first_payers = {}
+    for expense_id, payer_id in payments.order_by("expense_id", "id").values_list("expense_id", "payer_id"):
+        first_payers.setdefault(expense_id, payer_id)
+    return first_payers
+
+
+def load_consumers(consumers):
+    consumers_by_item = defaultdict(list)
+    for item_id, user_id in consumers.values_list("item_id", "user_id"):
+        consumers_by_item[item_id].append(user_id)
+    return consumers_by_item
+
+
+def load_item_rows(items, payments, consumers):
+    first_payers = load_first_payers(payments)
+    consumers_by_item = load_consumers(consumers)
+    items_by_regarding = defaultdict(list)
+    items = items.values_list("id", "price", "split_type", "expense_id", "expense__regarding_id")
+    for item_id, price, split_type, expense_id, regarding_id in items:
+        if expense_id not in first_payers:  # Expenses without payments have nobody to credit
+            continue
+        items_by_regarding[regarding_id].append({
+            "id": item_id,
+            "price": price,
+            "split_type": split_type,
+            "consumers": consumers_by_item[item_id],
+            "payer": first_payers[expense_id],
+        })
+    return items_by_regarding
+
+
+def load_regardings_items(regardings_ids):
+    return load_item_rows(
+        Item.objects.filter(expense__regarding_id__in=regardings_ids),
+        Payment.objects.filter(expense__regarding_id__in=regardings_ids),
+        Item.consumers.through.objects.filter(item__expense__regarding_id__in=regardings_ids),
+    )
+
+
+def load_items(regarding):
+    return load_regardings_items([regarding.id])[regarding.id]
+
+
+def load_expenses_items(expenses_ids):
+    items_by_regarding = load_item_rows(
+        Item.objects.filter(expense_id__in=expenses_ids),
+        Payment.objects.filter(expense_id__in=expenses_ids),
+        Item.consumers.through.objects.filter(item__expense_id__in=expenses_ids),
+    )
+    return [item for items in items_by_regarding.values() for item in items]
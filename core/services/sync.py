@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.db.models import Q, Subquery
+from django.utils import timezone
+from core.models import Expense, Item, Payment, Regarding, Validation, Notification, Tombstone
+from core.services import memberships
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+# (key, model, lookup from the model to its ExpenseGroup, or None for the rows owned by the user)
+SYNCED_MODELS = [
+    ("regardings", Regarding, "expense_group"),
+    ("expenses", Expense, "regarding__expense_group"),
+    ("items", Item, "expense__regarding__expense_group"),
+    ("payments", Payment, "expense__regarding__expense_group"),
+    ("validations", Validation, "expense__regarding__expense_group"),
+    ("notifications", Notification, None),
+]
+EXCLUDED_FIELDS = {"expenses_count"}  # Counters are updated without touching updated_at
+KEYS = {model: key for key, model, _ in SYNCED_MODELS}
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def get_fields(model):
+    return [field.attname for field in model._meta.concrete_fields if field.name not in EXCLUDED_FIELDS]
+
+
+def get_group_id(model, instance_id):
+    if model is Regarding:
+        return Regarding.objects.filter(id=instance_id).values("expense_group_id")[:1]
+    return Expense.objects.filter(id=instance_id).values("regarding__expense_group_id")[:1]
+
+
+def record_deletion(instance):
+    model = type(instance)
+    if model is Notification:
+        Tombstone.objects.create(model=KEYS[model], object_id=instance.id, user_id=instance.user_id)
+    elif model is Expense:
+        Tombstone.objects.create(model=KEYS[model], object_id=instance.id,
+                                 group_id=Subquery(get_group_id(Regarding, instance.regarding_id)))
+    elif model is Regarding:
+        Tombstone.objects.create(model=KEYS[model], object_id=instance.id, group_id=instance.expense_group_id)
+    elif instance.expense_id:
+        Tombstone.objects.create(model=KEYS[model], object_id=instance.id,
+                                 group_id=Subquery(get_group_id(Expense, instance.expense_id)))
+
+
+def new_token(groups_ids):
+    # Rows saved by transactions still open at this moment carry an older updated_at, so the next sync starts earlier
+    since = timezone.now() - timedelta(seconds=settings.SYNC_TOKEN_MARGIN)
+    if timezone.is_naive(since):  # Saved rows carry naive times in TIME_ZONE
+        since = timezone.make_aware(since)
+    # The token also lists the synced groups, so groups joined later are sent in full
+    return ".".join([str(int(since.timestamp() * 1_000_000)), *map(str, sorted(groups_ids))])
+
+
+def parse_token(token):
+    try:
+        timestamp, *groups_ids = token.split(".")
+        since = datetime.fromtimestamp(int(timestamp) / 1_000_000, tz=dt_timezone.utc)
+        groups_ids = {int(group_id) for group_id in groups_ids}
+    except (ValueError, OverflowError, OSError):
+        raise InvalidToken()
+    return (since if settings.USE_TZ else timezone.make_naive(since)), groups_ids
+
+
+def load_items_consumers(items):
+    consumers = Item.consumers.through.objects.filter(item_id__in=[item["id"] for item in items])
+    consumers_by_item = {item["id"]: [] for item in items}
+    for item_id, user_id in consumers.values_list("item_id", "user_id"):
+        consumers_by_item[item_id].append(user_id)
+    for item in items:
+        item["consumers"] = consumers_by_item[item["id"]]
+
+
+def get_changes(request, since=None, synced_groups_ids=()):
+    if since is not None and since < timezone.now() - timedelta(days=settings.SYNC_TOMBSTONES_RETENTION):
+        since = None  # Older tombstones were pruned, so the client has to replace its state
+    user = request.user
+    groups_ids = memberships.get_groups_ids(request)
+    token = new_token(groups_ids)
+    joined_groups_ids = [group_id for group_id in groups_ids if group_id not in synced_groups_ids]
+    changes = {}
+    for key, model, group_lookup in SYNCED_MODELS:
+        queryset = model.objects.filter(**{f"{group_lookup}__in": groups_ids} if group_lookup else {"user": user})
+        if since is not None:
+            changed = Q(updated_at__gte=since)
+            if group_lookup and joined_groups_ids:
+                changed |= Q(**{f"{group_lookup}__in": joined_groups_ids})
+            queryset = queryset.filter(changed)
+        changes[key] = list(queryset.order_by("updated_at", "id").values(*get_fields(model)))
+    load_items_consumers(changes["items"])
+
+    deleted = {key: [] for key, _, _ in SYNCED_MODELS}
+    if since is not None:
+        tombstones = Tombstone.objects.filter(Q(group_id__in=groups_ids) | Q(user_id=user.id), deleted_at__gte=since)
+        for model, object_id in tombstones.values_list("model", "object_id"):
+            deleted[model].append(object_id)
+    return {"token": token, "full": since is None, "groups": groups_ids, "changes": changes, "deleted": deleted}
+
+
+def prune_tombstones():
+    deleted, _ = Tombstone.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(days=settings.SYNC_TOMBSTONES_RETENTION)
+    ).delete()
+    return deleted
@@ -0,0 +1,177 @@
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from core.models import ExpenseGroup, Expense, Item, Payment, Membership, Regarding, Validation, GroupInvitation, \
+    Notification, User, Wallet, PaymentMethod
+from core.services import stats_cache, counters, group_versions, sync, memberships, items as items_service
+
+USER_HIDDEN_FIELDS = {"last_login", "password"}  # Saved on every login, never shown in the groups
+
+
+def get_expenses_regardings_ids(expenses_ids):
+    return Expense.objects.filter(id__in=expenses_ids).values_list("regarding_id", flat=True)
+
+
+@receiver(pre_save, sender=Expense)
+def expense_moved(sender, instance, update_fields=None, **kwargs):
+    if instance.pk and (update_fields is None or "regarding" in update_fields):
+        regardings_ids = list(get_expenses_regardings_ids([instance.pk]))
+        stats_cache.bump_versions_on_commit(regardings_ids)
+        group_versions.bump_regardings_groups(regardings_ids)
+        for regarding_id in regardings_ids:
+            if regarding_id != instance.regarding_id:
+                counters.count_expenses(regarding_id, -1)
+                counters.count_expenses(instance.regarding_id, 1)
+
+
+@receiver(post_save, sender=Expense)
+def expense_created(sender, instance, created, **kwargs):
+    if created:
+        counters.count_expenses(instance.regarding_id, 1)
+
+
+@receiver(post_delete, sender=Expense)
+def expense_deleted(sender, instance, **kwargs):
+    counters.count_expenses(instance.regarding_id, -1)
+
+
+@receiver(pre_save, sender=Regarding)
+def regarding_moved(sender, instance, update_fields=None, **kwargs):
+    if instance.pk and (update_fields is None or "expense_group" in update_fields):
+        previous = Regarding.objects.filter(id=instance.pk).values_list("expense_group_id", "expenses_count").first()
+        if previous and previous[0] != instance.expense_group_id:
+            group_versions.bump([previous[0]])
+            counters.count_regardings(previous[0], -1, previous[1])
+            counters.count_regardings(instance.expense_group_id, 1, previous[1])
+
+
+@receiver(post_save, sender=Regarding)
+def regarding_created(sender, instance, created, **kwargs):
+    if created:
+        counters.count_regardings(instance.expense_group_id, 1)
+
+
+@receiver(post_delete, sender=Regarding)
+def regarding_deleted(sender, instance, **kwargs):  # Its expenses were already discounted by their own deletion
+    counters.count_regardings(instance.expense_group_id, -1)
+
+
+@receiver(pre_save, sender=Payment)
+def payment_moved(sender, instance, update_fields=None, **kwargs):
+    if instance.pk and (update_fields is None or "payment_method" in update_fields):
+        previous = Payment.objects.filter(id=instance.pk).values_list("payment_method_id", flat=True).first()
+        if previous and previous != instance.payment_method_id:
+            counters.count_payments(previous, -1)
+            counters.count_payments(instance.payment_method_id, 1)
+
+
+@receiver(post_save, sender=Payment)
+def payment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.count_payments(instance.payment_method_id, 1)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    counters.count_payments(instance.payment_method_id, -1)
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def expense_changed(sender, instance, **kwargs):
+    stats_cache.bump_versions_on_commit([instance.regarding_id])
+    group_versions.bump_regardings_groups([instance.regarding_id])
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def expense_child_changed(sender, instance, **kwargs):
+    if instance.expense_id:
+        stats_cache.bump_versions_on_commit(get_expenses_regardings_ids([instance.expense_id]))
+        group_versions.bump_expenses_groups([instance.expense_id])
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, **kwargs):
+    items_service.update_items_split(Item.objects.filter(id=instance.id))
+
+
+@receiver(m2m_changed, sender=Item.consumers.through)
+def item_consumers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        items = Item.objects.filter(id__in=pk_set or [])
+    else:
+        items = Item.objects.filter(id=instance.id)
+    items.update(updated_at=timezone.now())  # The synced item rows carry their consumers
+    items_service.update_items_split(items)
+    stats_cache.bump_versions_on_commit(get_expenses_regardings_ids(items.values("expense_id")))
+    group_versions.bump_expenses_groups(items.values_list("expense_id", flat=True))
+
+
+@receiver(pre_save, sender=Membership)
+@receiver(pre_delete, sender=Membership)
+def membership_changing(sender, instance, **kwargs):  # Pins the shared items to the members who consumed them
+    if kwargs.get("signal") is pre_delete or instance._state.adding:
+        items_service.expand_group_shared_items(instance.group_id)
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def membership_changed(sender, instance, created=True, **kwargs):
+    if created:
+        items_service.update_group_items_split(instance.group_id)
+    stats_cache.bump_versions_on_commit(Regarding.objects.filter(expense_group_id=instance.group_id).values_list("id", flat=True))
+    group_versions.bump([instance.group_id])
+    memberships.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=ExpenseGroup)
+def expense_group_changed(sender, instance, created, **kwargs):
+    if not created:
+        group_versions.bump([instance.id])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    if not created and not (update_fields and set(update_fields) <= USER_HIDDEN_FIELDS):
+        group_versions.bump_users_groups([instance.id])
+
+
+@receiver(post_save, sender=Wallet)
+@receiver(post_delete, sender=Wallet)
+def wallet_changed(sender, instance, **kwargs):
+    group_versions.bump_users_groups([instance.owner_id])
+
+
+@receiver(post_save, sender=PaymentMethod)
+@receiver(pre_delete, sender=PaymentMethod)
+def payment_method_changed(sender, instance, **kwargs):  # Before the deletion, while its payments still point to it
+    group_versions.bump_payment_methods_groups([instance.id])
+
+
+@receiver(post_save, sender=Regarding)
+@receiver(post_delete, sender=Regarding)
+@receiver(post_save, sender=GroupInvitation)
+@receiver(post_delete, sender=GroupInvitation)
+def group_child_changed(sender, instance, **kwargs):
+    group_versions.bump([instance.expense_group_id])
+
+
+@receiver(post_save, sender=Validation)
+@receiver(post_delete, sender=Validation)
+def validation_changed(sender, instance, **kwargs):
+    group_versions.bump_expenses_groups([instance.expense_id])
+
+
+@receiver(post_delete, sender=Regarding)
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Validation)
+@receiver(post_delete, sender=Notification)
+def synced_row_deleted(sender, instance, **kwargs):
+    sync.record_deletion(instance)
@@ -1,3 +1,837 @@
-from django.test import TestCase
+from django.apps import apps
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from babel.numbers import format_decimal, format_currency
+from core import fast_serializers, formatting
+from core.renderers import RawJSONRenderer
+from core.models import User, Wallet, PaymentMethod, ExpenseGroup, Membership, Regarding, Expense, Item, Payment, \
+    Validation, Notification, RegardingMemberLedger, RegardingDebtLedger
+from core.serializers import ExpenseSerializerReader, PaymentSerializerReader, ItemSerializerReader, \
+    RegardingSerializerReader, ItemSerializerWriter
+from core.services import regardings, stats, counters, expenses, ledger, hot_queries, memberships, \
+    stats_cache, sync
+from core.views import ExpenseViewSet, PaymentViewSet, ItemViewSet, ValidationViewSet, ExpenseGroupViewSet, UserViewSet, \
+    WalletViewSet, PaymentMethodViewSet, RegardingViewSet, Sync, BatchMutations
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from base64 import b64encode
+from unittest import mock
+from urllib.parse import urlencode
+import gzip
+import importlib
+import random
+import threading
+import time
 
-# Create your tests here.
+
+def create_regarding_with_expenses(members_count, expenses_count=3):
+    group = ExpenseGroup.objects.create(name=f"Grupo {members_count}", drive_id="test")
+    members = []
+    for index in range(members_count):
+        user = User.objects.create_user(username=f"user-{members_count}-{index}", first_name="Membro", last_name=str(index))
+        wallet = Wallet.objects.create(owner=user)
+        PaymentMethod.objects.create(type=PaymentMethod.Types.CASH, wallet=wallet)
+        Membership.objects.create(group=group, user=user)
+        members.append(user)
+    regarding = Regarding.objects.create(name="Referência", start_date=date(2023, 1, 1), end_date=date(2023, 1, 31),
+                                         expense_group=group)
+    for index in range(expenses_count):
+        payer = members[index % members_count]
+        expense = Expense.objects.create(name=f"Despesa {index}", regarding=regarding, cost=Decimal("30"),
+                                         date=date(2023, 1, index + 1), created_by=payer)
+        shared_item = Item.objects.create(name="Compartilhado", price=Decimal("20"), expense=expense)
+        shared_item.consumers.set(members)
+        individual_item = Item.objects.create(name="Individual", price=Decimal("10"), expense=expense)
+        individual_item.consumers.set(members[:1])
+        Payment.objects.create(payer=payer, payment_method=payer.wallet.payment_methods.first(), value=Decimal("30"),
+                               expense=expense)
+    return regarding
+
+
+def create_random_regarding(rng, members_count, expenses_count=8):
+    group = ExpenseGroup.objects.create(name=f"Aleatório {members_count}", drive_id="test")
+    members = []
+    for index in range(members_count):
+        user = User.objects.create_user(username=f"random-{group.id}-{index}", first_name="Membro", last_name=str(index))
+        PaymentMethod.objects.create(type=PaymentMethod.Types.CASH, wallet=Wallet.objects.create(owner=user))
+        Membership.objects.create(group=group, user=user, average_weight=rng.choice(["0.5", "1", "1.5", "2"]))
+        members.append(user)
+    regarding = Regarding.objects.create(name="Aleatória", start_date=date(2023, 1, 1), expense_group=group)
+    for index in range(expenses_count):
+        expense = Expense.objects.create(name=f"Despesa {index}", regarding=regarding, cost=Decimal("0"),
+                                         date=date(2023, 1, index + 1), created_by=members[0])
+        for _ in range(rng.randint(1, 6)):
+            price = Decimal(rng.randint(1, 10 ** 7)).scaleb(-4)
+            consumers = rng.sample(members, rng.randint(1, members_count))
+            if len(consumers) == members_count and rng.random() < 0.5:
+                Item.objects.create(name="Todos", price=price, expense=expense, shared_by_all=True)
+            else:
+                Item.objects.create(name="Item", price=price, expense=expense).consumers.set(consumers)
+        if rng.random() < 0.8:  # The others stay unpaid
+            payer = rng.choice(members)
+            Payment.objects.create(payer=payer, payment_method=payer.wallet.payment_methods.first(),
+                                   value=Decimal(rng.randint(1, 10 ** 6)).scaleb(-2), expense=expense)
+    return regarding
+
+
+def round_totals(totals):
+    if isinstance(totals, dict):
+        return {key: round_totals(value) for key, value in totals.items()}
+    if isinstance(totals, Decimal):
+        return totals.quantize(Decimal("0.01"))
+    return totals
+
+
+class RegardingTotalsQueriesTestCase(TestCase):
+    def test_query_count_does_not_grow_with_group_size(self):
+        for members_count in (2, 10):
+            regarding = create_regarding_with_expenses(members_count)
+            with self.assertNumQueries(5):
+                _, totals_by_member, _, _ = stats.calculate_totals_of_regarding(regarding, engine="python")
+            self.assertEqual(len(totals_by_member), members_count)
+            self.assertEqual(sum(totals["total_paid"] for totals in totals_by_member.values()), Decimal("90"))
+
+
+class RegardingListQueriesTestCase(TestCase):
+    def create_group(self, members_count, regardings_count):
+        regarding = create_regarding_with_expenses(members_count)
+        group = regarding.expense_group
+        payer = group.members.first()
+        for index in range(1, regardings_count):
+            expense = Expense.objects.create(name="Despesa", cost=Decimal("10"), date=date(2023, 2, index), created_by=payer,
+                                             regarding=Regarding.objects.create(name=f"Referência {index}",
+                                                                                start_date=date(2023, 2, index),
+                                                                                end_date=date(2023, 2, index),
+                                                                                expense_group=group))
+            Item.objects.create(name="Item", price=Decimal("10"), expense=expense).consumers.set(group.members.all())
+            Payment.objects.create(payer=payer, payment_method=payer.wallet.payment_methods.first(), value=Decimal("10"),
+                                   expense=expense)
+        return payer
+
+    def list_regardings(self, user):
+        request = APIRequestFactory().get("/")
+        force_authenticate(request, user=user)
+        cache.clear()  # Stats and memberships are computed, not read from the cache
+        return RegardingViewSet.as_view({"get": "list"})(request)
+
+    def test_list_stats_queries_do_not_grow_with_the_regardings(self):
+        single, many = self.create_group(2, 1), self.create_group(3, 6)
+        with self.assertNumQueries(8):
+            response = self.list_regardings(single)
+        self.assertEqual(len(response.data), 1)
+        with self.assertNumQueries(8):
+            response = self.list_regardings(many)
+        self.assertEqual(len(response.data), 6)
+        self.assertTrue(all(regarding["general_total"]["total_payments"] for regarding in response.data))
+
+
+class TotalsEnginesTestCase(TestCase):
+    def test_engines_match_to_the_cent(self):
+        rng = random.Random(7)
+        for members_count in (1, 2, 5, 9):
+            regarding = create_random_regarding(rng, members_count)
+            expected = round_totals(stats.calculate_totals_of_regarding(regarding, engine="python"))
+            for engine in stats.TOTALS_ENGINES:
+                self.assertEqual(round_totals(stats.calculate_totals_of_regarding(regarding, engine=engine)), expected,
+                                 f"{engine} with {members_count} members")
+
+
+class SharedItemsTestCase(TestCase):
+    def get_consumed(self, regarding):
+        _, totals_by_member, _, total_member_vs_member = stats.calculate_totals_of_regarding(regarding, engine="python")
+        return ({member_id: totals["shared"] + totals["partial_shared"] + totals["individual"]
+                 for member_id, totals in totals_by_member.items()}, total_member_vs_member)
+
+    def test_members_who_join_later_do_not_consume_past_items(self):
+        regarding = create_regarding_with_expenses(2)
+        members = list(regarding.expense_group.members.order_by("id"))
+        expense = regarding.expenses.first()
+        listed = ItemSerializerWriter(data={"name": "Todos", "price": "12", "expense": expense.id,
+                                            "consumers": [member.id for member in members]})
+        listed.is_valid(raise_exception=True)
+        self.assertFalse(listed.save().shared_by_all)
+        flagged = ItemSerializerWriter(data={"name": "Todos", "price": "6", "expense": expense.id, "shared_by_all": True})
+        flagged.is_valid(raise_exception=True)
+        flagged_item = flagged.save()
+        self.assertTrue(flagged_item.shared_by_all)
+        consumed, total_member_vs_member = self.get_consumed(regarding)
+
+        newcomer = User.objects.create_user(username="newcomer", first_name="Membro", last_name="Novo")
+        Membership.objects.create(group=regarding.expense_group, user=newcomer)
+        consumed_after, total_member_vs_member_after = self.get_consumed(regarding)
+        self.assertEqual(consumed_after, {**consumed, newcomer.id: Decimal(0)})
+        self.assertEqual(total_member_vs_member_after, {**total_member_vs_member, "Membro Novo": {}})
+        flagged_item.refresh_from_db()
+        self.assertFalse(flagged_item.shared_by_all)
+        self.assertEqual(flagged_item.split_type, Item.SplitTypes.PARTIAL)
+        self.assertEqual(set(flagged_item.consumers.all()), set(members))
+
+
+class LedgerTestCase(TestCase):
+    def setUp(self):
+        self.regarding = create_random_regarding(random.Random(11), 4)
+        self.members = list(self.regarding.expense_group.members.order_by("id"))
+        self.user = self.members[0]
+
+    def assert_ledger_matches(self):
+        self.assertEqual(round_totals(stats.calculate_totals_of_regarding(self.regarding, engine="ledger")),
+                         round_totals(stats.calculate_totals_of_regarding(self.regarding, engine="python")))
+
+    def get_ledger(self):
+        return (sorted(RegardingMemberLedger.objects.filter(regarding=self.regarding)
+                       .values_list("member_id", *ledger.MEMBER_FIELDS)),
+                sorted((creditor_id, debtor_id, round(value, 8)) for creditor_id, debtor_id, value in
+                       RegardingDebtLedger.objects.filter(regarding=self.regarding)
+                       .values_list("creditor_id", "debtor_id", "value")))
+
+    def request(self, method, action, data=None, viewset_class=ExpenseViewSet, **kwargs):
+        request = getattr(APIRequestFactory(), method)("/", data, format="json")
+        force_authenticate(request, user=self.user)
+        response = viewset_class.as_view({method: action})(request, **kwargs)
+        self.assertLess(response.status_code, 300, response.data)
+        return response
+
+    def test_backfill_matches_the_rebuild(self):
+        migration = importlib.import_module("core.migrations.0046_backfill_regardings_ledger")
+        migration.backfill_regardings_ledger(apps, None)
+        backfilled = self.get_ledger()
+        self.assertTrue(backfilled[0])
+        ledger.rebuild_regarding(self.regarding)
+        self.assertEqual(backfilled, self.get_ledger())
+        self.assert_ledger_matches()
+
+    @mock.patch("core.services.google_drive.create_folder", return_value="galeria")
+    def test_ledger_follows_expense_writes(self, create_folder):
+        ledger.rebuild_regarding(self.regarding)
+        self.assert_ledger_matches()
+        members = [{"id": member.id} for member in self.members]
+        payment_method = {"id": self.user.wallet.payment_methods.first().id}
+        self.request("post", "create", {
+            "name": "Nova", "regarding": self.regarding.id, "cost": "60", "date": "2023-01-20", "created_by": self.user.id,
+            "items": [{"name": "Todos", "price": "40,00", "consumers": members},
+                      {"name": "Dois", "price": "20,00", "consumers": members[1:3]}],
+            "payments": [{"payer": {"id": self.members[1].id}, "payment_method": payment_method, "value": "60,00"}],
+        })
+        self.assert_ledger_matches()
+
+        expense = self.regarding.expenses.get(name="Nova")
+        kept, edited = expense.items.order_by("id")
+        items = [{"id": kept.id, "name": kept.name, "price": "40,00", "consumers": members},
+                 {"id": edited.id, "name": "Editado", "price": "7,50", "consumers": members[:1], "edited": True,
+                  "created_at": "2023-01-01"},
+                 {"name": "Criado", "price": "3,30", "consumers": members[2:], "create": True}]
+        self.request("patch", "partial_update", {"items": items, "payments": [], "gallery": {"photos": []}}, pk=expense.id)
+        self.assert_ledger_matches()
+
+        payment = {"id": 0, "payer": {"id": self.members[3].id}, "payer_name": "Membro 3",
+                   "payment_method": payment_method, "value": "10,00", "create": True}
+        self.request("patch", "partial_update", {"items": items[:1], "payments": [payment], "gallery": {"photos": []}},
+                     pk=expense.id)
+        self.assert_ledger_matches()
+
+        self.request("delete", "destroy", pk=self.regarding.expenses.last().id)
+        self.assert_ledger_matches()
+        request = APIRequestFactory().delete(f"/?ids={self.regarding.expenses.first().id}")
+        force_authenticate(request, user=self.user)
+        ExpenseViewSet.as_view({"delete": "destroy"})(request)
+        self.assert_ledger_matches()
+
+
+    def test_ledger_follows_item_and_payment_writes(self):
+        ledger.rebuild_regarding(self.regarding)
+        item = Item.objects.filter(expense__regarding=self.regarding, shared_by_all=False).order_by("id").first()
+        self.request("patch", "partial_update", {"price": "123.4500", "consumers": [member.id for member in self.members[1:3]]},
+                     viewset_class=ItemViewSet, pk=item.id)
+        self.assert_ledger_matches()
+        self.request("delete", "destroy", viewset_class=ItemViewSet, pk=item.id)
+        self.assert_ledger_matches()
+        first_payment = Payment.objects.filter(expense__regarding=self.regarding).order_by("id").first()
+        self.request("delete", "destroy", viewset_class=PaymentViewSet, pk=first_payment.id)
+        self.assert_ledger_matches()
+
+class FastListSerializersTestCase(TestCase):
+    def setUp(self):
+        regarding = create_regarding_with_expenses(3)
+        self.user = regarding.expense_group.members.first()
+        for expense in regarding.expenses.all():
+            Validation.objects.create(validator=self.user, expense=expense)
+        partial_item = Item.objects.create(name="Parcial", price=Decimal("15"), expense=expense)
+        partial_item.consumers.set(regarding.expense_group.members.all()[:2])
+        Item.objects.create(name="Todos", price=Decimal("9"), expense=expense, shared_by_all=True)
+
+    def assert_same_output(self, viewset_class, serializer_class, fast_serializer):
+        for raw in (False, True):
+            request = Request(APIRequestFactory().get("/"))
+            request.user = self.user
+            if raw:
+                request.accepted_renderer = RawJSONRenderer()
+            view = viewset_class(request=request, format_kwarg=None, action="list")
+            queryset = view.filter_queryset(view.get_queryset())
+            expected = serializer_class(queryset, many=True, context={"request": request}).data
+            self.assertEqual(JSONRenderer().render(fast_serializer(queryset.all(), raw=raw)),
+                             JSONRenderer().render(expected))
+
+    def test_expenses_output_matches_serializer(self):
+        self.assert_same_output(ExpenseViewSet, ExpenseSerializerReader, fast_serializers.serialize_expenses)
+
+    def test_payments_output_matches_serializer(self):
+        self.assert_same_output(PaymentViewSet, PaymentSerializerReader, fast_serializers.serialize_payments)
+
+    def test_items_output_matches_serializer(self):
+        self.assert_same_output(ItemViewSet, ItemSerializerReader, fast_serializers.serialize_items)
+
+
+class FormattingTestCase(TestCase):
+    values = [0, 3, 0.5, 2.675, -0.0, "12.5", Decimal("-0"), Decimal("-0.000001"), Decimal("0.000015"),
+              Decimal("1E+3"), Decimal("1234567.8912"), Decimal("-98765.4321"), Decimal("999999.999995")]
+
+    def test_money_matches_babel(self):
+        for value in self.values:
+            self.assertEqual(formatting.format_money(value), format_decimal(value, locale="pt_BR", format="#.###,00"))
+
+    def test_currency_matches_babel(self):
+        for value in self.values:
+            self.assertEqual(formatting.format_currency(value),
+                             format_currency(value, "BRL", "#,##0.00", locale="pt_BR"))
+
+    def test_dates_match_strftime(self):
+        value = datetime(2023, 1, 5, 7, 3)
+        self.assertEqual(formatting.format_date(value), value.strftime("%d/%m/%Y"))
+        self.assertEqual(formatting.format_datetime(value), value.strftime("%d/%m/%Y %H:%M"))
+
+
+class ClosedRegardingTestCase(TestCase):
+    def setUp(self):
+        self.regarding = create_regarding_with_expenses(3)
+        self.user = self.regarding.expense_group.members.order_by("id").first()
+
+    def serialize(self, query="", renderer=None):
+        request = Request(APIRequestFactory().get(f"/{query}"))
+        request.user = self.user
+        if renderer:
+            request.accepted_renderer = renderer
+        return RegardingSerializerReader(self.regarding, context={"request": request}).data
+
+    def render_totals(self, query="", renderer=None):
+        data = self.serialize(query, renderer)
+        return JSONRenderer().render({field: data[field] for field in RegardingSerializerReader.TOTALS_FIELDS})
+
+    def close(self):
+        self.regarding.refresh_from_db()
+        self.regarding.balance_json = regardings.build_balance_snapshot(self.regarding)
+        self.regarding.is_closed = True
+        self.regarding.save()
+        self.regarding.refresh_from_db()
+
+    def test_closed_regarding_renders_like_the_open_one(self):
+        variants = [("", None), ("?settlement=minimal", None), ("", RawJSONRenderer())]
+        self.regarding.refresh_from_db()
+        open_outputs = [self.render_totals(query, renderer) for query, renderer in variants]
+        self.close()
+        self.assertEqual([self.render_totals(query, renderer) for query, renderer in variants], open_outputs)
+
+    def retrieve(self, **headers):
+        request = APIRequestFactory().get("/", **headers)
+        force_authenticate(request, user=self.user)
+        return RegardingViewSet.as_view({"get": "retrieve"})(request, pk=self.regarding.id)
+
+    def test_precompressed_response_is_refreshed_by_the_cron(self):
+        self.close()
+        response = self.retrieve(HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual((response.status_code, response["Content-Encoding"]), (200, "gzip"))
+        self.assertIn("Accept-Encoding", response["Vary"])
+        plain = self.retrieve()
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(plain["ETag"], response["ETag"])
+        self.assertEqual(self.retrieve(HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        Item.objects.filter(expense__regarding=self.regarding).update(price=Decimal("50"))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("update_and_close_regardings")
+        refreshed = self.retrieve(HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertNotEqual(refreshed["ETag"], response["ETag"])
+
+    def test_minimal_settlement_of_a_closed_regarding(self):
+        self.close()
+        self.assertEqual(self.serialize("?settlement=minimal")["total_member_vs_member"],
+                         {"Membro 0": {}, "Membro 1": {"Membro 0": "10,00"}, "Membro 2": {"Membro 0": "10,00"}})
+
+
+class StatsCacheTestCase(TestCase):
+    def test_status_commands_invalidate_the_cached_totals(self):
+        regarding = create_regarding_with_expenses(2)
+        self.assertEqual(stats_cache.get_totals_of_regarding(regarding)[0]["total_validation"], Decimal("90"))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("update_expense_validation_status")
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("update_payment_status")
+        general_totals = stats_cache.get_totals_of_regarding(regarding)[0]
+        self.assertEqual((general_totals["total_validation"], general_totals["total_paid"]), (0, Decimal("90")))
+
+
+
+class CountingEngine:
+    def __init__(self, failing_calls=()):
+        self.calls = 0
+        self.failing_calls = failing_calls
+        self.lock = threading.Lock()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, regardings):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        self.started.set()
+        self.release.wait(5)
+        if call in self.failing_calls:
+            raise RuntimeError("Engine failed")
+        return {regarding.id: {"call": call} for regarding in regardings}
+
+
+class StatsSingleFlightTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.regarding = create_regarding_with_expenses(2)
+
+    def get_concurrently(self, engine, threads_count):
+        results = [None] * threads_count
+
+        def get(index):
+            try:
+                results[index] = stats_cache.get_totals_of_regarding(self.regarding)
+            except RuntimeError as error:
+                results[index] = error
+
+        threads = [threading.Thread(target=get, args=(index,)) for index in range(threads_count)]
+        with mock.patch("core.services.stats.calculate_totals_of_regardings", engine):
+            threads[0].start()
+            engine.started.wait(5)
+            for thread in threads[1:]:
+                thread.start()
+            time.sleep(0.2)  # The others find the first thread computing
+            engine.release.set()
+            for thread in threads:
+                thread.join(5)
+        return results
+
+    def test_concurrent_misses_compute_once(self):
+        engine = CountingEngine()
+        self.assertEqual(self.get_concurrently(engine, 4), [{"call": 1}] * 4)
+        self.assertEqual(engine.calls, 1)
+
+    def test_waiters_compute_when_the_leader_fails(self):
+        engine = CountingEngine(failing_calls=(1,))
+        leader, *followers = self.get_concurrently(engine, 3)
+        self.assertIsInstance(leader, RuntimeError)
+        self.assertTrue(all(set(totals) == {"call"} and totals["call"] > 1 for totals in followers))
+
+    def lock_in_another_worker(self):
+        version = stats_cache.get_versions([self.regarding.id])[self.regarding.id]
+        key = stats_cache.TOTALS_KEY.format(self.regarding.id, version)
+        cache.add(stats_cache.LOCK_KEY.format(key), 1)
+        return key
+
+    def test_waiters_get_the_result_stored_by_another_worker(self):
+        key = self.lock_in_another_worker()
+        engine = CountingEngine()
+        engine.release.set()
+        threading.Timer(0.2, lambda: cache.set(key, {"call": "other worker"})).start()
+        with mock.patch("core.services.stats.calculate_totals_of_regardings", engine):
+            self.assertEqual(stats_cache.get_totals_of_regarding(self.regarding), {"call": "other worker"})
+        self.assertEqual(engine.calls, 0)
+
+    @override_settings(STATS_LOCK_TIMEOUT=1)
+    def test_waiters_compute_when_the_other_worker_dies(self):
+        self.lock_in_another_worker()
+        engine = CountingEngine()
+        engine.release.set()
+        with mock.patch("core.services.stats.calculate_totals_of_regardings", engine):
+            self.assertEqual(stats_cache.get_totals_of_regarding(self.regarding), {"call": 1})
+
+
+class SparseFieldsTestCase(TestCase):
+    def setUp(self):
+        self.user = create_regarding_with_expenses(3).expense_group.members.first()
+
+    def get_expenses(self, query):
+        request = APIRequestFactory().get(f"/{query}")
+        force_authenticate(request, user=self.user)
+        return ExpenseViewSet.as_view({"get": "list"})(request).data
+
+    def test_fields_keeps_only_requested_fields(self):
+        self.get_expenses("?fields=id")  # Caches the user's memberships
+        with self.assertNumQueries(2):  # The groups versions and the expenses
+            data = self.get_expenses("?fields=id,name,cost")
+        self.assertEqual(list(data[0]), ["id", "name", "cost"])
+
+    def test_nested_fields_and_omit(self):
+        data = self.get_expenses("?fields=id,payments.value,items.name")
+        self.assertEqual(data[0]["payments"], [{"value": "30,00"}])
+        self.assertEqual(data[0]["items"], [{"name": "Compartilhado"}, {"name": "Individual"}])
+        data = self.get_expenses("?omit=validations,items.consumers,items.consumers_names")
+        self.assertNotIn("validations", data[0])
+        self.assertNotIn("consumers", data[0]["items"][0])
+        self.assertIn("shared_total", data[0])
+
+    def test_expand_keeps_only_listed_nested_serializers(self):
+        data = self.get_expenses("?expand=items")
+        self.assertIn("items", data[0])
+        self.assertNotIn("payments", data[0])
+        self.assertNotIn("validations", data[0])
+        self.assertIn("shared_total", data[0])
+
+
+class QueryPlanTestCase(TestCase):
+    viewsets = [ExpenseViewSet, PaymentViewSet, ItemViewSet, ValidationViewSet, ExpenseGroupViewSet, UserViewSet,
+                WalletViewSet, PaymentMethodViewSet]
+
+    def setUp(self):
+        regarding = create_regarding_with_expenses(3)
+        self.user = regarding.expense_group.members.first()
+        for expense in regarding.expenses.all():
+            Validation.objects.create(validator=self.user, expense=expense)
+        Item.objects.create(name="Todos", price=Decimal("9"), expense=expense, shared_by_all=True)
+
+    def assert_no_lazy_queries(self, viewset_class, query):
+        request = Request(APIRequestFactory().get(f"/{query}"))
+        request.user = self.user
+        view = viewset_class(request=request, format_kwarg=None, action="list")
+        instances = list(view.filter_queryset(view.get_queryset()))
+        self.assertTrue(instances)
+        with self.assertNumQueries(0, msg=f"{viewset_class.__name__}{query}"):
+            view.get_serializer(instances, many=True).data
+
+    def test_serializers_do_not_query_after_the_planned_queryset(self):
+        for viewset_class in self.viewsets:
+            for query in ["", "?fields=id,name,full_name", "?omit=expense,validations", "?expand="]:
+                self.assert_no_lazy_queries(viewset_class, query)
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        regarding = create_regarding_with_expenses(2, expenses_count=7)
+        regarding.expenses.filter(date__gt=date(2023, 1, 3)).update(date=date(2023, 1, 4))  # Ties broken by the id
+        self.user = regarding.expense_group.members.first()
+
+    def get(self, viewset_class, query):
+        request = APIRequestFactory().get(f"/{query}")
+        force_authenticate(request, user=self.user)
+        return viewset_class.as_view({"get": "list"})(request).data
+
+    def walk(self, viewset_class, query):
+        pages = [self.get(viewset_class, query)]
+        while pages[-1]["next"]:
+            pages.append(self.get(viewset_class, "?" + pages[-1]["next"].split("?", 1)[1]))
+        return pages
+
+    def test_pages_cover_the_legacy_list_once(self):
+        for viewset_class in (ExpenseViewSet, PaymentViewSet, ItemViewSet):
+            for query in ["?page_size=2", "?page_size=2&fields=id"]:
+                pages = self.walk(viewset_class, query)
+                ids = [instance["id"] for page in pages for instance in page["results"]]
+                legacy_ids = [instance["id"] for instance in self.get(viewset_class, "")]
+                self.assertEqual(sorted(ids), sorted(legacy_ids))
+                self.assertEqual(len(set(ids)), len(ids))
+
+    def test_previous_links_walk_back(self):
+        pages = self.walk(ExpenseViewSet, "?page_size=3")
+        self.assertEqual([len(page["results"]) for page in pages], [3, 3, 1])
+        previous = self.get(ExpenseViewSet, "?" + pages[-1]["previous"].split("?", 1)[1])
+        self.assertEqual(previous["results"], pages[1]["results"])
+        self.assertIsNone(pages[0]["previous"])
+
+
+    def test_tampered_cursors_are_not_found(self):
+        for tokens in [{"p": "not-a-date|1"}, {"p": "2023-01-04"}, {}]:
+            cursor = b64encode(urlencode(tokens).encode()).decode()
+            request = APIRequestFactory().get("/", {"cursor": cursor})
+            force_authenticate(request, user=self.user)
+            self.assertEqual(ExpenseViewSet.as_view({"get": "list"})(request).status_code, 404, tokens)
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.regarding = create_regarding_with_expenses(2)
+        self.user = self.regarding.expense_group.members.first()
+
+    def get(self, viewset_class, etag=None, **kwargs):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        request = APIRequestFactory().get("/", **headers)
+        force_authenticate(request, user=self.user)
+        action = "retrieve" if kwargs else "list"
+        return viewset_class.as_view({"get": action})(request, **kwargs)
+
+    def test_unchanged_groups_answer_not_modified_without_serializing(self):
+        for viewset_class, kwargs in [(ExpenseGroupViewSet, {}), (RegardingViewSet, {}), (ExpenseViewSet, {}),
+                                      (ExpenseViewSet, {"pk": self.regarding.expenses.first().id})]:
+            response = self.get(viewset_class, **kwargs)
+            self.assertEqual(response.status_code, 200)
+            with self.assertNumQueries(1):
+                not_modified = self.get(viewset_class, response["ETag"], **kwargs)
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified["ETag"], response["ETag"])
+
+    def test_writes_change_the_etag(self):
+        etag = self.get(ExpenseViewSet)["ETag"]
+        item = Item.objects.filter(expense__regarding=self.regarding).first()
+        item.consumers.remove(self.user)
+        response = self.get(ExpenseViewSet, etag)
+        self.assertEqual(response.status_code, 200)
+        Membership.objects.create(group=self.regarding.expense_group,
+                                  user=User.objects.create_user(username="novo", first_name="Novo", last_name="Membro"))
+        self.assertEqual(self.get(ExpenseGroupViewSet, response["ETag"]).status_code, 200)
+        self.assertEqual(self.get(ExpenseViewSet, etag).status_code, 200)
+
+
+    def test_names_and_payment_methods_change_the_etag(self):
+        other = self.regarding.expense_group.members.exclude(id=self.user.id).get()
+        etag = self.get(ExpenseViewSet)["ETag"]
+        update_last_login(None, other)
+        self.assertEqual(self.get(ExpenseViewSet, etag).status_code, 304)
+        other.first_name = "Renomeado"
+        other.save()
+        response = self.get(ExpenseViewSet, etag)
+        self.assertEqual(response.status_code, 200)
+        payment_method = other.wallet.payment_methods.get()
+        payment_method.description = "Conta"
+        payment_method.save()
+        self.assertEqual(self.get(ExpenseViewSet, response["ETag"]).status_code, 200)
+
+    def test_status_commands_keep_the_versions_of_unchanged_rows(self):
+        Validation.objects.create(validator=self.user, expense=self.regarding.expenses.first())  # Stays awaiting
+        for _ in range(2):
+            call_command("update_expense_validation_status")
+            call_command("update_payment_status")
+        etag = self.get(ExpenseViewSet)["ETag"]
+        stats_versions = stats_cache.get_versions([self.regarding.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("update_expense_validation_status")
+            call_command("update_payment_status")
+        self.assertEqual(self.get(ExpenseViewSet, etag).status_code, 304)
+        self.assertEqual(stats_cache.get_versions([self.regarding.id]), stats_versions)
+
+
+@override_settings(SYNC_TOKEN_MARGIN=0)
+class SyncTestCase(TestCase):
+    def setUp(self):
+        self.regarding = create_regarding_with_expenses(2)
+        self.user = self.regarding.expense_group.members.first()
+        create_regarding_with_expenses(3)
+
+    def get(self, query=""):
+        request = APIRequestFactory().get(f"/{query}")
+        force_authenticate(request, user=self.user)
+        return Sync.as_view()(request)
+
+    def test_full_sync_returns_the_user_groups_rows(self):
+        data = self.get().data
+        self.assertTrue(data["full"])
+        self.assertEqual(data["groups"], [self.regarding.expense_group_id])
+        self.assertEqual(len(data["changes"]["expenses"]), 3)
+        self.assertEqual(len(data["changes"]["items"]), 6)
+        self.assertEqual(self.get("?since=invalid").status_code, 400)
+
+    def test_delta_returns_changes_and_tombstones(self):
+        token = self.get().data["token"]
+        item = Item.objects.filter(expense__regarding=self.regarding).first()
+        item_id = item.id
+        item.delete()
+        expense = self.regarding.expenses.first()
+        expense.payments.update(payment_status=Payment.PaymentStatuses.PAID)
+        expenses.update_payments_payment_status(expense.payments.all())
+        data = self.get(f"?since={token}").data
+        self.assertFalse(data["full"])
+        self.assertEqual(data["deleted"]["items"], [item_id])
+        self.assertEqual([payment["id"] for payment in data["changes"]["payments"]],
+                         list(expense.payments.values_list("id", flat=True)))
+        self.assertEqual(data["changes"]["expenses"], [])
+
+
+    def test_delta_returns_every_row_of_a_joined_group(self):
+        token = self.get().data["token"]
+        other_regarding = Regarding.objects.exclude(expense_group=self.regarding.expense_group).get()
+        Membership.objects.create(group=other_regarding.expense_group, user=self.user)
+        yesterday = timezone.now() - timedelta(days=1)
+        for model in (Regarding, Expense, Item, Payment):
+            model.objects.update(updated_at=yesterday)
+        data = self.get(f"?since={token}").data
+        self.assertFalse(data["full"])
+        self.assertEqual(len(data["changes"]["regardings"]), 1)
+        self.assertEqual({expense["regarding_id"] for expense in data["changes"]["expenses"]}, {other_regarding.id})
+        self.assertEqual((len(data["changes"]["expenses"]), len(data["changes"]["items"]), len(data["changes"]["payments"])),
+                         (3, 6, 3))
+
+    def test_tokens_are_read_as_utc_instants(self):
+        instant = datetime(2024, 3, 10, 12, 30, tzinfo=dt_timezone.utc)
+        token = str(int(instant.timestamp() * 1_000_000))
+        self.assertEqual(sync.parse_token(token), (timezone.make_naive(instant), set()))
+        with override_settings(USE_TZ=True):
+            self.assertEqual(sync.parse_token(f"{token}.4.9"), (instant, {4, 9}))
+
+    def test_status_commands_only_touch_the_rows_they_change(self):
+        Validation.objects.create(validator=self.user, expense=self.regarding.expenses.first())  # Stays awaiting
+        for _ in range(2):  # Expenses follow their payments' statuses on the next run
+            call_command("update_expense_validation_status")
+            call_command("update_payment_status")
+        yesterday = timezone.now() - timedelta(days=1)
+        Expense.objects.update(updated_at=yesterday)
+        Payment.objects.update(updated_at=yesterday)
+        token = self.get().data["token"]
+        call_command("update_expense_validation_status")
+        call_command("update_payment_status")
+        changes = self.get(f"?since={token}").data["changes"]
+        self.assertEqual((changes["expenses"], changes["payments"]), ([], []))
+
+
+class BatchMutationsTestCase(TestCase):
+    def setUp(self):
+        self.regarding = create_regarding_with_expenses(3)
+        self.members = list(self.regarding.expense_group.members.order_by("id"))
+        self.user = self.members[0]
+        ledger.rebuild_regarding(self.regarding)
+
+    def post(self, operations):
+        request = APIRequestFactory().post("/", {"operations": operations}, format="json")
+        force_authenticate(request, user=self.user)
+        return BatchMutations.as_view()(request)
+
+    def get_ledger(self):
+        return sorted(
+            (row["member_id"], [str(row[field]) for field in ledger.MEMBER_FIELDS])
+            for row in RegardingMemberLedger.objects.filter(regarding=self.regarding).values()
+            if any(row[field] for field in ledger.MEMBER_FIELDS)
+        )
+
+    @mock.patch("core.services.google_drive.create_folder", return_value="galeria")
+    def test_operations_are_applied_in_order_with_one_notification_per_member(self, create_folder):
+        members_ids = [member.id for member in self.members]
+        expense = self.regarding.expenses.first()
+        item = expense.items.first()
+        notifications_count = Notification.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post([
+                {"op": "create", "model": "expense", "ref": "e1", "data": {
+                    "name": "Offline", "regarding": self.regarding.id, "cost": "30", "date": "2023-01-20",
+                    "validators": [{"id": members_ids[1]}]}},
+                {"op": "create", "model": "item", "ref": "i1", "data": {
+                    "expense": "e1", "name": "Todos", "price": "20", "consumers": members_ids}},
+                {"op": "create", "model": "item", "data": {
+                    "expense": "e1", "name": "Meu", "price": "10", "consumers": members_ids[:1]}},
+                {"op": "create", "model": "payment", "data": {
+                    "expense": "e1", "payer": self.user.id, "payment_method": self.user.wallet.payment_methods.first().id,
+                    "value": "30"}},
+                {"op": "update", "model": "item", "ref": "i1", "data": {"name": "Todos nós"}},
+                {"op": "update", "model": "expense", "id": expense.id, "data": {"name": "Renomeada"}},
+                {"op": "delete", "model": "item", "id": item.id},
+            ])
+        self.assertEqual(response.status_code, 200)
+        created = Expense.objects.get(id=response.data["refs"]["e1"])
+        self.assertEqual(list(created.items.order_by("id").values_list("name", "split_type")),
+                         [("Todos nós", Item.SplitTypes.SHARED), ("Meu", Item.SplitTypes.INDIVIDUAL)])
+        self.assertEqual(created.validations.get().validator_id, members_ids[1])
+        self.assertEqual(created.gallery, {"id": "galeria", "photos": []})
+        self.assertEqual(Notification.objects.count() - notifications_count, len(members_ids) - 1)
+        self.assertEqual([counters.get_drifted_ids(*counter) for counter in counters.COUNTERS], [[], [], [], []])
+        batch_ledger = self.get_ledger()
+        ledger.rebuild_regarding(self.regarding)
+        self.assertEqual(batch_ledger, self.get_ledger())
+
+    def test_deletions_keep_the_surviving_expenses_in_the_ledger(self):
+        expense = self.regarding.expenses.first()
+        response = self.post([
+            {"op": "delete", "model": "item", "id": expense.items.first().id},
+            {"op": "delete", "model": "payment", "id": self.regarding.expenses.last().payments.first().id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        batch_ledger = self.get_ledger()
+        ledger.rebuild_regarding(self.regarding)
+        self.assertEqual(batch_ledger, self.get_ledger())
+
+    @mock.patch("core.services.google_drive.create_folder", return_value="galeria")
+    def test_invalid_operation_rolls_back_the_batch(self, create_folder):
+        other_expense = create_regarding_with_expenses(2).expenses.first()
+        response = self.post([
+            {"op": "create", "model": "expense", "data": {
+                "name": "Offline", "regarding": self.regarding.id, "cost": "30", "date": "2023-01-20"}},
+            {"op": "delete", "model": "expense", "id": other_expense.id},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(1, response.data["operations"])
+        self.assertFalse(Expense.objects.filter(name="Offline").exists())
+        create_folder.assert_not_called()
+
+
+class HotQueriesTestCase(TestCase):
+    def test_hot_queries_use_their_indexes(self):
+        for name, queryset, index in hot_queries.get_hot_queries():
+            self.assertIn(index, hot_queries.explain(queryset), name)
+
+
+class MembershipsTestCase(TestCase):
+    def setUp(self):
+        self.regarding = create_regarding_with_expenses(2)
+        self.user = self.regarding.expense_group.members.first()
+
+    def get_request(self):
+        request = Request(APIRequestFactory().get("/"))
+        request.user = self.user
+        return request
+
+    def test_memberships_are_resolved_once_and_invalidated_on_changes(self):
+        group = self.regarding.expense_group
+        memberships.load_groups_ids(self.user.id)
+        request = self.get_request()
+        with self.assertNumQueries(0):
+            self.assertTrue(memberships.is_member(request, group.id))
+            self.assertEqual(memberships.get_groups_ids(request), [group.id])
+
+        other_group = create_regarding_with_expenses(3).expense_group
+        Membership.objects.create(group=other_group, user=self.user, level=Membership.Levels.READER)
+        self.assertTrue(memberships.is_member(self.get_request(), other_group.id))
+        Membership.objects.filter(group=group, user=self.user).delete()
+        self.assertEqual(memberships.get_groups_ids(self.get_request()), [other_group.id])
+
+
+class CountersTestCase(TestCase):
+    def assert_counters_match(self):
+        self.assertEqual([counters.get_drifted_ids(*counter) for counter in counters.COUNTERS], [[], [], [], []])
+
+    def test_counters_follow_creations_moves_and_deletions(self):
+        regarding = create_regarding_with_expenses(2)
+        first, second = [user.wallet.payment_methods.first() for user in regarding.expense_group.members.all()]
+        regarding.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual((regarding.expenses_count, first.payments_count), (3, 2))
+        self.assert_counters_match()
+
+        payment = first.payments.first()
+        payment.payment_method = second
+        payment.save()
+        self.assert_counters_match()
+
+        other = Regarding.objects.create(name="Outra", start_date=date(2023, 2, 1), expense_group=regarding.expense_group)
+        expense = regarding.expenses.first()
+        expense.regarding = other
+        expense.save()
+        self.assert_counters_match()
+
+        Expense.objects.filter(regarding=regarding).delete()
+        self.assert_counters_match()
+        other.delete()
+        self.assert_counters_match()
+
+    def test_reconcile_fixes_drifted_counters(self):
+        regarding = create_regarding_with_expenses(2)
+        Regarding.objects.filter(id=regarding.id).update(expenses_count=10)
+        drifted = [counters.reconcile(*counter) for counter in counters.COUNTERS]
+        self.assertEqual(drifted, [[regarding.id], [], [], []])
+        self.assert_counters_match()
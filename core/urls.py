@@ -24,5 +24,7 @@ urlpatterns = [
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     path('login/', views.Login.as_view()),
     path('register/', views.Register.as_view()),
-    path('join-group/<str:hash>', views.JoinGroup.as_view())
+    path('join-group/<str:hash>', views.JoinGroup.as_view()),
+    path('sync/', views.Sync.as_view()),
+    path('batch/', views.BatchMutations.as_view())
 ]
\ No newline at end of file
@@ -6,13 +6,19 @@ from core.models import ExpenseGroup, Regarding, Wallet, PaymentMethod, Payment,
     Validation, Membership, ActionLog, GroupInvitation
 from core.serializers import ExpenseSerializerReader, ExpenseSerializerWriter, RegardingSerializerWriter, RegardingSerializerReader, WalletSerializer, PaymentMethodSerializer, \
     PaymentSerializerWriter, PaymentSerializerReader, ExpenseGroupSerializerWriter, ExpenseGroupSerializerReader, TagSerializer, ItemSerializerReader, ItemSerializerWriter, UserSerializer, \
-    NotificationSerializer, ValidationSerializerWriter, ValidationSerializerReader, ActionLogSerializer, GroupInvitationSerializer
+    NotificationSerializer, ValidationSerializerWriter, ValidationSerializerReader, ActionLogSerializer, GroupInvitationSerializer, \
+    is_raw_requested, is_sparse_fields_requested, SparseFieldsMixin, SPARSE_FIELDS_PARAMS
 from django.contrib.auth import authenticate
 from django.db.models import F, Q
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
 from knox.models import AuthToken
 from datetime import datetime, timedelta
 from django.db import transaction
-from core.services import push_notifications, expense_groups, action_logs, regardings, validations, expenses, google_drive
+from core import fast_serializers, query_plans
+from core.pagination import KeysetPagination
+from core.services import push_notifications, expense_groups, action_logs, regardings, validations, expenses, google_drive, ledger, \
+    closed_regardings, group_versions, sync, mutations, memberships
 
 FIELDS_NAMES_PT = {
     'name': 'nome',
@@ -26,16 +32,70 @@ FIELDS_NAMES_PT = {
     'members': 'membros',
     'invitations': 'convites'
 }
-class ExpenseGroupViewSet(viewsets.ModelViewSet):
+
+
+class QueryPlanMixin:
+    def is_field_requested(self, name):
+        if not hasattr(self, "requested_fields"):
+            self.requested_fields = None
+            if is_sparse_fields_requested(self.request) and issubclass(self.get_serializer_class(), SparseFieldsMixin):
+                self.requested_fields = set(self.get_serializer().fields)
+        return self.requested_fields is None or name in self.requested_fields
+
+    def plan_queryset(self, queryset):
+        if self.request.method not in ("GET", "HEAD"):  # Writer serializers only read their own fields
+            return queryset
+        sparse_fields = tuple(self.request.query_params.get(param) for param in SPARSE_FIELDS_PARAMS)
+        cache_key = (self.get_serializer_class(), queryset.model, sparse_fields)
+        return query_plans.get_cached_plan(self.get_serializer, queryset.model, cache_key).apply(queryset)
+
+
+class ConditionalGetMixin:
+    # Answers unchanged lists and details with 304 from the versions of the user's groups, before any serializer runs
+    version_lookup = ""  # Lookup from the viewset model to its ExpenseGroup
+
+    def get_version_lookup(self, name):
+        return f"{self.version_lookup}__{name}" if self.version_lookup else name
+
+    def get_versions(self):
+        if self.action == "list":
+            return ExpenseGroup.objects.filter(id__in=memberships.get_groups_ids(self.request)).values_list("id", "version")
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return self.queryset.model.objects.filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg],
+               self.get_version_lookup("id__in"): memberships.get_groups_ids(self.request)}
+        ).values_list(self.get_version_lookup("id"), self.get_version_lookup("version"))
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = None
+        if request.method in ("GET", "HEAD") and self.action in ("list", "retrieve"):
+            versions = list(self.get_versions())
+            if versions or self.action == "list":  # Unknown objects are left to the 404 of the handler
+                self.etag = group_versions.get_etag(request, versions)
+            if self.etag and self.etag in parse_etags(request.headers.get("If-None-Match", "")):
+                raise group_versions.NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, group_versions.NotModified):
+            return HttpResponseNotModified()
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, "etag", None)
+        if etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED) and not response.has_header("ETag"):
+            response["ETag"] = etag
+        return response
+
+
+class ExpenseGroupViewSet(ConditionalGetMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = ExpenseGroup.objects.all()
     serializer_class = ExpenseGroupSerializerReader
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        self.queryset = self.request.user.expenses_groups.all()
-        self.queryset = self.queryset.prefetch_related("regardings", "regardings__expenses", "members", "memberships",
-                                                       "memberships__user", "invitations", "invitations__sent_by",
-                                                       "invitations__invited")
+        self.queryset = self.plan_queryset(self.queryset.filter(id__in=memberships.get_groups_ids(self.request)))
         return self.queryset
 
     def get_serializer_class(self):
@@ -81,14 +141,18 @@ class ExpenseGroupViewSet(viewsets.ModelViewSet):
         return response
 
 
-class RegardingViewSet(viewsets.ModelViewSet):
+class RegardingViewSet(ConditionalGetMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Regarding.objects.all()
     serializer_class = RegardingSerializerWriter
     permission_classes = [permissions.IsAuthenticated]
+    version_lookup = "expense_group"
 
     def get_queryset(self):
-        self.queryset = self.queryset.select_related("expense_group").prefetch_related("expenses", "expenses__validations", "expenses__validations__validator")
-        return self.queryset.filter(expense_group__in=self.request.user.expenses_groups.all()).order_by('-start_date', '-end_date')
+        if self.action == "retrieve":  # Closed regardings are served without touching their expenses
+            self.queryset = self.queryset.select_related("expense_group")
+        else:
+            self.queryset = self.plan_queryset(self.queryset)
+        return self.queryset.filter(expense_group__in=memberships.get_groups_ids(self.request)).order_by('-start_date', '-end_date')
 
     def get_serializer_class(self):
         method = self.request.method
@@ -97,6 +161,13 @@ class RegardingViewSet(viewsets.ModelViewSet):
         else:
             return RegardingSerializerReader
 
+    def retrieve(self, request, *args, **kwargs):
+        regarding = self.get_object()
+        serialize = lambda: self.get_serializer(regarding).data
+        if regarding.is_closed and request.accepted_renderer.format in ("json", "raw"):
+            return closed_regardings.get_response(request, regarding, serialize)
+        return Response(serialize())
+
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
         if response.status_code == status.HTTP_201_CREATED:
@@ -110,6 +181,7 @@ class RegardingViewSet(viewsets.ModelViewSet):
         regarding = Regarding.objects.get(pk=kwargs['pk'])
         response = super().update(request, *args, **kwargs)
         if response.status_code == status.HTTP_200_OK:
+            closed_regardings.invalidate_on_commit([regarding.id])
             action_logs.update_regarding(request, regarding)
             regardings.notify_members_about_regarding_update(request, regarding)
             regardings.update_balance_json(request, regarding)
@@ -125,43 +197,91 @@ class RegardingViewSet(viewsets.ModelViewSet):
         return response
 
 
-class WalletViewSet(viewsets.ModelViewSet):
+class WalletViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Wallet.objects.all()
     serializer_class = WalletSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        self.queryset = self.queryset.filter(owner=self.request.user).prefetch_related("payment_methods", "payment_methods__payments")
+        self.queryset = self.plan_queryset(self.queryset.filter(owner=self.request.user))
         return self.queryset
 
 
-class PaymentMethodViewSet(viewsets.ModelViewSet):
+class PaymentMethodViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     queryset = PaymentMethod.objects.all()
     serializer_class = PaymentMethodSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        self.queryset = self.queryset.filter(wallet=self.request.user.wallet).prefetch_related("payments")
+        self.queryset = self.plan_queryset(self.queryset.filter(wallet=self.request.user.wallet))
         return self.queryset
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
-    queryset = Payment.objects.all().select_related("expense", "expense__regarding__expense_group", "payment_method", "payer").prefetch_related("expense__validations", "expense__validations__validator", "expense__validated_by")
+class LedgerWritesMixin:
+    # Items and payments written on their own still change the totals of their expenses in the ledger
+    def get_expenses_ids(self, serializer):
+        expense = serializer.validated_data.get("expense")
+        return {getattr(serializer.instance, "expense_id", None), getattr(expense, "id", None)} - {None}
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        expenses_ids = self.get_expenses_ids(serializer)
+        ledger.remove_expenses(expenses_ids)
+        super().perform_create(serializer)
+        ledger.add_expenses(expenses_ids)
+
+    @transaction.atomic
+    def perform_update(self, serializer):  # Both expenses when the row moves
+        expenses_ids = self.get_expenses_ids(serializer)
+        ledger.remove_expenses(expenses_ids)
+        super().perform_update(serializer)
+        ledger.add_expenses(expenses_ids)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ledger.remove_expenses([instance.expense_id])
+        super().perform_destroy(instance)
+        ledger.add_expenses([instance.expense_id])
+
+
+class PaymentViewSet(LedgerWritesMixin, QueryPlanMixin, viewsets.ModelViewSet):
+    queryset = Payment.objects.all()
     serializer_class = PaymentSerializerReader
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        self.queryset = self.queryset.filter(expense__regarding__expense_group__in=self.request.user.expenses_groups.all())
-        return self.queryset
+        self.queryset = self.queryset.filter(expense__regarding__expense_group__in=memberships.get_groups_ids(self.request))
+        return self.plan_queryset(self.queryset).order_by("id")  # Insertion order, whichever index the planner picks
+
+    def list(self, request, *args, **kwargs):
+        if is_sparse_fields_requested(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast_serializers.serialize_payments(page, raw=is_raw_requested(request)))
+        return Response(fast_serializers.serialize_payments(queryset, raw=is_raw_requested(request)))
 
 
-class ExpenseViewSet(viewsets.ModelViewSet):
-    queryset = Expense.objects.all().select_related("regarding", "regarding__expense_group", "created_by").prefetch_related("payments", "payments__payer", "payments__payment_method", "payments__expense", "validations", "validations__validator", "validations__validator__wallet", "validations__validator__wallet__payment_methods", "validations__validator__wallet__payment_methods__payments", "validated_by", "items", "items__consumers", "regarding__expense_group__members")
+class ExpenseViewSet(ConditionalGetMixin, QueryPlanMixin, viewsets.ModelViewSet):
+    queryset = Expense.objects.all()
     serializer_class = ExpenseSerializerReader
     permission_classes = [permissions.IsAuthenticated]
+    version_lookup = "regarding__expense_group"
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-date", "-id")
 
     def get_queryset(self):
-        self.queryset = self.queryset.filter(regarding__expense_group__in=self.request.user.expenses_groups.all())
+        self.queryset = self.queryset.filter(regarding__expense_group__in=memberships.get_groups_ids(self.request))
+        self.queryset = self.plan_queryset(self.queryset)
+        if self.is_field_requested("shared_total"):
+            self.queryset = self.queryset.annotate(shared_total=expenses.get_items_total(split_type=Item.SplitTypes.SHARED))
+        if self.is_field_requested("individual_total"):
+            self.queryset = self.queryset.annotate(
+                individual_total=expenses.get_items_total(split_type=Item.SplitTypes.INDIVIDUAL,
+                                                          consumers=self.request.user)
+            )
         return self.queryset.order_by("-date")
 
     def get_serializer_class(self):
@@ -171,14 +291,26 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         else:
             return ExpenseSerializerReader
 
+    def list(self, request, *args, **kwargs):
+        if is_sparse_fields_requested(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast_serializers.serialize_expenses(page, raw=is_raw_requested(request)))
+        return Response(fast_serializers.serialize_expenses(queryset, raw=is_raw_requested(request)))
+
     @transaction.atomic
     def destroy(self, request, *args, **kwargs):
         if "ids" in request.query_params:
-            delete_by_groups = expenses.batch_delete_expense(request.query_params.get('ids').split(','))
+            expenses_ids = request.query_params.get('ids').split(',')
+            ledger.remove_expenses(expenses_ids)
+            delete_by_groups = expenses.batch_delete_expense(expenses_ids)
             action_logs.batch_delete_expense(request, delete_by_groups)
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             expense = Expense.objects.get(pk=kwargs['pk'])
+            ledger.remove_expenses([expense.id])
             response = super().destroy(request, *args, **kwargs)
             if response.status_code == status.HTTP_204_NO_CONTENT:
                 expenses.notify_members_about_expense_deletion(request, expense)
@@ -194,6 +326,7 @@ class ExpenseViewSet(viewsets.ModelViewSet):
             expenses.create_items_for_new_expense(request.data.get("items"), expense)
             expenses.notify_expense_validators(request, expense)
             expenses.create_payments_for_new_expense(request.data.get("payments"), expense)
+            ledger.add_expenses([expense.id])
             expenses.update_expenses_validation_status([expense])
             expenses.update_expenses_payment_status([expense])
             expenses.update_payments_payment_status(expense.payments.all())
@@ -204,12 +337,14 @@ class ExpenseViewSet(viewsets.ModelViewSet):
     @transaction.atomic
     def partial_update(self, request, pk=None, *args, **kwargs):
         expense = Expense.objects.get(id=pk)
+        ledger.remove_expenses([expense.id])
         response = super().partial_update(request, *args, **kwargs)
         if response.status_code == status.HTTP_200_OK:
             if request.data.get("revalidate", False):
                 expenses.ask_validators_to_revalidate(request, expense)
             deleted_items = expenses.handle_items_edition(request.data.get("items"), expense)
             deleted_payments = expenses.handle_payments_edition(request.data.get("payments"), expense)
+            ledger.add_expenses([expense.id])
             expenses.update_expenses_validation_status([expense])
             expenses.update_expenses_payment_status([expense])
             expenses.update_payments_payment_status(expense.payments.all())
@@ -229,21 +364,34 @@ class TagViewSet(viewsets.ModelViewSet):
         return self.queryset
 
 
-class ItemViewSet(viewsets.ModelViewSet):
-    queryset = Item.objects.all().select_related("expense", "expense__regarding", "expense__regarding__expense_group").prefetch_related("expense__validated_by", "expense__payments", "expense__payments__payment_method", "expense__payments__payer",  "consumers")
+class ItemViewSet(LedgerWritesMixin, QueryPlanMixin, viewsets.ModelViewSet):
+    queryset = Item.objects.all()
     serializer_class = ItemSerializerReader
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        self.queryset = self.queryset.filter(expense__regarding__expense_group__in=self.request.user.expenses_groups.all())
-        return self.queryset
+        self.queryset = self.queryset.filter(expense__regarding__expense_group__in=memberships.get_groups_ids(self.request))
+        return self.plan_queryset(self.queryset).order_by("id")
+
+    def list(self, request, *args, **kwargs):
+        if is_sparse_fields_requested(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast_serializers.serialize_items(page, raw=is_raw_requested(request)))
+        return Response(fast_serializers.serialize_items(queryset, raw=is_raw_requested(request)))
 
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all().select_related("wallet").prefetch_related("wallet__payment_methods", "wallet__payment_methods__payments", "expenses_groups")
+class UserViewSet(QueryPlanMixin, viewsets.ModelViewSet):
+    queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        return self.plan_queryset(self.queryset)
+
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
 
@@ -267,7 +415,7 @@ class JoinGroup(views.APIView):
     def get(self, request, hash, format=None):
         try:
             group = ExpenseGroup.objects.get(hash_id=hash)
-            if group not in request.user.expenses_groups.all():
+            if not memberships.is_member(request, group.id):
                 expense_groups.join_group_by_code(request, group)
             else:
                 return Response(status=status.HTTP_400_BAD_REQUEST, data={"detail": "Você já faz parte desse grupo"})
@@ -280,23 +428,46 @@ class JoinGroup(views.APIView):
             return Response(status=status.HTTP_200_OK, data={"detail": "Você entrou no grupo!"})
 
 
+class Sync(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, format=None):
+        try:
+            since = request.query_params.get("since")
+            since, synced_groups_ids = sync.parse_token(since) if since else (None, ())
+        except sync.InvalidToken:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={"detail": "Token de sincronização inválido"})
+        return Response(sync.get_changes(request, since, synced_groups_ids))
+
+
+class BatchMutations(views.APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @transaction.atomic
+    def post(self, request, format=None):
+        refs = mutations.apply_operations(request, request.data.get("operations"))
+        return Response(status=status.HTTP_200_OK, data={"refs": refs})
+
+
 class NotificationViewSet(viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         self.queryset = self.request.user.notifications.all()
         return self.queryset.order_by("-created_at")
 
 
-class ValidationViewSet(viewsets.ModelViewSet):
-    queryset = Validation.objects.all().select_related("expense", "expense__regarding","expense__regarding__expense_group", "validator", "validator__wallet").prefetch_related("expense__validated_by", "expense__created_by", "validator__wallet__payment_methods", "validator__wallet__payment_methods__payments")
+class ValidationViewSet(QueryPlanMixin, viewsets.ModelViewSet):
+    queryset = Validation.objects.all()
     serializer_class = ValidationSerializerReader
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        self.queryset = self.queryset.filter(validator=self.request.user)
+        self.queryset = self.plan_queryset(self.queryset.filter(validator=self.request.user))
         return self.queryset.order_by("-created_at")
 
     def get_serializer_class(self):
@@ -322,25 +493,26 @@ class ValidationViewSet(viewsets.ModelViewSet):
         return response
 
 
-class ActionsLogViewSet(viewsets.ModelViewSet):
-    queryset = ActionLog.objects.all().select_related("expense_group", "user", "user__wallet").prefetch_related("user__wallet__payment_methods", "user__wallet__payment_methods__payments")
+class ActionsLogViewSet(QueryPlanMixin, viewsets.ModelViewSet):
+    queryset = ActionLog.objects.all()
     serializer_class = ActionLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        self.queryset = self.queryset.filter(expense_group__in=self.request.user.expenses_groups.all())
+        self.queryset = self.plan_queryset(self.queryset.filter(expense_group__in=memberships.get_groups_ids(self.request)))
         return self.queryset.order_by("-created_at")
 
 
-class GroupInvitationViewSet(viewsets.ModelViewSet):
-    queryset = GroupInvitation.objects.all().select_related("sent_by", "invited", "expense_group")
+class GroupInvitationViewSet(QueryPlanMixin, viewsets.ModelViewSet):
+    queryset = GroupInvitation.objects.all()
     serializer_class = GroupInvitationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
         self.queryset = self.queryset.filter((Q(sent_by_id=user.id) | Q(invited_id=user.id)) & Q(status=GroupInvitation.InvitationStatus.AWAITING))
-        return self.queryset.order_by("-created_at")
+        return self.plan_queryset(self.queryset).order_by("-created_at")
 
     @transaction.atomic
     def partial_update(self, request, pk=None, *args, **kwargs):